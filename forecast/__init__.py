@@ -0,0 +1,6 @@
+# Unified command line for the forecasting scripts: `python -m forecast <command> ...`.
+#
+# The package itself imports nothing heavy. The chosen command's module (and with it
+# pandas / CatBoost) is imported only when that command runs, so `--help` and
+# dispatch are instant. `python -m forecast serve` keeps a model resident behind a
+# local HTTP endpoint (see forecast/serve.py).
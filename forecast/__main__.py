@@ -0,0 +1,40 @@
+import sys
+import argparse
+import importlib
+
+# command -> (module whose main() runs it, argv prefix for that main, help)
+COMMANDS = {
+    'score': ('tejas_score', [], 'Batch-score a product file with a registered model'),
+    'orders': ('tejas_order_optimizer', [], 'Newsvendor order quantities with budget / MOQ / brand caps'),
+    'explain': ('tejas_explain', [], 'Per-row SHAP explanations with Brand / Region / feature-family rollups'),
+    'launch': ('tejas_launch_scoring', [], 'Score candidate launch months for a release'),
+    'whatif': ('tejas_inference', ['whatif'], 'Compiled what-if scenario scoring'),
+    'export': ('tejas_inference', ['export'], 'Save the standalone Python export of a registered model'),
+    'horizons': ('tejas_multi_horizon', [], 'Train the joint multi-horizon model'),
+    'lookalike': ('tejas_lookalike', [], 'Build or query the lookalike index'),
+    'hierarchy': ('tejas_hierarchy', [], 'Hierarchical forecasts and reconciliation'),
+    'train-champion': ('tejas_modeling_champion', [], 'Train / register the champion models'),
+    'train-advanced': ('tejas_modeling_advanced', [], 'Train / register the advanced model'),
+    'refresh': ('tejas_incremental', [], 'Monthly incremental refresh'),
+    'benchmark': ('tejas_benchmark', [], 'Scaling benchmarks on synthetic panels'),
+    'serve': ('forecast.serve', [], 'Keep a model resident behind a micro-batching HTTP endpoint'),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='forecast', description='Demand forecasting commands (each one imports only what it needs).',
+        epilog='\n'.join(f'  {name:<16} {help_}' for name, (_, _, help_) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="the command's own arguments (see <command> --help)")
+    args = parser.parse_args(argv)
+
+    module_name, prefix, _ = COMMANDS[args.command]
+    # The command's argparse reads sys.argv; prog shows up as 'forecast <command>'
+    sys.argv = [f'forecast {args.command}'] + prefix + args.args
+    return importlib.import_module(module_name).main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import json
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from tejas_model_registry import load_model
+from tejas_trend_index import TrendIndex
+from tejas_pools import model_matrix
+from tejas_demand_targets import horizon_totals
+from tejas_cannibalization import CANNIBALIZATION_FEATURES, load_sibling_history, prepare_sibling_history
+from tejas_lookalike import ANALOG_FEATURES, LookalikeIndex
+from tejas_score import DEFAULT_REGIONS, scoring_frame
+
+# Resident scoring service: the registered CatBoost model, the per-month trend table,
+# the sibling history and the lookalike index are loaded once at startup instead of
+# once per Python process.
+#
+#   python -m forecast serve --model champion --port 8766
+#   curl -s localhost:8766/predict -d '{"rows": [{"MATERIALNUMBER": "CK24110S", ...}]}'
+#
+# POST /predict takes {"rows": [...], "regions": [...]} with rows in final_products.csv
+# format (expanded across the regions) or already feature-ready (with Region). Each
+# request's features are built in its own handler thread. Cannibalization siblings are
+# the rows of the same request, never another client's. A MicroBatcher thread then
+# gathers the model matrices of all requests waiting within --max-wait-ms (up to
+# --max-batch-rows rows) and scores them in a single predict call.
+# GET /health reports the model version and batching counters.
+
+DEFAULT_PORT = 8766
+DEFAULT_MAX_WAIT_MS = 5
+DEFAULT_MAX_BATCH_ROWS = 50_000
+# Identifying columns echoed back with each prediction (whichever are present)
+ECHO_COLS = ['Style', 'COLORCODE', 'COLORDESCRIPTION', 'Size', 'GridValue', 'Region', 'Date']
+
+
+class MicroBatcher:
+    """Collects concurrent scoring requests and runs them through one predict call per batch."""
+
+    def __init__(self, predict, max_wait_ms=DEFAULT_MAX_WAIT_MS, max_batch_rows=DEFAULT_MAX_BATCH_ROWS):
+        self.predict = predict
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_rows = max_batch_rows
+        self.stats = {'requests': 0, 'batches': 0, 'rows': 0, 'largest_batch': 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        """Future for the predictions of model matrix X (resolved by the batching thread)."""
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch, rows
+
+    def _run(self):
+        while True:
+            batch, rows = self._collect()
+            try:
+                X = pd.concat([X for X, _ in batch], ignore_index=True) if len(batch) > 1 else batch[0][0]
+                predictions = self.predict(X)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['rows'] += rows
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            start = 0
+            for X, future in batch:
+                future.set_result(predictions[start:start + len(X)])
+                start += len(X)
+
+
+class ScoringService:
+    """A registered model plus everything scoring needs, kept in memory."""
+
+    def __init__(self, name='champion', version='latest', regions=DEFAULT_REGIONS,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, max_batch_rows=DEFAULT_MAX_BATCH_ROWS):
+        self.model, self.meta = load_model(name, version)
+        self.regions = list(regions)
+        features = self.meta['features']
+        # Loaded (and the sibling history prepared) once; TrendIndex / LookalikeIndex keep their loaded copy for later lookups
+        self.trends = TrendIndex.load()
+        self.history = prepare_sibling_history(load_sibling_history()) if any(f in CANNIBALIZATION_FEATURES for f in features) else None
+        self.lookalike = LookalikeIndex.load() if any(f in ANALOG_FEATURES for f in features) else None
+        self.batcher = MicroBatcher(self._predict, max_wait_ms, max_batch_rows)
+
+    def _predict(self, X):
+        raw = self.model.predict(X)
+        return horizon_totals(raw) if self.meta.get('horizons') else np.maximum(0, raw)
+
+    def output_cols(self):
+        if self.meta.get('horizons'):
+            return [f'Predicted_{h}m_Order_Quantity' for h in self.meta['horizons']]
+        return ['Predicted_4m_Order_Quantity']
+
+    def score(self, records, regions=None):
+        """Feature rows for one request, scored through the shared micro-batcher. Returns a list of dicts."""
+        df = scoring_frame(pd.DataFrame.from_records(records), self.meta, regions or self.regions, self.history)
+        missing = [c for c in self.meta['features'] if c not in df.columns]
+        if missing:
+            raise KeyError(f"Input is missing model features: {missing}")
+        X = model_matrix(df, self.meta['features'], self.meta['categorical_cols'])
+        predictions = np.round(np.asarray(self.batcher.submit(X).result()).reshape(len(df), -1), 2)
+
+        out = df[[c for c in ECHO_COLS if c in df.columns]].copy()
+        if 'Date' in out.columns:
+            out['Date'] = pd.to_datetime(out['Date']).dt.strftime('%Y-%m-%d')
+        for col, values in zip(self.output_cols(), predictions.T):
+            out[col] = values
+        return json.loads(out.to_json(orient='records'))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/health':
+            self._send(404, {'error': f'unknown path {self.path}'})
+            return
+        meta = self.service.meta
+        self._send(200, {'status': 'ok', 'model': meta['name'], 'version': meta['version'],
+                         'batching': self.service.batcher.stats})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/predict':
+            self._send(404, {'error': f'unknown path {self.path}'})
+            return
+        start_t = time.perf_counter()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            rows = self.service.score(body['rows'], body.get('regions'))
+        except (KeyError, ValueError, TypeError) as exc:
+            self._send(400, {'error': f'{type(exc).__name__}: {exc}'})
+            return
+        meta = self.service.meta
+        self._send(200, {'model': meta['name'], 'version': meta['version'], 'predictions': rows,
+                         'latency_ms': (time.perf_counter() - start_t) * 1000})
+
+
+class _Server(ThreadingHTTPServer):
+    # Concurrent clients are the point; the socketserver default backlog of 5 resets them
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def serve(service, host='127.0.0.1', port=DEFAULT_PORT):
+    _Handler.service = service
+    server = _Server((host, port), _Handler)
+    print(f"Serving '{service.meta['name']}' version {service.meta['version']} on http://{host}:{port} "
+          f"(POST /predict, GET /health)")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a registered model over HTTP with micro-batched scoring.')
+    parser.add_argument('--model', default='champion', help='Registered model name')
+    parser.add_argument('--version', default='latest')
+    parser.add_argument('--regions', nargs='+', default=DEFAULT_REGIONS,
+                        help='Regions product rows are expanded across (a request can override)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help='How long a batch waits for more concurrent requests')
+    parser.add_argument('--max-batch-rows', type=int, default=DEFAULT_MAX_BATCH_ROWS)
+    args = parser.parse_args()
+
+    start_t = time.time()
+    service = ScoringService(args.model, args.version, args.regions, args.max_wait_ms, args.max_batch_rows)
+    print(f"Loaded model, trend table{', sibling history' if service.history is not None else ''}"
+          f"{', lookalike index' if service.lookalike is not None else ''} in {time.time() - start_t:.2f} seconds")
+    serve(service, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
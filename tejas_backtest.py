@@ -0,0 +1,265 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+
+from tejas_feature_store import load_final_demand
+
+# Rolling-origin backtesting shared by the baseline, champion and advanced models.
+# Folds are cut on month boundaries (Date repeats for every frame in a month),
+# and folds run concurrently in a process pool with a bounded CatBoost thread count.
+
+TARGET_COL = '4m_demand'
+# Months of forward demand in TARGET_COL: the default embargo between train and test
+TARGET_HORIZON = 4
+# Folds with fewer test rows are merged into the previous fold's test block
+MIN_TEST_ROWS = 100
+MODEL_NAMES = ['ridge', 'poisson', 'catboost', 'catboost_advanced']
+
+
+def holdout_split(df, test_frac=0.2, date_col='Date'):
+    """
+    Chronological train/test split that never cuts a month in half.
+    The cut is placed on the month boundary whose cumulative row share is closest to 1 - test_frac.
+    """
+    months = pd.to_datetime(df[date_col]).dt.to_period('M')
+    is_test = (months > holdout_last_train_month(months.value_counts(), test_frac)).to_numpy()
+    return df[~is_test], df[is_test]
+
+
+def holdout_last_train_month(month_counts, test_frac=0.2):
+    """
+    Last training month of holdout_split from rows-per-month counts (a Series indexed by
+    month), for callers that stream the data instead of holding it in one frame.
+    """
+    counts = month_counts.sort_index()
+    cum_share = (counts.cumsum() / counts.sum()).to_numpy()
+    # Boundary closest to the requested share (always leave one test month)
+    return counts.index[int(np.argmin(np.abs(cum_share[:-1] - (1 - test_frac))))]
+
+
+def month_folds(dates, n_folds=4, horizon=1, mode='expanding', window=None, gap=TARGET_HORIZON,
+                min_train_months=3, min_test_rows=MIN_TEST_ROWS):
+    """
+    Build month-aligned rolling-origin folds.
+
+    Returns a list of (train_months, test_months) lists of pandas Periods. The last
+    n_folds * horizon months are split into consecutive test blocks of `horizon` months.
+    `mode='expanding'` trains on every earlier month, `mode='sliding'` on the last `window`
+    months only. `gap` months are skipped between train and test: a training row's
+    target covers its next TARGET_HORIZON months, so the default gap keeps those targets
+    out of the test months. A test block with fewer than `min_test_rows` rows is merged
+    into the previous fold's test block.
+    """
+    if mode not in ('expanding', 'sliding'):
+        raise ValueError(f"Unknown backtest mode '{mode}'")
+    if mode == 'sliding' and not window:
+        raise ValueError("Sliding-window backtests need a window (in months)")
+
+    counts = pd.to_datetime(pd.Series(dates)).dt.to_period('M').value_counts()
+    months = sorted(counts.index)
+    first_test = len(months) - n_folds * horizon
+
+    folds = []
+    for k in range(n_folds):
+        test_start = first_test + k * horizon
+        train_end = test_start - gap
+        train_start = 0 if mode == 'expanding' else max(0, train_end - window)
+        if train_end - train_start < min_train_months:
+            print(f"Skipping fold {k}: only {max(train_end - train_start, 0)} training month(s)")
+            continue
+        test_months = months[test_start:test_start + horizon]
+        n_test = int(counts[test_months].sum())
+        if n_test < min_test_rows:
+            if folds:
+                print(f"Merging fold {k} ({n_test} test rows) into the previous fold's test block")
+                folds[-1] = (folds[-1][0], folds[-1][1] + test_months)
+                continue
+            print(f"Warning: fold {k} has only {n_test} test rows")
+        folds.append((months[train_start:train_end], test_months))
+    return folds
+
+
+def top_n_mae(y_true, y_pred, top_n=5):
+    """MAE on the top_n rows by actual demand (the README's 'Top N Outliers MAE')."""
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    top_idx = np.argsort(y_true)[::-1][:top_n]
+    return mean_absolute_error(y_true[top_idx], y_pred[top_idx])
+
+
+# --- Fold workers ---------------------------------------------------------
+# The feature frames are shipped to each worker process once (pool initializer)
+# so individual fold tasks only carry month lists.
+
+_FRAMES = {}
+
+
+def _init_worker(frames):
+    _FRAMES.update(frames)
+
+
+def _fit_predict(model_name, train_df, test_df, thread_count):
+    """Fit one model on a training window and return predictions for the test window."""
+    if model_name in ('ridge', 'poisson'):
+        import tejas_modeling_baseline as baseline
+        numeric_cols = baseline.get_numeric_cols(train_df)
+        builder = baseline.build_ridge if model_name == 'ridge' else baseline.build_poisson
+        pipeline = builder(numeric_cols)
+        features = baseline.TARGET_ENCODE_COLS + baseline.ONE_HOT_COLS + numeric_cols
+        pipeline.fit(train_df[features], train_df[TARGET_COL].clip(lower=0))
+        return pipeline.predict(test_df[features])
+
+    if model_name == 'catboost':
+        import tejas_modeling_champion as module
+    elif model_name == 'catboost_advanced':
+        import tejas_modeling_advanced as module
+    else:
+        raise ValueError(f"Unknown model '{model_name}'")
+
+    from tejas_pools import model_matrix, cached_train_pool
+
+    features = _FRAMES[model_name + '__features']
+    # No eval_set: the test window must not drive early stopping
+    model = module.build_model(thread_count=thread_count)
+    # Quantization borders of each fold are reused by later backtests over the same data
+    X_train = model_matrix(train_df, features, module.CATEGORICAL_COLS)
+    model.fit(cached_train_pool(X_train, train_df[TARGET_COL], module.CATEGORICAL_COLS, model.get_params()))
+    return model.predict(model_matrix(test_df, features, module.CATEGORICAL_COLS))
+
+
+def _run_fold(model_name, fold_id, train_months, test_months, thread_count, top_n):
+    # Per-fold frame where the features depend on the fold (advanced analog curves)
+    df = _FRAMES.get(f'{model_name}@{fold_id}', _FRAMES.get(model_name))
+    months = df['Date'].dt.to_period('M')
+    train_df = df[months.isin(train_months)]
+    test_df = df[months.isin(test_months)]
+
+    y_pred = np.maximum(0, _fit_predict(model_name, train_df, test_df, thread_count))
+    y_true = test_df[TARGET_COL].to_numpy()
+    return {
+        'model': model_name,
+        'fold': fold_id,
+        'train_start': str(train_months[0]),
+        'train_end': str(train_months[-1]),
+        'test_start': str(test_months[0]),
+        'test_end': str(test_months[-1]),
+        'n_train': len(train_df),
+        'n_test': len(test_df),
+        'MAE': mean_absolute_error(y_true, y_pred),
+        'RMSE': root_mean_squared_error(y_true, y_pred),
+        f'Top{top_n}_MAE': top_n_mae(y_true, y_pred, top_n),
+        # Kept for the pooled aggregate; dropped from the per-fold table
+        '_abs_err_sum': float(np.abs(y_true - y_pred).sum()),
+        '_sq_err_sum': float(((y_true - y_pred) ** 2).sum()),
+    }
+
+
+def _prepare_frames(df, model_names, folds):
+    """
+    Build each model's feature frame once, before any fold is cut. The advanced model
+    gets one frame per fold instead: its analog curves come from a lookalike index over
+    the fold's training months only.
+    """
+    frames = {}
+    for name in model_names:
+        if name in ('ridge', 'poisson'):
+            frames[name] = df
+        elif name == 'catboost':
+            import tejas_modeling_champion as champion
+            frames[name], frames[name + '__features'] = champion.prepare_features(df)
+        elif name == 'catboost_advanced':
+            import tejas_modeling_advanced as advanced
+            from tejas_lookalike import LookalikeIndex
+            for k, (train_m, _) in enumerate(folds):
+                adv_df = advanced.create_advanced_features(df, analog_index=LookalikeIndex.up_to(train_m[-1]))
+                frames[f'{name}@{k}'], frames[name + '__features'] = advanced.prepare_features(adv_df)
+        else:
+            raise ValueError(f"Unknown model '{name}'")
+    return frames
+
+
+def run_backtest(df, model_names=MODEL_NAMES, n_folds=4, horizon=1, mode='expanding', window=None,
+                 gap=TARGET_HORIZON, max_workers=None, top_n=5):
+    """
+    Run every (model, fold) pair concurrently and return (per_fold, aggregate) DataFrames.
+    Each worker's CatBoost gets cpu_count // max_workers threads so cores are not oversubscribed.
+    """
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    folds = month_folds(df['Date'], n_folds=n_folds, horizon=horizon, mode=mode, window=window, gap=gap)
+    if not folds:
+        raise ValueError("No usable folds; reduce n_folds/horizon or the window")
+
+    n_cpu = os.cpu_count() or 1
+    n_tasks = len(folds) * len(model_names)
+    max_workers = min(max_workers or n_cpu, n_tasks)
+    thread_count = max(1, n_cpu // max_workers)
+    print(f"Running {n_tasks} fits ({len(model_names)} models x {len(folds)} folds) "
+          f"on {max_workers} workers x {thread_count} threads...")
+
+    frames = _prepare_frames(df, model_names, folds)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(frames,)) as pool:
+        futures = [
+            pool.submit(_run_fold, name, k, train_m, test_m, thread_count, top_n)
+            for name in model_names
+            for k, (train_m, test_m) in enumerate(folds)
+        ]
+        results = [f.result() for f in futures]
+
+    per_fold = pd.DataFrame(results)
+    top_col = f'Top{top_n}_MAE'
+    aggregate = per_fold.groupby('model', sort=False).agg(
+        folds=('fold', 'count'),
+        MAE_mean=('MAE', 'mean'),
+        MAE_std=('MAE', 'std'),
+        RMSE_mean=('RMSE', 'mean'),
+        **{f'{top_col}_mean': (top_col, 'mean')},
+        n_test=('n_test', 'sum'),
+        abs_err=('_abs_err_sum', 'sum'),
+        sq_err=('_sq_err_sum', 'sum'),
+    )
+    # Pooled metrics weight every test row equally across folds
+    aggregate['MAE_pooled'] = aggregate['abs_err'] / aggregate['n_test']
+    aggregate['RMSE_pooled'] = np.sqrt(aggregate['sq_err'] / aggregate['n_test'])
+    aggregate = aggregate.drop(columns=['abs_err', 'sq_err']).reset_index()
+
+    per_fold = per_fold.drop(columns=['_abs_err_sum', '_sq_err_sum'])
+    return per_fold, aggregate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Month-aligned rolling-origin backtest.')
+    parser.add_argument('--models', nargs='+', default=MODEL_NAMES, choices=MODEL_NAMES)
+    parser.add_argument('--folds', type=int, default=4)
+    parser.add_argument('--horizon', type=int, default=1, help='Test months per fold')
+    parser.add_argument('--mode', choices=['expanding', 'sliding'], default='expanding')
+    parser.add_argument('--window', type=int, default=None, help='Training months for sliding mode')
+    parser.add_argument('--gap', type=int, default=TARGET_HORIZON,
+                        help='Months skipped between train and test (default: the target horizon)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--output', default='backtest_results.csv')
+    args = parser.parse_args()
+
+    print("Loading final_demand.csv...")
+    df = load_final_demand()
+
+    per_fold, aggregate = run_backtest(
+        df, args.models, n_folds=args.folds, horizon=args.horizon, mode=args.mode,
+        window=args.window, gap=args.gap, max_workers=args.workers, top_n=args.top_n
+    )
+
+    print("\n--- Per-Fold Results ---")
+    print(per_fold.to_string(index=False, float_format='%.2f'))
+    print("\n--- Aggregate Results ---")
+    print(aggregate.to_string(index=False, float_format='%.2f'))
+
+    per_fold.to_csv(args.output, index=False)
+    print(f"\nSaved per-fold results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
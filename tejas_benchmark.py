@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from catboost import Pool
+
+from tejas_panel import load_panel
+from tejas_demand_targets import SERIES_KEYS, add_forward_demand
+from tejas_trend_index import TrendIndex
+from tejas_trace import peak_rss_mb
+
+# Scaling benchmarks for the feature and model pipeline.
+#
+# 1. synthetic_panel() blows final_demand up to N x its rows by cloning whole
+#    GridValue series (all regions and months) under new GridValue ids, with a
+#    per-series demand multiplier. Columns, dtypes, categorical cardinalities and
+#    trend values stay those of the real panel; the demand distribution keeps its shape.
+# 2. Each benchmark is timed (best wall / CPU time over --repeat runs) and run once more
+#    under tracemalloc for peak Python/NumPy memory; peak process RSS is recorded too.
+#    Results go to a JSON file, and --baseline compares against an earlier run.
+#
+#   python tejas_benchmark.py --scales 1 10 100 --output benchmark_results.json
+#   python tejas_benchmark.py --scales 1 10 --baseline benchmark_results.json --tolerance 0.25
+
+BENCHMARKS = ['forward_demand', 'trend_lookup', 'advanced_features', 'catboost_fit', 'catboost_predict', 'batch_scoring',
+              'whatif_compile', 'whatif_scoring']
+# Benchmarks that need another one's result (run untimed when only the dependent is selected)
+REQUIRES = {'catboost_predict': 'catboost_fit', 'batch_scoring': 'catboost_fit',
+            'whatif_compile': 'catboost_fit', 'whatif_scoring': 'whatif_compile'}
+DEMAND_NOISE = 0.25  # sigma of the log-normal per-series demand multiplier
+
+
+def synthetic_panel(scale=10, source=None, seed=42):
+    """
+    A final_demand-shaped panel with about `scale` x the rows of `source`
+    (default: the real compact panel). Whole series are sampled with replacement and
+    relabelled, so every synthetic series has a real history and attribute mix.
+    """
+    source = load_panel('final_demand', verbose=False) if source is None else source
+    rng = np.random.default_rng(seed)
+
+    # Rows of each GridValue series (all regions) as contiguous ranges of the sorted frame
+    source = source.sort_values(['GridValue'] + [k for k in SERIES_KEYS if k != 'GridValue'] + ['Date'],
+                                kind='stable').reset_index(drop=True)
+    grid = source['GridValue'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, grid[1:] != grid[:-1]])
+    lengths = np.diff(np.r_[starts, len(source)])
+
+    n_series = max(1, int(round(len(starts) * scale)))
+    picked = rng.integers(0, len(starts), n_series)
+    # Row positions of the picked series, concatenated without a Python loop
+    rep_lengths = lengths[picked]
+    offsets = np.arange(rep_lengths.sum()) - np.repeat(np.cumsum(rep_lengths) - rep_lengths, rep_lengths)
+    rows = np.repeat(starts[picked], rep_lengths) + offsets
+
+    df = source.iloc[rows].reset_index(drop=True)
+    series_id = np.repeat(np.arange(n_series), rep_lengths)
+    df['GridValue'] = (int(grid.max()) + 1 + series_id).astype(np.int64)
+
+    # Mean-one log-normal multiplier per series, applied to demand and its forward target alike
+    factor = rng.lognormal(-DEMAND_NOISE ** 2 / 2, DEMAND_NOISE, n_series)[series_id]
+    for col in ('Demand', '4m_demand'):
+        if col in df.columns:
+            df[col] = np.round(df[col].to_numpy(dtype=float) * factor).astype(np.float32)
+    return df
+
+
+def measure(fn, repeat=1, trace_memory=True):
+    """Run fn() `repeat` times; returns (last result, stats dict)."""
+    walls, cpus = [], []
+    rss_before = peak_rss_mb()
+    for _ in range(repeat):
+        wall_t, cpu_t = time.perf_counter(), time.process_time()
+        result = fn()
+        walls.append(time.perf_counter() - wall_t)
+        cpus.append(time.process_time() - cpu_t)
+
+    stats = {'wall_s': min(walls), 'wall_s_mean': float(np.mean(walls)), 'cpu_s': min(cpus)}
+    if trace_memory:
+        # Separate traced run: tracemalloc slows allocation-heavy code down
+        tracemalloc.start()
+        fn()
+        stats['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    # ru_maxrss is the process high-water mark: record how much this case raised it
+    stats['peak_rss_mb'] = peak_rss_mb()
+    stats['rss_growth_mb'] = stats['peak_rss_mb'] - rss_before
+    return result, stats
+
+
+def _benchmark_cases(panel, fit_iterations, threads):
+    """(name, callable) per benchmark; later cases reuse what earlier ones built."""
+    import tejas_modeling_champion as champion
+    import tejas_modeling_advanced as advanced
+    from tejas_score import score_frame
+    from tejas_inference import WhatIfEngine, compile_model, month_scenario
+
+    state = {}
+    trends = TrendIndex.load()
+
+    def forward_demand():
+        return add_forward_demand(panel, horizons=(4,))
+
+    def trend_lookup():
+        return trends.attach(panel, trends.base_columns)
+
+    def advanced_features():
+        return advanced.create_advanced_features(panel, sibling_panel=panel)
+
+    def catboost_fit():
+        df, features = champion.prepare_features(panel)
+        state['X'], state['features'] = df[features], features
+        pool = Pool(state['X'], df[champion.TARGET_COL], cat_features=champion.CATEGORICAL_COLS)
+        state['model'] = champion.build_model(iterations=fit_iterations, thread_count=threads)
+        return state['model'].fit(pool)
+
+    def catboost_predict():
+        return state['model'].predict(state['X'])
+
+    def batch_scoring():
+        meta = {'features': state['features'], 'categorical_cols': champion.CATEGORICAL_COLS}
+        return score_frame(state['model'], meta, panel)
+
+    def whatif_compile():
+        # Python export + base-row encoding + the CTR tables the month scenario needs
+        compiled = compile_model(state['model'], state['features'], champion.CATEGORICAL_COLS, frames=[panel])
+        state['engine'] = WhatIfEngine(compiled, state['X'])
+        state['scenario'] = month_scenario(trends.months[-1], state['features'], trends)
+        return state['engine'].score(state['scenario'])
+
+    def whatif_scoring():
+        return state['engine'].score(state['scenario'])
+
+    return [('forward_demand', forward_demand), ('trend_lookup', trend_lookup),
+            ('advanced_features', advanced_features), ('catboost_fit', catboost_fit),
+            ('catboost_predict', catboost_predict), ('batch_scoring', batch_scoring),
+            ('whatif_compile', whatif_compile), ('whatif_scoring', whatif_scoring)]
+
+
+def run_benchmarks(scales=(1, 10), benchmarks=BENCHMARKS, repeat=1, fit_iterations=100, threads=-1,
+                   trace_memory=True, seed=42):
+    """Run the selected benchmarks at each scale. Returns a list of result dicts."""
+    source = load_panel('final_demand', verbose=False)
+    # Dependencies of the selected benchmarks run (untimed) even when not selected
+    needed = set(benchmarks)
+    for name in reversed(BENCHMARKS):
+        if name in needed and name in REQUIRES:
+            needed.add(REQUIRES[name])
+    results = []
+    for scale in scales:
+        panel = synthetic_panel(scale, source, seed)
+        print(f"\n=== Scale {scale}x: {len(panel)} rows, {panel['GridValue'].nunique()} series, "
+              f"{panel.memory_usage(deep=True).sum() / 1e6:.1f} MB ===")
+        for name, fn in _benchmark_cases(panel, fit_iterations, threads):
+            if name not in benchmarks:
+                if name in needed:
+                    fn()
+                continue
+            _, stats = measure(fn, repeat, trace_memory)
+            stats.update(benchmark=name, scale=scale, rows=len(panel), rows_per_s=len(panel) / stats['wall_s'])
+            results.append(stats)
+            print(f"{name:<20} {stats['wall_s']:9.3f} s  {stats['rows_per_s']:12,.0f} rows/s  "
+                  f"peak {stats.get('peak_traced_mb', float('nan')):8.1f} MB traced, {stats['rss_growth_mb']:+8.1f} MB RSS "
+                  f"(process peak {stats['peak_rss_mb']:.1f} MB)")
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """(benchmark, scale, baseline s, current s) for every case more than `tolerance` slower than the baseline."""
+    before = {(r['benchmark'], r['scale']): r['wall_s'] for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = before.get((r['benchmark'], r['scale']))
+        if old and r['wall_s'] > old * (1 + tolerance):
+            regressions.append((r['benchmark'], r['scale'], old, r['wall_s']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the feature and model pipeline on synthetic panels.')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1, 10],
+                        help='Panel sizes as multiples of final_demand (e.g. 1 10 100 1000)')
+    parser.add_argument('--benchmarks', nargs='+', default=BENCHMARKS, choices=BENCHMARKS)
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per benchmark (best is reported)')
+    parser.add_argument('--fit-iterations', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=-1, help='CatBoost thread_count')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown vs the baseline (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    scales = [int(s) if float(s).is_integer() else s for s in args.scales]
+    results = run_benchmarks(scales, args.benchmarks, args.repeat, args.fit_iterations, args.threads,
+                             not args.no_memory, args.seed)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': {'numpy': np.__version__, 'pandas': pd.__version__},
+        'settings': {'repeat': args.repeat, 'fit_iterations': args.fit_iterations, 'threads': args.threads,
+                     'seed': args.seed},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(results)} benchmark results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, scale, old, new in regressions:
+            print(f"REGRESSION {name} at {scale}x: {old:.3f} s -> {new:.3f} s")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+from tejas_feature_store import STORE_ROOT, load_table
+from tejas_incremental import build_modeling_table
+from tejas_panel import DensePanel
+from tejas_trace import traced
+
+# Cross-sectional cannibalization features (Sibling_Frame_Density and friends).
+#
+# Every feature is a groupby-transform or a sorted-array pass over one internal
+# frame, so nothing is merged back onto the rows:
+# - sibling counts: rows sharing the month and a sibling key, at several granularities
+# - launch density: frames of the same sibling group that launched (first month with
+#   positive demand) in the trailing N months, from a cumulative sum over a
+#   (group x month) launch-count array. Frames already selling in the first month of the
+#   data are left-censored, not launches.
+# - sibling share lags: a frame's share of its sibling group's demand (per Region),
+#   k months earlier, via DensePanel month shifts
+#
+# Siblings are counted over every observed month of the 'enriched' table, not only the
+# rows that have a forward target (the target-filtered panel thins out to a few rows in
+# its last months). At scoring time the new release is stacked on top of that history and
+# each release frame is scored as the only new frame of its group: its siblings are the
+# historical frames still active in its launch month, not the rest of the release. The
+# history never holds more than a handful of launches per group and month, so a whole
+# release launching at once would put the features far outside the training range.
+
+# Sibling granularities: name -> key columns
+SIBLING_LEVELS = {
+    'Lookalike': ['Lookalike_ID'],
+    'ShapeMaterial': ['Shape', 'Material'],
+    'TierColor': ['Brand_Tier', 'Color_Base'],
+}
+LAUNCH_WINDOWS = (3, 6)
+SHARE_LAGS = (1, 3)
+
+# Columns identifying one frame of a new release (whichever are present), e.g. Style + COLORCODE
+RELEASE_FRAME_COLS = ('Style', 'COLORCODE', 'Color_Base', 'Color_Finish', 'Size')
+
+
+def sibling_count_col(level):
+    """The Lookalike level keeps the original 'Sibling_Frame_Density' name."""
+    return 'Sibling_Frame_Density' if level == 'Lookalike' else f'Sibling_Count_{level}'
+
+
+def launch_density_col(level, window):
+    return f'Launch_Density_{level}_{window}m'
+
+
+def share_lag_col(level, lag):
+    return f'Sibling_Share_{level}_lag{lag}'
+
+
+CANNIBALIZATION_FEATURES = (
+    [sibling_count_col(level) for level in SIBLING_LEVELS]
+    + [launch_density_col(level, w) for level in SIBLING_LEVELS for w in LAUNCH_WINDOWS]
+    + [share_lag_col(level, k) for level in SIBLING_LEVELS for k in SHARE_LAGS]
+)
+
+
+SIBLING_KEY_COLS = sorted({c for cols in SIBLING_LEVELS.values() for c in cols})
+
+
+def _key_cols(df):
+    return SIBLING_KEY_COLS + (['Region'] if 'Region' in df.columns else [])
+
+
+@traced('load.sibling_history')
+def load_sibling_history(table='enriched', root=STORE_ROOT):
+    """
+    The demand history columns the features need, every observed month (style attributes
+    from styles.csv). Sibling universe for training and the history a new release joins.
+    """
+    columns = SIBLING_KEY_COLS + ['Region', 'GridValue', 'Date', 'Demand']
+    return build_modeling_table(load_table(table, root), dropna=False)[columns]
+
+
+def release_frame_cols(df):
+    """The RELEASE_FRAME_COLS present in a product frame."""
+    return [c for c in RELEASE_FRAME_COLS if c in df.columns]
+
+
+def _internal_frame(df, frame_cols, date_col, value_col, frame_offset=0):
+    """Key columns, month ordinal, integer frame id and demand value of each row."""
+    keys = _key_cols(df)
+    missing = [c for c in keys if c not in df.columns]
+    if missing:
+        raise KeyError(f"Missing sibling key columns: {missing}")
+
+    out = pd.DataFrame({c: df[c].to_numpy() for c in keys})
+    out['Date'] = pd.to_datetime(df[date_col]).to_numpy()
+    out['_month'] = pd.PeriodIndex(out['Date'], freq='M').asi8
+    out['_frame'] = df.groupby(list(frame_cols), observed=True, dropna=False, sort=False).ngroup().to_numpy() + frame_offset
+    out['_value'] = df[value_col].to_numpy(dtype=float) if value_col in df.columns else np.nan
+    return out
+
+
+def _launch_flags(frame):
+    """True on a frame's rows in its first month with positive demand, unless that is the first month of the data."""
+    sold_month = frame['_month'].where(frame['_value'] > 0)
+    first_sale = sold_month.groupby(frame['_frame']).transform('min')
+    return ((frame['_month'] == first_sale) & (first_sale > frame['_month'].min())).to_numpy()
+
+
+def _launch_density(frame, keys, windows):
+    """Frames of the row's sibling group launched in the trailing `window` months (incl. the current one)."""
+    group = frame.groupby(keys, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    month = frame['_month'].to_numpy() - frame['_month'].min()
+    n_groups, n_months = int(group.max()) + 1, int(month.max()) + 1
+
+    # One launch per frame (its launch month can hold one row per Region)
+    launch_rows = np.flatnonzero(frame['_launch'].to_numpy())
+    _, first = np.unique(frame['_frame'].to_numpy()[launch_rows], return_index=True)
+    launch_rows = launch_rows[first]
+
+    # csum[g, j] = launches of group g in months < j
+    counts = np.zeros((n_groups, n_months + 1))
+    np.add.at(counts, (group[launch_rows], month[launch_rows] + 1), 1)
+    csum = np.cumsum(counts, axis=1)
+
+    return {w: csum[group, month + 1] - csum[group, np.maximum(month + 1 - w, 0)] for w in windows}
+
+
+def _share_lags(frame, keys, lags):
+    """A frame's share of its sibling group's demand (same month and Region), k months earlier."""
+    region = ['Region'] if 'Region' in frame.columns else []
+    total = frame.groupby(['_month'] + region + keys, observed=True, dropna=False, sort=False)['_value'].transform('sum')
+    share = np.where(total > 0, frame['_value'] / total.where(total > 0, 1), 0.0)
+    share[np.isnan(frame['_value'].to_numpy())] = np.nan
+
+    panel = DensePanel(frame.assign(_share=share), '_share', keys=region + ['_frame'], agg='mean')
+    return {k: panel.to_rows(panel.lag(k)) for k in lags}
+
+
+def _active_snapshots(history, release):
+    """
+    History rows of the latest month before each release month that the history does
+    not cover, relabelled to that month: the frames still on sale when the release lands.
+    They only count as siblings (no demand, no launch).
+    """
+    hist_months = np.unique(history['_month'])
+    snapshots = []
+    for month in np.unique(release['_month']):
+        prior = hist_months[hist_months <= month]
+        if not len(prior) or prior[-1] == month:
+            continue
+        snap = history[history['_month'] == prior[-1]].copy()
+        snap['_month'] = month
+        snap['Date'] = pd.Period(ordinal=month, freq='M').to_timestamp()
+        snap['_value'] = np.nan
+        snapshots.append(snap)
+    return snapshots
+
+
+def prepare_sibling_history(history, frame_cols=('GridValue',), date_col='Date', value_col='Demand'):
+    """
+    The history in the internal form add_cannibalization_features works on (frame ids and
+    launch flags included). Pass it as `history` to skip that step when scoring many
+    releases against the same history.
+    """
+    past = _internal_frame(history, frame_cols, date_col, value_col)
+    past['_launch'] = _launch_flags(past)
+    return past
+
+
+def _row_keys(df, frame_cols, date_col):
+    """Everything a row's features depend on (sibling keys, frame, Region, month), for looking rows up in a panel."""
+    arrays = [df[c].to_numpy() for c in dict.fromkeys(SIBLING_KEY_COLS + list(frame_cols) + ['Region'])]
+    return pd.MultiIndex.from_arrays(arrays + [pd.PeriodIndex(pd.to_datetime(df[date_col]), freq='M').asi8])
+
+
+def add_cannibalization_features(df, history=None, panel=None, frame_cols=('GridValue',),
+                                 history_frame_cols=('GridValue',), date_col='Date', value_col='Demand'):
+    """
+    Copy of `df` with the CANNIBALIZATION_FEATURES columns added (row order kept).
+
+    Training: call on the demand panel with the full history (load_sibling_history()) as
+    `panel`; the features are computed over `panel` and looked up for the rows of `df` by
+    frame, Region and month. Scoring: pass the new-release rows as `df` (identified by
+    `frame_cols`, one row per frame x Region) and the demand history as `history` (raw, or
+    from prepare_sibling_history). A release frame counts as launched in its first month
+    and has no share history (NaN), like a frame's first months in the panel; the other
+    frames of the release are not its siblings.
+    """
+    if panel is not None:
+        full = add_cannibalization_features(panel, frame_cols=frame_cols, date_col=date_col, value_col=value_col)
+        # Rows with the same keys (a GridValue listed under two StyleCodes) have the same features
+        full_keys = _row_keys(full, frame_cols, date_col)
+        unique = ~full_keys.duplicated()
+        full = full[unique]
+        pos = full_keys[unique].get_indexer(_row_keys(df, frame_cols, date_col))
+        if (pos < 0).any():
+            raise KeyError(f"{int((pos < 0).sum())} rows are not in the sibling panel")
+        df = df.copy()
+        for col in CANNIBALIZATION_FEATURES:
+            df[col] = full[col].to_numpy()[pos]
+        return df
+
+    if history is not None:
+        past = history if '_launch' in history.columns else prepare_sibling_history(
+            history, history_frame_cols, date_col, value_col)
+        release = _internal_frame(df, frame_cols, date_col, value_col,
+                                  frame_offset=int(past['_frame'].max()) + 1 if len(past) else 0)
+        # Release rows only add their own frame: its rows in the month and its launch
+        own_rows = release.groupby(['_frame', '_month'], sort=False)['_month'].transform('size').to_numpy()
+        own_age = (release['_month'] - release.groupby('_frame')['_month'].transform('min')).to_numpy()
+        release['_launch'] = False
+        release['_sibling'] = False
+        parts = ([past.assign(_sibling=True)]
+                 + [s.assign(_launch=False, _sibling=True) for s in _active_snapshots(past, release)] + [release])
+    else:
+        release = _internal_frame(df, frame_cols, date_col, value_col)
+        release['_launch'] = _launch_flags(release)
+        release['_sibling'] = True
+        own_rows, own_age = 0, None
+        parts = [release]
+
+    frame = pd.concat(parts, ignore_index=True) if len(parts) > 1 else release
+    # The release rows are always the last len(df) rows of the stacked frame
+    rows = np.arange(len(frame) - len(release), len(frame))
+
+    df = df.copy()
+    for level, keys in SIBLING_LEVELS.items():
+        counts = frame.groupby(['_month'] + keys, observed=True, dropna=False, sort=False)['_sibling'].transform('sum')
+        df[sibling_count_col(level)] = counts.to_numpy()[rows] + own_rows
+
+        for w, values in _launch_density(frame, keys, LAUNCH_WINDOWS).items():
+            df[launch_density_col(level, w)] = values[rows] + (0 if own_age is None else own_age < w)
+
+        for k, values in _share_lags(frame, keys, SHARE_LAGS).items():
+            df[share_lag_col(level, k)] = values[rows]
+    return df
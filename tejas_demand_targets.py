@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized builders for the seasonality flags and the forward-window demand
+# targets (e.g. '4m_demand') that additional_features.ipynb used to compute with
+# row-by-row loops and a per-series groupby lambda.
+
+# Horizons (in months) supported out of the box; '4m_demand' is the modeling target
+HORIZONS = (1, 3, 4, 6)
+SERIES_KEYS = ['Region', 'GridValue']
+
+
+def target_col(horizon):
+    """Name of the forward-demand column for a horizon, e.g. 4 -> '4m_demand'."""
+    return f'{horizon}m_demand'
+
+
+def add_calendar_flags(df, date_col='Date'):
+    """Add the is_summer / is_holiday_season / is_insurance_reset 0/1 flags."""
+    df = df.copy()
+    month = pd.to_datetime(df[date_col]).dt.month.to_numpy()
+
+    # Summer: June-August
+    df['is_summer'] = ((month >= 6) & (month <= 8)).astype(int)
+    # Holiday season: November-December
+    df['is_holiday_season'] = ((month == 11) | (month == 12)).astype(int)
+    # Insurance benefits reset in January
+    df['is_insurance_reset'] = (month == 1).astype(int)
+    return df
+
+
+def _series_end_positions(sorted_df, keys):
+    """For each row of a frame sorted by `keys`, the position of the last row of its series."""
+    n = len(sorted_df)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # A new series starts wherever any key changes from the previous row
+    starts = np.zeros(n, dtype=bool)
+    starts[0] = True
+    for key in keys:
+        values = sorted_df[key].to_numpy()
+        starts[1:] |= values[1:] != values[:-1]
+
+    run_id = np.cumsum(starts) - 1
+    ends = np.r_[np.flatnonzero(starts)[1:] - 1, n - 1]
+    return ends[run_id]
+
+
+def add_forward_demand(df, horizons=(4,), value_col='Demand', keys=None, date_col='Date'):
+    """
+    Add one '<h>m_demand' column per horizon: the sum of `value_col` over the
+    next h rows of the same series (the current month is excluded).
+    Rows without h future months (or with a missing value in the window) get NaN,
+    matching x.shift(-1).iloc[::-1].rolling(h).sum().iloc[::-1] per series.
+
+    All horizons are computed in one pass from a single cumulative sum over the
+    frame sorted by `keys` + `date_col`. The returned frame keeps that sort order.
+    """
+    keys = list(SERIES_KEYS if keys is None else keys)
+    df = df.sort_values(keys + [date_col], kind='stable').reset_index(drop=True)
+
+    n = len(df)
+    values = df[value_col].to_numpy(dtype=float)
+    missing = np.isnan(values)
+
+    # Prefix sums with a leading zero: sum(values[a:b]) == csum[b] - csum[a]
+    csum = np.r_[0.0, np.cumsum(np.where(missing, 0.0, values))]
+    nan_csum = np.r_[0, np.cumsum(missing)]
+
+    series_end = _series_end_positions(df, keys)
+    pos = np.arange(n)
+
+    for h in horizons:
+        # Window is rows pos+1 .. pos+h, which must stay inside the series
+        last = pos + h
+        valid = last <= series_end
+        hi = np.minimum(last, n - 1) + 1
+
+        window_sum = csum[hi] - csum[pos + 1]
+        window_nans = nan_csum[hi] - nan_csum[pos + 1]
+        df[target_col(h)] = np.where(valid & (window_nans == 0), window_sum, np.nan)
+
+    return df
+
+
+def horizon_increments(df, horizons=HORIZONS):
+    """
+    (rows, horizons) demand of each window between consecutive horizons, e.g. for
+    (1, 3, 4, 6): months 1, 2-3, 4 and 5-6. Needs the '<h>m_demand' columns.
+    """
+    totals = np.column_stack([df[target_col(h)].to_numpy(dtype=float) for h in sorted(horizons)])
+    return np.diff(totals, axis=1, prepend=0.0)
+
+
+def horizon_totals(increments):
+    """Cumulative forward demand per horizon from window increments (floored at 0, so never decreasing)."""
+    return np.cumsum(np.maximum(0, np.asarray(increments, dtype=float)), axis=1)
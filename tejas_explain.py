@@ -0,0 +1,293 @@
+import os
+import re
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from tejas_model_registry import load_model
+from tejas_pools import model_matrix, build_pool
+from tejas_cannibalization import CANNIBALIZATION_FEATURES
+from tejas_lookalike import ANALOG_FEATURES
+from tejas_score import DEFAULT_REGIONS, scoring_frame
+from tejas_trace import span, start_run
+
+# Per-row explanations of a registered CatBoost model: SHAP values per feature, summed
+# into feature families and rolled up by Brand x Region.
+#
+# 1. Every row is hashed on its model-matrix values (pd.util.hash_pandas_object). SHAP
+#    rows already computed for the same model version and row hash are read from
+#    .cache/explain/<model>/<version>/, and a row repeated across regions or scenarios
+#    is computed once, so a re-run only pays for the rows that changed.
+# 2. The remaining rows go through CatBoost's TreeSHAP (get_feature_importance,
+#    type='ShapValues') in batches of --batch-rows. With --workers > 1 the batches run
+#    in a process pool (the model loaded once per worker, cpu_count // workers CatBoost
+#    threads each), so building one batch's Pool overlaps another batch's SHAP pass.
+#    New rows are appended to the cache as one shard file per run.
+# 3. Features are summed into families (cannibalization, analogs, trend lags, momentum,
+#    calendar, trends, attributes). Baseline (the model's expected value) plus the
+#    families adds up to the raw prediction: the P50 of a MultiQuantile model, the
+#    cumulative 4-month total (before the floor at 0) of a multi-horizon model. A
+#    family's percent is its effect relative to the prediction without it
+#    ("cannibalization -30%").
+# 4. Written next to the predictions file: <stem>_explanations.csv (one row per
+#    prediction, with the two largest drivers spelled out) and
+#    <stem>_explanation_rollup.csv (rows, mean and total contribution per Brand x
+#    Region x family).
+#
+#   python tejas_explain.py final_products.csv --model champion
+#   python tejas_order_optimizer.py final_products.csv --budget 250000 --explain
+
+CACHE_DIR = os.path.join('.cache', 'explain')
+DEFAULT_BATCH_ROWS = 20_000
+EXPLAIN_HORIZON = 4  # months; the horizon explained for multi-horizon models
+BASELINE_COL = 'Baseline'
+ID_COLS = ['Style', 'COLORDESCRIPTION', 'Color_Base', 'Size', 'BrandName', 'Region']
+ROLLUP_BY = ['BrandName', 'Region']
+FAMILIES = ['cannibalization', 'analogs', 'trend_lags', 'momentum', 'calendar', 'trends', 'attributes']
+TOP_DRIVERS = 2
+
+
+def feature_family(feature):
+    """Family a model feature is rolled up into (one of FAMILIES)."""
+    if feature in CANNIBALIZATION_FEATURES:
+        return 'cannibalization'
+    if feature in ANALOG_FEATURES:
+        return 'analogs'
+    if re.search(r'_lag\d+$', feature):
+        return 'trend_lags'
+    if '_momentum_' in feature:
+        return 'momentum'
+    if feature.startswith('is_'):
+        return 'calendar'
+    if feature.startswith('Trend_') or feature in ('Glasses', 'Sunglasses'):
+        return 'trends'
+    return 'attributes'
+
+
+def explained_output(shap, model, meta):
+    """(rows, features + 1) SHAP values of the prediction being explained (see header)."""
+    if shap.ndim == 2:
+        return shap
+    if meta.get('horizons'):
+        # Dimensions are window increments: the cumulative total is their sum
+        horizons = list(meta['horizons'])
+        k = horizons.index(EXPLAIN_HORIZON) if EXPLAIN_HORIZON in horizons else len(horizons) - 1
+        return shap[:, :k + 1].sum(axis=1)
+    # MultiQuantile: the dimension closest to the median
+    alphas = re.search(r'alpha=([\d.,]+)', model.get_params().get('loss_function', ''))
+    levels = [float(a) for a in alphas.group(1).split(',')] if alphas else [0.5] * shap.shape[1]
+    return shap[:, int(np.argmin(np.abs(np.asarray(levels) - 0.5)))]
+
+
+class ShapCache:
+    """SHAP rows of one model version keyed by feature-row hash; each save adds one shard file."""
+
+    def __init__(self, name, version, cache_dir=CACHE_DIR):
+        self.path = os.path.join(cache_dir, name, version)
+        hashes, values = [], []
+        if os.path.isdir(self.path):
+            for fname in sorted(os.listdir(self.path)):
+                if fname.endswith('.npz'):
+                    with np.load(os.path.join(self.path, fname)) as shard:
+                        hashes.append(shard['hashes'])
+                        values.append(shard['values'])
+        self.hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+        self.values = np.vstack(values) if values else None
+        # Concurrent runs may have stored the same row twice
+        self.hashes, first = np.unique(self.hashes, return_index=True)
+        if self.values is not None:
+            self.values = self.values[first]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def get(self, hashes):
+        """(hit mask over `hashes`, SHAP rows of the hits)."""
+        pos = pd.Index(self.hashes).get_indexer(hashes) if len(self.hashes) else np.full(len(hashes), -1)
+        hit = pos >= 0
+        return hit, (self.values[pos[hit]] if hit.any() else None)
+
+    def save(self, hashes, values):
+        if not len(hashes):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # Write-then-rename: a reader never sees a half-written shard
+        path = os.path.join(self.path, f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}.npz')
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, hashes=np.asarray(hashes, dtype=np.uint64), values=values)
+        os.replace(path + '.tmp', path)
+
+
+# --- SHAP workers ---------------------------------------------------------
+# Each worker process loads the model once (pool initializer); tasks carry only
+# their batch of model-matrix rows.
+
+_WORKER = {}
+
+
+def _init_worker(name, version):
+    _WORKER['model'], _WORKER['meta'] = load_model(name, version)
+
+
+def _shap_batch(X, thread_count, model=None, meta=None):
+    if model is None:
+        model, meta = _WORKER['model'], _WORKER['meta']
+    shap = model.get_feature_importance(build_pool(X, None, meta['categorical_cols']), type='ShapValues',
+                                        thread_count=thread_count)
+    return explained_output(shap, model, meta)
+
+
+def compute_shap(model, meta, X, workers=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """(rows, features + 1) SHAP values of model matrix X, batch by batch (see header)."""
+    if not len(X):
+        return np.empty((0, len(meta['features']) + 1))
+    batches = [X.iloc[i:i + batch_rows] for i in range(0, len(X), batch_rows)]
+    n_cpu = os.cpu_count() or 1
+    workers = max(1, min(workers or n_cpu, len(batches)))
+    thread_count = max(1, n_cpu // workers)
+    if workers == 1:
+        return np.vstack([_shap_batch(batch, thread_count, model, meta) for batch in batches])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(meta['name'], meta['version'])) as pool:
+        return np.vstack(list(pool.map(_shap_batch, batches, [thread_count] * len(batches))))
+
+
+def explain_frame(model, meta, df, cache=None, workers=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    SHAP values of every row of a feature-ready frame: one column per model feature plus
+    Baseline, summing to the raw prediction. Only rows missing from `cache` (a
+    ShapCache) are computed. Returns (values DataFrame, stats dict).
+    """
+    X = model_matrix(df, meta['features'], meta['categorical_cols'])
+    hashes = pd.util.hash_pandas_object(X, index=False).to_numpy()
+    unique, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+
+    values = np.empty((len(unique), len(meta['features']) + 1))
+    hit = np.zeros(len(unique), dtype=bool)
+    if cache is not None:
+        hit, cached = cache.get(unique)
+        if hit.any():
+            values[hit] = cached
+    if not hit.all():
+        new = compute_shap(model, meta, X.iloc[first[~hit]], workers, batch_rows)
+        values[~hit] = new
+        if cache is not None:
+            cache.save(unique[~hit], new)
+
+    stats = {'rows': len(X), 'unique_rows': len(unique), 'cached': int(hit.sum()), 'computed': int((~hit).sum())}
+    out = pd.DataFrame(values[inverse], columns=list(meta['features']) + [BASELINE_COL], index=df.index)
+    return out, stats
+
+
+def family_contributions(values):
+    """Per-row contribution of each feature family present (columns in FAMILIES order)."""
+    features = [c for c in values.columns if c != BASELINE_COL]
+    groups = {}
+    for feature in features:
+        groups.setdefault(feature_family(feature), []).append(feature)
+    return pd.DataFrame({f: values[groups[f]].sum(axis=1) for f in FAMILIES if f in groups}, index=values.index)
+
+
+def describe_drivers(families, prediction, top=TOP_DRIVERS):
+    """The `top` largest family effects of each row, e.g. 'cannibalization -30% (-42 units)'."""
+    effect = families.to_numpy()
+    # Relative to the prediction without the family; undefined when that is under one unit
+    without = prediction.to_numpy()[:, None] - effect
+    pct = np.where(np.abs(without) >= 1, effect / np.where(without == 0, 1, without), np.nan)
+    order = np.argsort(-np.abs(effect), axis=1)[:, :top]
+    names = np.asarray(families.columns)
+    drivers = []
+    for i, cols in enumerate(order):
+        parts = [f"{names[j]} {pct[i, j]:+.0%} ({effect[i, j]:+.0f} units)" if np.isfinite(pct[i, j])
+                 else f"{names[j]} {effect[i, j]:+.0f} units" for j in cols]
+        drivers.append('; '.join(parts))
+    return pd.Series(drivers, index=families.index)
+
+
+def explanation_table(df, values, id_cols=ID_COLS):
+    """One row per prediction: identifying columns, raw prediction, Baseline, SHAP_<family>, Top_Drivers."""
+    families = family_contributions(values)
+    out = df[[c for c in id_cols if c in df.columns]].copy()
+    out['Explained_Prediction'] = values.sum(axis=1)
+    out[BASELINE_COL] = values[BASELINE_COL]
+    for family in families.columns:
+        out[f'SHAP_{family}'] = families[family]
+    out['Top_Drivers'] = describe_drivers(families, out['Explained_Prediction'])
+    return out
+
+
+def explanation_rollup(table, by=ROLLUP_BY):
+    """Rows, mean / total contribution and share of the absolute effect per group x family."""
+    by = [c for c in by if c in table.columns]
+    shap_cols = [c for c in table.columns if c.startswith('SHAP_')]
+    long = table.melt(id_vars=by, value_vars=shap_cols, var_name='Family', value_name='Contribution')
+    long['Family'] = long['Family'].str.removeprefix('SHAP_')
+    rollup = long.groupby(by + ['Family'], sort=False, observed=True)['Contribution'].agg(
+        Rows='size', Mean_Contribution='mean', Total_Contribution='sum').reset_index()
+    abs_total = rollup['Total_Contribution'].abs()
+    group_abs = abs_total.groupby([rollup[c] for c in by]).transform('sum') if by else abs_total.sum()
+    rollup['Share_of_Effect'] = abs_total / np.maximum(group_abs, 1e-9)
+    return rollup.sort_values(by + ['Share_of_Effect'], ascending=[True] * len(by) + [False])
+
+
+def explanation_paths(predictions_path):
+    """(<stem>_explanations.csv, <stem>_explanation_rollup.csv) next to a predictions file."""
+    stem = os.path.splitext(predictions_path)[0]
+    return f'{stem}_explanations.csv', f'{stem}_explanation_rollup.csv'
+
+
+def explain_predictions(model, meta, df, predictions_path, workers=None, batch_rows=DEFAULT_BATCH_ROWS,
+                        rollup_by=ROLLUP_BY, use_cache=True):
+    """Explain every row of a feature-ready frame and write both tables next to `predictions_path`."""
+    start_t = time.time()
+    cache = ShapCache(meta['name'], meta['version']) if use_cache else None
+    with span('shap', rows=len(df)) as s:
+        values, stats = explain_frame(model, meta, df, cache, workers, batch_rows)
+        s.attrs['computed'] = stats['computed']
+    print(f"SHAP values for {stats['rows']} rows ({stats['unique_rows']} distinct, {stats['cached']} cached, "
+          f"{stats['computed']} computed) of '{meta['name']}' version {meta['version']} "
+          f"in {time.time() - start_t:.2f} seconds")
+
+    table = explanation_table(df, values)
+    rollup = explanation_rollup(table, rollup_by)
+    table_path, rollup_path = explanation_paths(predictions_path)
+    with span('write', rows=len(table)):
+        table.to_csv(table_path, index=False)
+        rollup.to_csv(rollup_path, index=False)
+    print(f"Saved explanations to {table_path} and {rollup_path}")
+    return table, rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-row SHAP explanations with Brand / Region / feature-family rollups.')
+    parser.add_argument('input', help='Product CSV (final_products.csv format, or already feature-ready)')
+    parser.add_argument('--model', default='champion', help='Registered model name')
+    parser.add_argument('--version', default='latest')
+    parser.add_argument('--regions', nargs='+', default=DEFAULT_REGIONS)
+    parser.add_argument('--predictions', default='final_products_order_recommendations.csv',
+                        help='Predictions file the explanation tables are written next to')
+    parser.add_argument('--workers', type=int, default=None, help='SHAP worker processes (default: one per CPU)')
+    parser.add_argument('--batch-rows', type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument('--rollup-by', nargs='+', default=ROLLUP_BY)
+    parser.add_argument('--no-cache', action='store_true', help='Recompute every row and leave the cache untouched')
+    args = parser.parse_args()
+
+    start_run('explain')
+    with span('load_model'):
+        model, meta = load_model(args.model, args.version)
+    with span('features') as s:
+        df = scoring_frame(pd.read_csv(args.input, low_memory=False), meta, args.regions)
+        s.rows = len(df)
+    table, rollup = explain_predictions(model, meta, df, args.predictions, args.workers, args.batch_rows,
+                                        args.rollup_by, not args.no_cache)
+
+    overall = table[[c for c in table.columns if c.startswith('SHAP_')]].abs().mean().sort_values(ascending=False)
+    print("Mean absolute contribution per family:")
+    for col, value in overall.items():
+        print(f"  {col.removeprefix('SHAP_'):<16} {value:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
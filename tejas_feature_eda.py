@@ -1,80 +1,84 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import glob
 import os
 
-def main():
-    print("Loading base demand data...")
-    # Load base demand data
-    demand_df = pd.read_csv('demand_monthly.csv')
-    
+from tejas_feature_store import write_table
+from tejas_trend_index import TrendIndex
+
+# Map brands to predefined pricing/market tiers. 
+# Adjust this mapping based on domain knowledge if needed.
+BRAND_TIER_MAP = {
+    'Nike': 'Sport',
+    'Lacoste': 'Premium',
+    'Calvin Klein': 'Premium'
+}
+
+def brand_tier(brand):
+    """Brand_Tier for a Series of brand names (fallback to 'Other' if brand is not in map)."""
+    return brand.map(BRAND_TIER_MAP).fillna('Other')
+
+def lookalike_id(brand, color_base, material):
+    """Coarse "lookalike" key shared by frames of the same Brand, base color and material."""
+    # Fill NAs with strings to ensure concatenation works
+    brand_feat = brand.fillna('UnknownBrand').astype(str)
+    color_feat = color_base.fillna('UnknownColor').astype(str)
+    mat_feat = material.fillna('UnknownMaterial').astype(str)
+    return brand_feat + "_" + color_feat + "_" + mat_feat
+
+def parse_price(values):
+    """Price column as floats; the product files mix '104,50' and '112.0' notation."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    text = values.astype(str).str.strip()
+    comma = text.str.contains(',', regex=False)
+    text = text.where(~comma, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(text, errors='coerce')
+
+def enrich_demand(demand_df):
+    """Add Brand_Tier, Lookalike_ID and the Google Trends columns to raw monthly demand rows."""
+    demand_df = demand_df.copy()
+
     # 1. Feature Engineering: Brand Pricing Tiers
-    # Map brands to predefined pricing/market tiers. 
-    # Adjust this mapping based on domain knowledge if needed.
     print("Engineering Brand_Tier feature...")
-    brand_tier_map = {
-        'Nike': 'Sport',
-        'Lacoste': 'Premium',
-        'Calvin Klein': 'Premium'
-    }
-    # Fallback to 'Other' if brand is not in map
-    demand_df['Brand_Tier'] = demand_df['BrandName'].map(brand_tier_map).fillna('Other')
+    demand_df['Brand_Tier'] = brand_tier(demand_df['BrandName'])
 
     # 2. Feature Engineering: "Lookalike" Product ID
     print("Engineering Lookalike_ID feature...")
-    # Fill NAs with strings to ensure concatenation works
-    brand_feat = demand_df['BrandName'].fillna('UnknownBrand')
-    color_feat = demand_df['Color_Base'].fillna('UnknownColor')
-    mat_feat = demand_df['Material'].fillna('UnknownMaterial')
-    demand_df['Lookalike_ID'] = brand_feat + "_" + color_feat + "_" + mat_feat
+    demand_df['Lookalike_ID'] = lookalike_id(demand_df['BrandName'], demand_df['Color_Base'], demand_df['Material'])
 
-    # Convert 'Month' to datetime for merging with Google Trends
+    # Convert 'Month' to datetime for the Google Trends lookup
     demand_df['Date'] = pd.to_datetime(demand_df['Month'])
 
-    # 3. Merge original Google Trends
-    print("Merging original Google Trends...")
-    orig_trends = pd.read_csv('opticalsun_googletrends.csv')
-    orig_trends['Date'] = pd.to_datetime(orig_trends['Time'])
-    # Drop 'Time' to avoid duplication
-    orig_trends = orig_trends.drop(columns=['Time'])
-    demand_df = demand_df.merge(orig_trends, on='Date', how='left')
-
-    # 4. Merge New Google Trends (Brands, Materials, FSA)
-    print("Merging new Google Trends datasets...")
-    trends_path = 'VSP Vision Datasets/google trends/'
-    trend_files = glob.glob(os.path.join(trends_path, '*.csv'))
-    
-    for file in trend_files:
-        temp_df = pd.read_csv(file)
-        
-        # Ensure it has exactly two columns: 'Time' and '{Search_Term}'
-        if 'Time' in temp_df.columns and len(temp_df.columns) == 2:
-            val_col = temp_df.columns[1] # E.g., 'FSA glasses'
-            
-            # Rename the column to be a bit more pythonic
-            clean_col_name = "Trend_" + val_col.replace(' ', '_')
-            temp_df = temp_df.rename(columns={val_col: clean_col_name})
-            
-            temp_df['Date'] = pd.to_datetime(temp_df['Time'])
-            temp_df = temp_df.drop(columns=['Time'])
-            
-            # Merge into demand
-            demand_df = demand_df.merge(temp_df, on='Date', how='left')
-        else:
-            print(f"Skipping {file} due to unexpected structure.")
+    # 3./4. Attach the Google Trends (original optical/sun trends + Brands, Materials, FSA)
+    # from the shared per-month trend index instead of merging every CSV onto the rows
+    print("Attaching Google Trends from the trend index...")
+    trends = TrendIndex.load()
+    demand_df = trends.attach(demand_df, trends.base_columns)
 
     # Sort and clean up
     demand_df = demand_df.sort_values(by=['Region', 'GridValue', 'Date']).reset_index(drop=True)
+    return demand_df
+
+def main():
+    print("Loading base demand data...")
+    # Load base demand data
+    demand_df = pd.read_csv('demand_monthly.csv')
+
+    demand_df = enrich_demand(demand_df)
     
-    # Save the enriched dataset
+    # Save the enriched dataset (CSV kept for the notebooks, Parquet store for everything else)
     output_filename = 'demand_monthly_enriched.csv'
     demand_df.to_csv(output_filename, index=False)
     print(f"Successfully saved enriched dataset to {output_filename}")
+    written = write_table(demand_df, 'enriched')
+    print(f"Wrote {len(written)} partitions to the feature store table 'enriched'")
     print(f"New shape: {demand_df.shape}")
 
     # --- EDA Visualization ---
+    # Plotting libraries are only needed here, so importing the enrichment helpers stays cheap
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     print("\nGenerating EDA Plots...")
     os.makedirs('EDA_Plots', exist_ok=True)
     
@@ -0,0 +1,340 @@
+import os
+import glob
+import shutil
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tejas_trend_index import _parse_pct
+
+# Columnar feature store that replaces the CSV hand-off chain
+# (demand_monthly.csv -> demand_monthly_enriched.csv -> final_demand.csv).
+#
+# Layout on disk (one Parquet file per month x Region partition):
+#   feature_store/<table>/month=2023-09/region=AMER/part-0.parquet
+#
+# Partitioning by month means a new month of demand only writes its own
+# partitions instead of rewriting the whole history.
+
+STORE_ROOT = 'feature_store'
+
+# Every string column in the demand tables is stored as a categorical
+# (dictionary-encoded in Parquet) so it is never re-inferred on load.
+CATEGORICAL_COLS = [
+    'Collection', 'BrandLine', 'StyleCode', 'Style', 'Region', 'Size', 'Color',
+    'Color_Base', 'Color_Finish', 'OpticalOrSun', 'BrandName', 'Brand_Tier',
+    'Lookalike_ID', 'Shape', 'FrameType', 'Material'
+]
+
+# One fixed schema per table: integer identifiers stay int64, every other numeric column
+# (demand, trends, flags, targets) is float64 and '20.00%' strings become 0.2 fractions.
+# Partitions rewritten from computed values (append_demand_month, complete_targets) then
+# match the ones converted from CSV; Arrow cannot merge int64 with double on read.
+INTEGER_COLS = ['GridValue']
+PCT_SUFFIX = '_pct_change'
+
+# Rows per DataFrame yielded by iter_table()
+DEFAULT_CHUNK_ROWS = 100_000
+# Parquet row group size: iter_table decodes one row group of a file at a time
+ROW_GROUP_ROWS = 10_000
+
+# Fallback CSVs for each table when the store has not been built yet
+LEGACY_CSVS = {
+    'enriched': 'demand_monthly_enriched.csv',
+    'final_demand': 'final_demand.csv',
+}
+
+
+def apply_store_dtypes(df):
+    """Cast a demand frame to the explicit dtypes (the fixed schema) used by the store."""
+    df = df.copy()
+    # CSV round-trips leave the old pandas index behind as 'Unnamed: 0'
+    df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed:')])
+
+    if 'Date' not in df.columns and 'Month' in df.columns:
+        df['Date'] = pd.to_datetime(df['Month'])
+    df['Date'] = pd.to_datetime(df['Date'])
+
+    for col in df.columns:
+        if col in CATEGORICAL_COLS:
+            df[col] = df[col].astype('category')
+        elif col in INTEGER_COLS:
+            df[col] = df[col].astype('int64')
+        elif col.endswith(PCT_SUFFIX):
+            df[col] = _parse_pct(df[col]).astype('float64')
+        elif pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            df[col] = df[col].astype('float64')
+    return df
+
+
+def _partition_dir(root, table, month, region):
+    return os.path.join(root, table, f'month={month}', f'region={region}')
+
+
+def write_table(df, table, root=STORE_ROOT):
+    """
+    Write a frame into the store, one file per (month, Region) partition.
+    Only the partitions present in `df` are replaced; every other month is left untouched.
+    Returns the list of files written.
+    """
+    # Imported here because tejas_panel builds on this module
+    from tejas_panel import VOCAB_FILE, update_vocabulary
+
+    df = apply_store_dtypes(df)
+    # New category values get their shared codes here, not on a later load
+    update_vocabulary(df, os.path.join(root, VOCAB_FILE))
+    months = df['Date'].dt.strftime('%Y-%m')
+
+    written = []
+    for (month, region), part in df.groupby([months, df['Region'].astype(str)], observed=True, sort=True):
+        part_dir = _partition_dir(root, table, month, region)
+        # Replace the partition atomically-ish: drop whatever was there before
+        if os.path.isdir(part_dir):
+            shutil.rmtree(part_dir)
+        os.makedirs(part_dir)
+
+        path = os.path.join(part_dir, 'part-0.parquet')
+        # Drop unused categories so each file only carries its own dictionary
+        part = part.copy()
+        for col in part.select_dtypes('category').columns:
+            part[col] = part[col].cat.remove_unused_categories()
+        part.to_parquet(path, index=False, row_group_size=ROW_GROUP_ROWS)
+        written.append(path)
+    return written
+
+
+def list_partitions(table, root=STORE_ROOT):
+    """Return the sorted list of (month, region, path) partitions for a table."""
+    parts = []
+    for path in glob.glob(os.path.join(root, table, 'month=*', 'region=*', '*.parquet')):
+        region_dir = os.path.dirname(path)
+        month = os.path.basename(os.path.dirname(region_dir)).split('=', 1)[1]
+        region = os.path.basename(region_dir).split('=', 1)[1]
+        parts.append((month, region, path))
+    return sorted(parts)
+
+
+def table_exists(table, root=STORE_ROOT):
+    return len(list_partitions(table, root)) > 0
+
+
+def _normalize_dictionaries(table):
+    """Give every dictionary column the same index width so partitions can be concatenated."""
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        fields.append(field)
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+
+def _select_partitions(table, root, months=None, regions=None):
+    parts = list_partitions(table, root)
+    if months is not None:
+        parts = [p for p in parts if p[0] in set(months)]
+    if regions is not None:
+        parts = [p for p in parts if p[1] in set(regions)]
+    if not parts:
+        raise FileNotFoundError(f"No partitions found for table '{table}' under {root}")
+    return parts
+
+
+def read_table(table, root=STORE_ROOT, months=None, regions=None, columns=None):
+    """
+    Read a table from the store. `months` ('YYYY-MM' strings) and `regions`
+    prune partitions before any file is opened.
+    """
+    parts = _select_partitions(table, root, months, regions)
+    tables = [_normalize_dictionaries(pq.read_table(path, columns=columns)) for _, _, path in parts]
+    # Each file has its own dictionary; Arrow unifies them into one categorical on conversion
+    combined = pa.concat_tables(tables, promote_options='default')
+    df = combined.to_pandas()
+
+    for col in CATEGORICAL_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def load_table(table, root=STORE_ROOT, **kwargs):
+    """Load a table from the store, falling back to its legacy CSV if the store is empty."""
+    if table_exists(table, root):
+        return read_table(table, root, **kwargs)
+
+    csv_path = LEGACY_CSVS[table]
+    print(f"Feature store table '{table}' not found, falling back to {csv_path}...")
+    df = apply_store_dtypes(pd.read_csv(csv_path, low_memory=False))
+    if kwargs.get('columns') is not None:
+        df = df[kwargs['columns']]
+    return df
+
+
+def iter_table(table, root=STORE_ROOT, months=None, regions=None, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS,
+               interleave=False):
+    """
+    Stream a table as DataFrames of about `chunk_rows` rows, so memory stays flat in the
+    table size. By default partitions are read one after another. With `interleave` every
+    chunk takes an equal slice of each partition instead (all months and regions mixed,
+    as SGD wants). Falls back to chunked reads of the legacy CSV, in file order.
+    """
+    if not table_exists(table, root):
+        csv_path = LEGACY_CSVS[table]
+        print(f"Feature store table '{table}' not found, streaming {csv_path}...")
+        # Date / Region are needed for the month / region filters even when not requested
+        usecols = None if columns is None else lambda c: c in set(columns) | {'Date', 'Month', 'Region'}
+        for chunk in pd.read_csv(csv_path, usecols=usecols, chunksize=chunk_rows, low_memory=False):
+            chunk = apply_store_dtypes(chunk)
+            if months is not None:
+                chunk = chunk[chunk['Date'].dt.strftime('%Y-%m').isin(set(months))]
+            if regions is not None:
+                chunk = chunk[chunk['Region'].astype(str).isin(set(regions))]
+            yield chunk[columns] if columns is not None else chunk
+        return
+
+    parts = _select_partitions(table, root, months, regions)
+    if not interleave:
+        for _, _, path in parts:
+            for piece in _iter_slices(path, columns, chunk_rows):
+                yield piece.to_pandas()
+        return
+
+    readers = [_iter_slices(path, columns, max(1, chunk_rows // len(parts))) for _, _, path in parts]
+    while readers:
+        pieces = []
+        for reader in list(readers):
+            piece = next(reader, None)
+            if piece is None:
+                readers.remove(reader)
+            else:
+                pieces.append(_normalize_dictionaries(piece))
+        if pieces:
+            # Per-file dictionaries are unified into one categorical per column, as in read_table
+            yield pa.concat_tables(_decode_wide_dictionaries(pieces), promote_options='default').to_pandas()
+
+
+def _is_wide(piece, name):
+    """A column that is not dictionary-encoded, or whose dictionary outnumbers the piece's rows."""
+    column = piece.column(name)
+    return not pa.types.is_dictionary(column.type) or any(len(c.dictionary) > piece.num_rows for c in column.chunks)
+
+
+def _decode_wide_dictionaries(pieces):
+    """
+    Decode dictionary columns to plain values where a dictionary is larger than the rows
+    it encodes, in every piece so they still concatenate. A categorical's Parquet pages
+    carry the partition's whole category list (e.g. every Style), so without this a
+    chunk costs the catalog size rather than its own rows.
+    """
+    encoded = {field.name for piece in pieces for field in piece.schema if pa.types.is_dictionary(field.type)}
+    wide = {name for name in encoded if any(_is_wide(piece, name) for piece in pieces)}
+    decoded = []
+    for piece in pieces:
+        for name in wide:
+            field = piece.schema.field(name)
+            if pa.types.is_dictionary(field.type):
+                piece = piece.set_column(piece.schema.get_field_index(name), name,
+                                         piece.column(name).cast(field.type.value_type))
+        decoded.append(piece)
+    return decoded
+
+
+def _iter_slices(path, columns, slice_rows):
+    """Arrow slices of one Parquet file, decoding one row group at a time (iter_batches reads ahead)."""
+    parquet_file = pq.ParquetFile(path)
+    for i in range(parquet_file.num_row_groups):
+        group = _decode_wide_dictionaries([parquet_file.read_row_group(i, columns=columns)])[0]
+        for offset in range(0, group.num_rows, slice_rows):
+            yield group.slice(offset, slice_rows)
+
+
+def load_final_demand(root=STORE_ROOT, **kwargs):
+    """Modeling entry point: the final_demand table with store dtypes applied."""
+    return load_table('final_demand', root, **kwargs)
+
+
+def append_demand_month(new_demand_df, root=STORE_ROOT):
+    """
+    Incremental append of raw monthly demand rows (demand_monthly.csv format).
+    Only the new rows are enriched and only their (month, Region) partitions are written.
+    """
+    # Imported here because tejas_feature_eda writes into this store as well
+    from tejas_feature_eda import enrich_demand
+
+    enriched = enrich_demand(new_demand_df)
+    written = write_table(enriched, 'enriched', root)
+    print(f"Appended {len(enriched)} rows into {len(written)} partition(s) of 'enriched'.")
+    return written
+
+
+def build_from_csvs(root=STORE_ROOT):
+    """One-off migration: convert the existing CSV chain into the store."""
+    for table, csv_path in LEGACY_CSVS.items():
+        if not os.path.exists(csv_path):
+            print(f"Skipping {table}: {csv_path} not found.")
+            continue
+        print(f"Converting {csv_path} -> {root}/{table}/ ...")
+        df = pd.read_csv(csv_path, low_memory=False)
+        written = write_table(df, table, root)
+        print(f"  wrote {len(written)} partitions ({len(df)} rows)")
+
+
+def next_month_rows(csv_path='demand_monthly.csv'):
+    """The last month of a demand_monthly-format CSV relabelled as the following month (synthetic new month)."""
+    demand = pd.read_csv(csv_path, low_memory=False)
+    month = pd.PeriodIndex(demand['Month'], freq='M')
+    rows = demand[month == month.max()].copy()
+    rows['Month'] = str(month.max() + 1)
+    return rows
+
+
+def check_schema(root=None):
+    """
+    Build a store from the CSVs, append a synthetic next month, refresh its 'final_demand'
+    targets (as tejas_incremental.py does) and read every table back. Raises if the
+    rewritten partitions do not concatenate with the converted ones. Uses a temporary
+    root (removed afterwards) unless `root` is given.
+    """
+    import tempfile
+    # Imported here because tejas_incremental builds on this module
+    from tejas_incremental import complete_targets
+    tmp = root is None
+    root = tempfile.mkdtemp(prefix='feature_store_check_') if tmp else root
+    try:
+        build_from_csvs(root)
+        new_rows = next_month_rows()
+        append_demand_month(new_rows, root)
+        complete_targets(new_rows['Month'].iloc[0], root=root)
+        for table in LEGACY_CSVS:
+            if table_exists(table, root):
+                df = read_table(table, root)
+                print(f"Read '{table}': {len(df)} rows, {df['Date'].dt.to_period('M').nunique()} months")
+    finally:
+        if tmp:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the Parquet feature store.')
+    parser.add_argument('--root', default=STORE_ROOT)
+    # --root is accepted after the subcommand as well (SUPPRESS keeps a value given before it)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--root', default=argparse.SUPPRESS)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('build', parents=[common], help='Convert the existing CSV chain into the store')
+    append = sub.add_parser('append', parents=[common], help='Append new demand_monthly-format rows')
+    append.add_argument('csv', help='CSV with the new month(s) of demand')
+    sub.add_parser('check', parents=[common],
+                   help='Build -> append a synthetic month -> refresh targets -> read, in a temporary store unless --root is given')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_from_csvs(args.root)
+    elif args.command == 'append':
+        append_demand_month(pd.read_csv(args.csv), args.root)
+    elif args.command == 'check':
+        check_schema(None if args.root == STORE_ROOT else args.root)
+
+
+if __name__ == "__main__":
+    main()
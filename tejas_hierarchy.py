@@ -0,0 +1,229 @@
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from catboost import CatBoostRegressor
+from sklearn.metrics import mean_absolute_error
+
+from tejas_feature_store import load_final_demand
+from tejas_backtest import holdout_split
+from tejas_demand_targets import add_calendar_flags
+from tejas_trend_index import TrendIndex
+
+# Hierarchical forecasting: Total -> Brand -> BrandLine -> Style -> (Style, GridValue, Region) leaves,
+# crossed with Region. One global CatBoost model is trained once on the stacked node
+# panel of every level, then the base forecasts are made coherent in a single sparse
+# linear-algebra pass (bottom-up, top-down or MinT with a diagonal covariance).
+#
+# A leaf-month missing from final_demand is one whose forward 4m target cannot be
+# observed yet, not zero demand: it is NaN, and so is every node containing it that
+# month. Training and the MAE use observed node-months only (complete aggregates).
+
+TARGET_COL = '4m_demand'
+LEAF_COLS = ['Style', 'GridValue', 'Region']
+
+# (level name, grouping columns); the leaf level must come last
+LEVELS = [
+    ('Total', []),
+    ('Brand', ['BrandName']),
+    ('Region', ['Region']),
+    ('Brand_Region', ['BrandName', 'Region']),
+    ('BrandLine', ['BrandLine']),
+    ('BrandLine_Region', ['BrandLine', 'Region']),
+    ('Style', ['Style']),
+    ('Leaf', LEAF_COLS),
+]
+# Every hierarchy column a node can carry (aggregated-away ones are set to ALL)
+HIERARCHY_COLS = ['BrandName', 'BrandLine', 'Style', 'GridValue', 'Region']
+ALL = '__ALL__'
+
+
+class Hierarchy:
+    """Summing matrix S (n_nodes x n_leaves) built from the leaf attribute table."""
+
+    def __init__(self, leaves, levels=LEVELS):
+        self.leaves = leaves.reset_index(drop=True)
+        self.levels = levels
+        n_leaves = len(self.leaves)
+
+        blocks, nodes = [], []
+        for name, cols in levels:
+            if cols:
+                codes = self.leaves.groupby(cols, sort=True, observed=True).ngroup().to_numpy()
+                keys = self.leaves[cols].drop_duplicates().sort_values(cols).reset_index(drop=True)
+            else:
+                codes = np.zeros(n_leaves, dtype=int)
+                keys = pd.DataFrame(index=[0])
+            n_nodes = codes.max() + 1
+            # One 1 per leaf in the row of the node it rolls up into
+            blocks.append(sp.csr_matrix((np.ones(n_leaves), (codes, np.arange(n_leaves))), shape=(n_nodes, n_leaves)))
+            keys = keys.astype(object).reindex(columns=HIERARCHY_COLS, fill_value=ALL)
+            keys.insert(0, 'Level', name)
+            nodes.append(keys)
+
+        self.S = sp.vstack(blocks).tocsr()
+        self.nodes = pd.concat(nodes, ignore_index=True)
+        self.n_leaves = n_leaves
+        self.n_agg = self.S.shape[0] - n_leaves
+        # Aggregation part of S (rows above the leaf identity block)
+        self.C = self.S[:self.n_agg]
+
+    @classmethod
+    def from_frame(cls, df, levels=LEVELS):
+        leaf_attrs = ['BrandName', 'BrandLine'] + LEAF_COLS
+        leaves = df[leaf_attrs].drop_duplicates(LEAF_COLS).sort_values(LEAF_COLS)
+        return cls(leaves, levels)
+
+    def leaf_positions(self, df):
+        """Row of S's leaf block for every row of `df`."""
+        lookup = self.leaves[LEAF_COLS].assign(_pos=np.arange(self.n_leaves))
+        return df[LEAF_COLS].merge(lookup, on=LEAF_COLS, how='left')['_pos'].to_numpy()
+
+    def leaf_matrix(self, df, value_col, dates):
+        """Dense (n_leaves x n_dates) matrix of a value column; absent (unobserved) leaf-months are NaN."""
+        rows = self.leaf_positions(df)
+        cols = pd.Index(dates).get_indexer(df['Date'])
+        out = np.zeros((self.n_leaves, len(dates)))
+        np.add.at(out, (rows, cols), df[value_col].to_numpy(dtype=float))
+        observed = np.zeros(out.shape, dtype=bool)
+        observed[rows, cols] = True
+        out[~observed] = np.nan
+        return out
+
+    def aggregate(self, leaf_values):
+        """Values at every node (S @ leaves); NaN wherever any leaf of the node is NaN."""
+        return self.S @ leaf_values
+
+
+# --- Reconciliation ------------------------------------------------------------
+# `base` is an (n_nodes x n_dates) matrix of base forecasts ordered like Hierarchy.nodes.
+
+def reconcile_bottom_up(h, base):
+    return h.aggregate(base[h.n_agg:])
+
+
+def reconcile_top_down(h, base, proportions):
+    """Split the Total forecast by historical leaf proportions (which sum to 1)."""
+    return h.aggregate(np.outer(proportions, base[0]))
+
+
+def reconcile_mint(h, base, w_diag):
+    """
+    MinT / WLS reconciliation with a diagonal error covariance W.
+    Solves the constrained GLS projection in its aggregate-sized form:
+        b~ = b^ + W_b C' (W_a + C W_b C')^-1 (a^ - C b^)
+    so only an (n_agg x n_agg) sparse system is factorised, even with tens of thousands of leaves.
+    """
+    w_diag = np.maximum(np.asarray(w_diag, dtype=float), 1e-9)
+    W_a = sp.diags(w_diag[:h.n_agg])
+    W_b = sp.diags(w_diag[h.n_agg:])
+    C = h.C
+
+    M = (W_a + C @ W_b @ C.T).tocsc()
+    base_agg, base_leaf = base[:h.n_agg], base[h.n_agg:]
+    # One factorisation, every forecast date solved as a right-hand side column
+    correction = splu(M).solve(np.asarray(base_agg - C @ base_leaf))
+    leaf = base_leaf + W_b @ (C.T @ correction)
+    return h.aggregate(leaf)
+
+
+# --- Global model over the stacked node panel -------------------------------------
+
+def node_panel(h, leaf_actuals, dates, trends):
+    """Long frame: one row per (node, date) with hierarchy columns, calendar and trend features."""
+    n_nodes = h.S.shape[0]
+    node_actuals = h.aggregate(leaf_actuals)
+    leaves_per_node = np.asarray(h.S.sum(axis=1)).ravel()
+
+    panel = h.nodes.loc[np.repeat(np.arange(n_nodes), len(dates))].reset_index(drop=True)
+    panel['node'] = np.repeat(np.arange(n_nodes), len(dates))
+    panel['Date'] = np.tile(np.asarray(dates), n_nodes)
+    # Scale-free target: demand per leaf in the node, so Total and single SKUs share one model
+    panel['n_leaves'] = np.repeat(leaves_per_node, len(dates))
+    panel['per_leaf_target'] = node_actuals.ravel() / panel['n_leaves']
+    panel = add_calendar_flags(panel)
+    return trends.attach(panel, [c for c in trends.base_columns if c.startswith('Trend_')])
+
+
+def fit_base_forecasts(panel, train_dates):
+    """Train one CatBoost on every level at once; return per-node predictions for all dates."""
+    cat_cols = ['Level'] + HIERARCHY_COLS
+    features = cat_cols + ['n_leaves'] + [c for c in panel.columns if c.startswith(('is_', 'Trend_'))]
+    X = panel[features].copy()
+    for col in cat_cols:
+        X[col] = X[col].astype(str)
+
+    # Node-months with an incomplete (NaN) actual are never training targets
+    train_mask = panel['Date'].isin(train_dates).to_numpy() & panel['per_leaf_target'].notna().to_numpy()
+    model = CatBoostRegressor(iterations=500, learning_rate=0.08, depth=6, loss_function='RMSE',
+                              random_seed=42, logging_level='Silent')
+    model.fit(X[train_mask], panel.loc[train_mask, 'per_leaf_target'], cat_features=cat_cols)
+    return np.maximum(0, model.predict(X)) * panel['n_leaves'].to_numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hierarchical forecasting with reconciliation.')
+    parser.add_argument('--output', default='hierarchical_forecasts.csv')
+    args = parser.parse_args()
+
+    print("Loading final_demand.csv...")
+    df = load_final_demand()
+    df['Date'] = pd.to_datetime(df['Date'])
+    for col in HIERARCHY_COLS:
+        df[col] = df[col].astype(str)
+
+    h = Hierarchy.from_frame(df)
+    print(f"Hierarchy: {h.n_leaves} leaves, {h.n_agg} aggregate nodes, S nnz={h.S.nnz}")
+
+    dates = np.sort(df['Date'].unique())
+    train_df, test_df = holdout_split(df)
+    train_dates = np.sort(train_df['Date'].unique())
+    test_cols = np.isin(dates, test_df['Date'].unique())
+
+    leaf_actuals = h.leaf_matrix(df, TARGET_COL, dates)
+    actual = h.aggregate(leaf_actuals)
+
+    print("Training one global model across all hierarchy levels...")
+    panel = node_panel(h, leaf_actuals, dates, TrendIndex.load())
+    base = fit_base_forecasts(panel, train_dates).reshape(len(h.nodes), len(dates))
+
+    # Covariance diagonal from in-sample (training months) residual variance per node
+    train_cols = ~test_cols
+    w_diag = np.nan_to_num(np.nanmean((base[:, train_cols] - actual[:, train_cols]) ** 2, axis=1))
+    # Top-down proportions: each leaf's share of total demand in the training months
+    proportions = np.nansum(leaf_actuals[:, train_cols], axis=1) / np.nansum(leaf_actuals[:, train_cols])
+
+    forecasts = {
+        'base': base,
+        'bottom_up': reconcile_bottom_up(h, base),
+        'top_down': reconcile_top_down(h, base, proportions),
+        'mint': reconcile_mint(h, base, w_diag),
+    }
+
+    print("\n--- Test MAE by level (test months, observed node-months only) ---")
+    rows = []
+    for level, _ in LEVELS:
+        idx = np.flatnonzero(h.nodes['Level'] == level)
+        level_actual = actual[idx][:, test_cols].ravel()
+        observed = ~np.isnan(level_actual)
+        row = {'Level': level, 'nodes': len(idx), 'observed': int(observed.sum())}
+        for method, values in forecasts.items():
+            predicted = np.asarray(values)[idx][:, test_cols].ravel()
+            row[method] = (mean_absolute_error(level_actual[observed], predicted[observed])
+                           if observed.any() else np.nan)
+        rows.append(row)
+    print(pd.DataFrame(rows).to_string(index=False, float_format='%.2f'))
+
+    # Long output: one row per node x date with every method's forecast
+    out = h.nodes.loc[np.repeat(np.arange(len(h.nodes)), len(dates))].reset_index(drop=True)
+    out['Date'] = np.tile(dates, len(h.nodes))
+    out['actual_4m_demand'] = actual.ravel()
+    for method, values in forecasts.items():
+        out[f'{method}_4m_demand'] = np.asarray(values).ravel()
+    out.to_csv(args.output, index=False)
+    print(f"\nSaved node-level forecasts to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
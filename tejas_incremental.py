@@ -0,0 +1,172 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from tejas_feature_store import STORE_ROOT, append_demand_month, read_table, write_table, list_partitions
+from tejas_demand_targets import SERIES_KEYS, add_calendar_flags, add_forward_demand, target_col
+from tejas_model_registry import REGISTRY_ROOT, load_model, register_model
+from tejas_trend_index import TrendIndex, LAGS
+from tejas_pools import model_matrix, build_pool
+
+# Month-over-month refresh without a full rebuild or a cold retrain:
+#
+#   1. the new month's raw rows are enriched and appended to the feature store ('enriched')
+#   2. forward targets (4m_demand) are recomputed only over the last `horizon` months + the
+#      new one - the only rows whose forward window can include the new month - and just
+#      those 'final_demand' partitions are rewritten
+#   3. trend lags / momentum live in the per-month trend index, so the new month only adds
+#      one row there (the index rebuilds itself when a trends CSV changes)
+#   4. registered CatBoost models continue training from their last version (init_model)
+#      with a few extra trees fitted on the newly completed rows, and are registered as a new version
+#
+#   python tejas_incremental.py new_month.csv --models champion advanced --extra-iterations 100
+
+STYLES_PATH = 'styles.csv'
+HORIZON = 4
+
+
+def build_modeling_table(enriched, horizons=(HORIZON,), styles_path=STYLES_PATH, dropna=True):
+    """
+    additional_features.ipynb as a function: style attributes from styles.csv, Date,
+    calendar flags and forward-demand targets on top of the enriched demand rows.
+    """
+    style = pd.read_csv(styles_path).drop_duplicates(subset='StyleCode', keep='first')
+    style['StyleCode'] = style['StyleCode'].astype(str)
+
+    data = enriched.drop(columns=['Material', 'Month'], errors='ignore').copy()
+    data['StyleCode'] = data['StyleCode'].astype(str)
+    data = data.merge(style[['Material', 'Shape', 'FrameType', 'StyleCode']], on='StyleCode', how='left')
+    # Same column order as the notebook (Material replaced after the merge)
+    data = data[[c for c in data.columns if c != 'Material'] + ['Material']]
+
+    data['Date'] = pd.to_datetime(data['Date'])
+    data = add_calendar_flags(data)
+    data = add_forward_demand(data, horizons=list(horizons))
+    if dropna:
+        data = data.dropna(subset=[target_col(h) for h in horizons])
+    return data
+
+
+def _month_window(new_month, horizon):
+    """'YYYY-MM' labels of the `horizon` months before `new_month` plus `new_month` itself."""
+    end = pd.Period(new_month, freq='M')
+    return [str(end - k) for k in range(horizon, -1, -1)]
+
+
+def complete_targets(new_month, horizon=HORIZON, root=STORE_ROOT, styles_path=STYLES_PATH):
+    """
+    Recompute targets for the months whose forward window can reach `new_month` and
+    rewrite their 'final_demand' partitions. Returns the rows the new month completed
+    (valid target now, not before) - the training data for the incremental update.
+    """
+    window = _month_window(new_month, horizon)
+    available = {m for m, _, _ in list_partitions('enriched', root)}
+    window = [m for m in window if m in available]
+    enriched = read_table('enriched', root, months=window)
+    enriched = enriched.assign(_row=np.arange(len(enriched)))
+
+    col = target_col(horizon)
+    after = build_modeling_table(enriched, (horizon,), styles_path, dropna=False)
+    before = build_modeling_table(enriched[enriched['Date'].dt.strftime('%Y-%m') != new_month],
+                                  (horizon,), styles_path, dropna=False)
+
+    valid_before = set(before.loc[before[col].notna(), '_row'])
+    completed_mask = after[col].notna() & ~after['_row'].isin(valid_before)
+
+    table = after[after[col].notna()].drop(columns='_row')
+    written = write_table(table, 'final_demand', root)
+    completed = after[completed_mask].drop(columns='_row').reset_index(drop=True)
+    print(f"Recomputed '{col}' over {window[0]}..{window[-1]}: {len(table)} rows in {len(written)} partition(s), "
+          f"{len(completed)} newly completed by {new_month}")
+    return completed
+
+
+def continue_training(name, new_rows, extra_iterations=100, registry_root=REGISTRY_ROOT, root=STORE_ROOT):
+    """Add `extra_iterations` trees to the latest registered version of `name`, fitted on `new_rows`."""
+    if name == 'champion':
+        import tejas_modeling_champion as module
+        df, features = module.prepare_features(new_rows)
+    elif name == 'advanced':
+        import tejas_modeling_advanced as module
+        # Cannibalization features depend on every sibling and on each frame's history,
+        # so they are built over the whole panel and the completed rows picked out afterwards
+        from tejas_cannibalization import load_sibling_history
+        from tejas_lookalike import LookalikeIndex
+        # Siblings and analog curves from this store, the new month included
+        panel = module.create_advanced_features(read_table('final_demand', root),
+                                                sibling_panel=load_sibling_history(root=root),
+                                                analog_index=LookalikeIndex.load(os.path.join(root, '_lookalike'), root))
+        keys = SERIES_KEYS + ['Date']
+        completed = pd.MultiIndex.from_frame(panel[keys]).isin(pd.MultiIndex.from_frame(new_rows[keys]))
+        df, features = module.prepare_features(panel[completed].reset_index(drop=True))
+    else:
+        raise ValueError(f"Incremental refresh not supported for model '{name}'")
+
+    base_model, meta = load_model(name, root=registry_root)
+    if sorted(features) != sorted(meta['features']):
+        raise ValueError(f"Feature set of '{name}' changed since version {meta['version']}; run a full retrain")
+    features = meta['features']
+
+    # Raw pool: continuing from init_model cannot use a cached quantized pool
+    pool = build_pool(model_matrix(df, features, meta['categorical_cols']), df[module.TARGET_COL],
+                      meta['categorical_cols'])
+    model = module.build_model(iterations=extra_iterations)
+    start_t = time.time()
+    # Continue boosting from the registered trees instead of starting from scratch
+    model.fit(pool, init_model=base_model)
+    print(f"'{name}': {base_model.tree_count_} -> {model.tree_count_} trees "
+          f"({len(df)} new rows, {time.time() - start_t:.2f} seconds)")
+
+    version = register_model(model, name, features, meta['categorical_cols'], df[features + [module.TARGET_COL]],
+                             metrics={'incremental_rows': len(df), 'extra_iterations': extra_iterations},
+                             root=registry_root, parent=meta['version'])
+    return model, version
+
+
+def refresh_month(new_demand_df, models=('champion',), extra_iterations=100, horizon=HORIZON,
+                  root=STORE_ROOT, registry_root=REGISTRY_ROOT, styles_path=STYLES_PATH):
+    """Run the full incremental refresh for the month(s) in a demand_monthly-format frame."""
+    months = sorted(pd.to_datetime(new_demand_df['Month']).dt.strftime('%Y-%m').unique())
+    completed = []
+    for month in months:
+        print(f"\n=== Incremental refresh for {month} ===")
+        append_demand_month(new_demand_df[pd.to_datetime(new_demand_df['Month']).dt.strftime('%Y-%m') == month], root)
+        completed.append(complete_targets(month, horizon, root, styles_path))
+
+        # Lags/momentum touched by this month: its own row and the next max(LAGS) months of the index
+        trends = TrendIndex.load()
+        touched = [str(pd.Period(month, freq='M') + k) for k in range(max(LAGS) + 1)]
+        covered = [m for m in touched if pd.Period(m, freq='M') in trends.months]
+        print(f"Trend lags/momentum for {covered[0] if covered else month}..{covered[-1] if covered else month} "
+              f"served from the per-month trend index ({len(trends.months)} months)")
+
+    new_rows = pd.concat(completed, ignore_index=True)
+    versions = {}
+    if len(new_rows) == 0:
+        print("No targets completed; models unchanged.")
+        return new_rows, versions
+    for name in models:
+        _, versions[name] = continue_training(name, new_rows, extra_iterations, registry_root, root)
+    return new_rows, versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Append a new demand month and refresh models incrementally.')
+    parser.add_argument('input', help='New month(s) of raw demand rows (demand_monthly.csv format)')
+    parser.add_argument('--models', nargs='+', default=['champion'], choices=['champion', 'advanced'])
+    parser.add_argument('--extra-iterations', type=int, default=100, help='Trees added per refresh')
+    parser.add_argument('--horizon', type=int, default=HORIZON)
+    args = parser.parse_args()
+
+    start_t = time.time()
+    new_df = pd.read_csv(args.input, low_memory=False)
+    _, versions = refresh_month(new_df, args.models, args.extra_iterations, args.horizon)
+    for name, version in versions.items():
+        print(f"New '{name}' version: {version}")
+    print(f"Incremental refresh finished in {time.time() - start_t:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,616 @@
+import os
+import time
+import argparse
+import tempfile
+import importlib.util
+import numpy as np
+import pandas as pd
+
+from tejas_model_registry import REGISTRY_ROOT, load_meta, load_model
+from tejas_score import DEFAULT_REGIONS, scoring_frame
+from tejas_demand_targets import add_calendar_flags
+from tejas_trend_index import TrendIndex
+from tejas_panel import Vocabulary
+from tejas_trace import span, start_run
+from tejas_pools import model_matrix, build_pool
+from tejas_cannibalization import CANNIBALIZATION_FEATURES, load_sibling_history, prepare_sibling_history
+from tejas_lookalike import ANALOG_FEATURES
+
+# Compiled CatBoost inference for bulk what-if scoring.
+#
+# CompiledModel reads CatBoost's standalone Python export (model.py, saved next to a
+# registered model) into NumPy arrays and evaluates it vectorized, exactly like
+# CatBoost's own applier:
+#   1. binarize: float features -> border counts, categorical hashes -> one-hot bins,
+#      CTRs -> hash of the projection (cat hashes + binarized floats), bucket lookup in
+#      the learned CTR tables, border count of the CTR value
+#   2. leaf index per tree = bits of its (oblivious) splits over the binary features
+#   3. prediction = scale * sum of leaf values + bias
+# Category strings are hashed by CatBoost at export time; the export is given every
+# vocabulary value, and strings it never saw take the export's placeholder hash (they
+# were not in the training data either, so every CTR lookup misses just the same).
+#
+# WhatIfEngine keeps that state for a base matrix (e.g. every SKU x Region) and scores
+# scenarios as perturbations of it without building DataFrames:
+#
+#   engine = WhatIfEngine(compiled, base_df)
+#   engine.score({'set': {'Trend_FSA_glasses': 40.0}, 'scale': {'Trend_Nike_frames': 1.1}})
+#   engine.score({'region': 'EMEA'})            # every frame moved to EMEA
+#   engine.score_batch([month_scenario(m, compiled.features, base_df=base_df) for m in months])
+#
+# A scenario only recomputes what depends on the perturbed columns: their binary
+# features, the CTRs combining them with categoricals (per row, the CTR bin for every
+# combination of a projection's float bits is tabulated once, so this is a gather) and
+# the splits on any of those in each tree; every other split and tree keeps its base
+# value. A region move changes the categorical hashes, so each target region is one
+# more full pass over the base rows, cached for later scenarios.
+#
+#   python tejas_inference.py export --model champion
+#   python tejas_inference.py whatif final_products.csv --model champion --months 2024-09 2024-12 \
+#       --trend-scales 0.9 1.0 1.1 --move-to EMEA --verify
+
+DEFAULT_CHUNK_SIZE = 16_384
+EXPORT_FILE = 'model.py'
+
+_MAGIC = np.uint64(0x4906BA494954CB65)   # CatBoost's projection hash multiplier
+_EMPTY_SLOT = 0xFFFFFFFFFFFFFFFF         # unused slot marker in the exported CTR hash tables
+_UNKNOWN_HASH = 0x7FFFFFFF               # the export's hash for strings it was not given
+_MEAN_CTRS = ('BinarizedTargetMeanValue', 'FloatTargetMeanValue')
+_COUNTER_CTRS = ('Counter', 'FeatureFreq')
+
+
+def _combine(hashes, values):
+    """One step of CatBoost's projection hash over uint64 arrays (wrapping arithmetic)."""
+    return _MAGIC * (hashes + _MAGIC * values)
+
+
+def _border_count(values, borders):
+    """Number of `borders` (sorted) strictly below each value; NaN counts as below all."""
+    counts = np.searchsorted(borders, values, side='left')
+    return np.where(np.isnan(values), 0, counts).astype(np.uint8)
+
+
+def _ctr_bins(table, ctr, borders):
+    """Binarized CTR value per bucket of a learned CTR table, plus a last entry for a missed lookup."""
+    if ctr.base_ctr_type in _MEAN_CTRS:
+        good = np.array([h.sum for h in table.ctr_mean_history])
+        total = np.array([h.count for h in table.ctr_mean_history])
+    elif ctr.base_ctr_type in _COUNTER_CTRS:
+        good = np.asarray(table.ctr_total)
+        total = np.full(len(good), table.counter_denominator)
+    else:
+        classes = table.target_classes_count
+        hist = np.asarray(table.ctr_total).reshape(-1, classes)
+        if ctr.base_ctr_type == 'Buckets':
+            good, total = hist[:, ctr.target_border_idx], hist.sum(axis=1)
+        elif classes > 2:
+            good = hist[:, ctr.target_border_idx + 1:].sum(axis=1)
+            total = hist[:, :ctr.target_border_idx + 1].sum(axis=1) + good
+        else:
+            good, total = hist[:, 1], hist[:, 0] + hist[:, 1]
+
+    # Same float32 arithmetic as CatBoost's model applier
+    f32 = np.float32
+    good = np.append(good, 0).astype(f32)
+    total = np.append(total, 0).astype(f32)
+    value = (good + f32(ctr.prior_num)) / (total + f32(ctr.prior_denom))
+    value = (value + f32(ctr.shift)) * f32(ctr.scale)
+    return _border_count(value, np.asarray(borders, dtype=f32))
+
+
+def _load_export(path):
+    spec = importlib.util.spec_from_file_location('catboost_export', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CompiledModel:
+    """A CatBoost model, from its Python export, as NumPy arrays."""
+
+    def __init__(self, module, features, categorical_cols):
+        m = module.catboost_model
+        self.features = list(features)
+        self.float_cols = [f for f in self.features if f not in categorical_cols]
+        self.cat_cols = [f for f in self.features if f in categorical_cols]
+        self.cat_hashes = dict(getattr(module, 'cat_features_hashes', {}))
+
+        # Binary features, in CatBoost's order: float border counts, one-hot groups, CTRs
+        self.float_bins = [(m.float_features_index[i], np.asarray(borders, dtype=np.float32))
+                           for i, borders in enumerate(m.float_feature_borders) if len(borders)]
+        packed = {c: i for i, c in enumerate(getattr(m, 'cat_features_index', []))}
+        self.one_hot = [(packed[c], np.asarray(m.one_hot_hash_values[i], dtype=np.int64).view(np.uint64))
+                        for i, c in enumerate(getattr(m, 'one_hot_cat_feature_index', []))
+                        if len(m.one_hot_hash_values[i])]
+
+        # CTR projections: categorical columns and binary-feature conditions hashed together;
+        # each output is (binary feature index, CTR table id, bin per bucket)
+        ctrs = getattr(m, 'model_ctrs', None)
+        first_ctr = len(self.float_bins) + len(self.one_hot)
+        self.projections, self._tables = [], {}
+        result = 0
+        for compressed in (ctrs.compressed_model_ctrs if ctrs else []):
+            proj = compressed.projection
+            outputs = []
+            for ctr in compressed.model_ctrs:
+                table = ctrs.ctr_data.learn_ctrs[ctr.base_hash]
+                if ctr.base_hash not in self._tables:
+                    slots = {h: b for h, b in table.index_hash_viewer.items() if h != _EMPTY_SLOT}
+                    keys = np.array(sorted(slots), dtype=np.uint64)
+                    self._tables[ctr.base_hash] = (keys, np.array([slots[int(k)] for k in keys], dtype=np.int64))
+                outputs.append((first_ctr + result, ctr.base_hash, _ctr_bins(table, ctr, m.ctr_feature_borders[result])))
+                result += 1
+            conditions = [(b.bin_index, bool(b.check_value_equal), b.value) for b in proj.binarized_indexes]
+            self.projections.append((list(proj.transposed_cat_feature_indexes), conditions, outputs))
+        self.n_binary = first_ctr + result
+
+        # Trees padded to the deepest one (padding splits are never taken)
+        depths = np.asarray(m.tree_depth)
+        n_trees, depth = len(depths), int(depths.max(initial=0))
+        self.dimension = getattr(m, 'dimension', 1)
+        self.split_feature = np.zeros((n_trees, depth), dtype=np.int64)
+        self.split_border = np.full((n_trees, depth), 256, dtype=np.int16)
+        self.split_xor = np.zeros((n_trees, depth), dtype=np.uint8)
+        self.split_valid = np.arange(depth) < depths[:, None]
+        starts = np.r_[0, np.cumsum(depths)[:-1]]
+        leaf_starts = np.r_[0, np.cumsum(2 ** depths)[:-1]]
+        leaf_values = np.asarray(m.leaf_values, dtype=float).reshape(-1, self.dimension)
+        self.leaf_values = np.zeros((n_trees, 2 ** depth, self.dimension))
+        for t, (d, s, ls) in enumerate(zip(depths, starts, leaf_starts)):
+            self.split_feature[t, :d] = m.tree_split_feature_index[s:s + d]
+            self.split_border[t, :d] = m.tree_split_border[s:s + d]
+            self.split_xor[t, :d] = m.tree_split_xor_mask[s:s + d]
+            self.leaf_values[t, :2 ** d] = leaf_values[ls:ls + 2 ** d]
+        self.scale = float(m.scale)
+        self.bias = np.asarray(getattr(m, 'biases', [0.0] * self.dimension), dtype=float)
+
+        self.leaf_dtype = np.uint8 if depth <= 8 else np.uint16
+        self._leaf_tables = np.ascontiguousarray(self.leaf_values.transpose(2, 0, 1))  # (dimension, trees, leaves)
+        self._plans = {}
+
+    @classmethod
+    def load(cls, path, features, categorical_cols):
+        return cls(_load_export(path), features, categorical_cols)
+
+    @property
+    def n_trees(self):
+        return len(self.split_feature)
+
+    # -- full evaluation ------------------------------------------------------------
+    # Arrays are feature-major: F (float features, rows), H (categoricals, rows),
+    # binary features (n_binary, rows), leaf indexes (trees, rows), so every step reads
+    # and writes contiguous per-feature / per-tree rows.
+
+    def encode(self, df):
+        """(float32 float features, uint64 category hashes) of a frame holding the model features."""
+        X = model_matrix(df, self.features, self.cat_cols)
+        F = np.empty((len(self.float_cols), len(X)), dtype=np.float32)
+        for i, col in enumerate(self.float_cols):
+            F[i] = X[col].to_numpy(dtype=np.float32)
+        H = np.empty((len(self.cat_cols), len(X)), dtype=np.uint64)
+        for i, col in enumerate(self.cat_cols):
+            series = X[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, uniques = pd.factorize(series)
+            hashes = np.array([self.cat_hashes.get(str(u), _UNKNOWN_HASH) for u in uniques], dtype=np.int64)
+            H[i] = hashes.view(np.uint64)[codes]
+        return F, H
+
+    def projection_hash(self, projection, H):
+        """Per-row hash of a projection's categorical part."""
+        hashes = np.zeros(H.shape[1], dtype=np.uint64)
+        for c in projection[0]:
+            hashes = _combine(hashes, H[c])
+        return hashes
+
+    def lookup(self, table_id, hashes):
+        """Bucket of each hash in a CTR table; -1 (the last bin entry) for a miss."""
+        keys, buckets = self._tables[table_id]
+        if not len(keys):
+            return np.full(len(hashes), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(keys, hashes), len(keys) - 1)
+        return np.where(keys[pos] == hashes, buckets[pos], -1)
+
+    @staticmethod
+    def condition_bit(condition, values):
+        """0/1 outcome of a projection condition (binary feature index, equality?, value)."""
+        _, equal, value = condition
+        return (values == value) if equal else (values >= value)
+
+    def binarize(self, F, H):
+        """(n_binary, rows) uint8 binary features, as CatBoost computes them."""
+        bf = np.zeros((self.n_binary, F.shape[1]), dtype=np.uint8)
+        for j, (f, borders) in enumerate(self.float_bins):
+            bf[j] = _border_count(F[f], borders)
+        for j, (c, values) in enumerate(self.one_hot, start=len(self.float_bins)):
+            for k, value in enumerate(values):
+                bf[j] |= (H[c] == value).astype(np.uint8) * (k + 1)
+        for projection in self.projections:
+            hashes = self.projection_hash(projection, H)
+            for condition in projection[1]:
+                hashes = _combine(hashes, self.condition_bit(condition, bf[condition[0]]).astype(np.uint64))
+            for j, table_id, bins in projection[2]:
+                bf[j] = bins[self.lookup(table_id, hashes)]
+        return bf
+
+    def leaf_indexes(self, bf, trees=None):
+        """(trees, rows) leaf index of every row in every tree (or the given trees)."""
+        trees = np.arange(self.n_trees) if trees is None else trees
+        leaves = np.zeros((len(trees), bf.shape[1]), dtype=self.leaf_dtype)
+        for d in range(self.split_feature.shape[1]):
+            values = bf[self.split_feature[trees, d]] ^ self.split_xor[trees, d, None]
+            leaves |= (values >= self.split_border[trees, d, None]).astype(self.leaf_dtype) << d
+        return leaves
+
+    def raw_sum(self, leaves, trees=None):
+        """(rows, dimension) sum of the leaf values over `trees` (all by default)."""
+        trees = range(self.n_trees) if trees is None else trees
+        out = np.zeros((self.dimension, leaves.shape[1]))
+        for i, t in enumerate(trees):
+            for k in range(self.dimension):
+                out[k] += self._leaf_tables[k, t].take(leaves[i])
+        return out.T
+
+    def to_prediction(self, raw):
+        pred = self.scale * raw + self.bias
+        return pred[:, 0] if self.dimension == 1 else pred
+
+    def predict(self, df, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Raw model predictions (as model.predict) for a frame holding the model features."""
+        parts = []
+        for start in range(0, len(df), chunk_size):
+            bf = self.binarize(*self.encode(df.iloc[start:start + chunk_size]))
+            parts.append(self.raw_sum(self.leaf_indexes(bf)))
+        raw = np.concatenate(parts) if parts else np.zeros((0, self.dimension))
+        return self.to_prediction(raw)
+
+    # -- perturbations --------------------------------------------------------------
+
+    def plan(self, float_features):
+        """
+        What a change to the given float features (positions in float_cols) touches:
+        their binary features, the projections conditioned on those, the trees splitting
+        on any changed binary feature, the leaf bits to clear in them and, per depth, the
+        trees (indexes into `trees`) whose split there must be re-evaluated.
+        """
+        key = tuple(sorted(float_features))
+        if key not in self._plans:
+            bins = [j for j, (f, _) in enumerate(self.float_bins) if f in key]
+            projections = [p for p, proj in enumerate(self.projections) if any(j in bins for j, _, _ in proj[1])]
+            changed = set(bins) | {j for p in projections for j, _, _ in self.projections[p][2]}
+
+            hit = np.isin(self.split_feature, list(changed)) & self.split_valid
+            trees = np.flatnonzero(hit.any(axis=1))
+            sub = hit[trees]
+            clear = ~(sub << np.arange(sub.shape[1])).sum(axis=1).astype(self.leaf_dtype)
+            steps = [(d, np.flatnonzero(sub[:, d])) for d in range(sub.shape[1]) if sub[:, d].any()]
+            self._plans[key] = {'key': key, 'bins': bins, 'projections': projections, 'trees': trees,
+                                'clear': clear, 'steps': steps}
+        return self._plans[key]
+
+
+def _export_pool(model, features, categorical_cols, values_by_col):
+    """A pool holding every value to hash, one column per categorical feature."""
+    n = max([len(v) for v in values_by_col.values()] + [1])
+    columns = {}
+    for col in features:
+        if col in categorical_cols:
+            values = list(values_by_col.get(col) or ['missing'])
+            columns[col] = (values * (n // len(values) + 1))[:n]
+        else:
+            columns[col] = np.zeros(n, dtype=np.float32)
+    return build_pool(pd.DataFrame(columns), None, categorical_cols)
+
+
+def category_values(categorical_cols, frames=()):
+    """Vocabulary values of the categorical columns (plus those in `frames`) and 'missing'."""
+    vocab = Vocabulary.load()
+    values = {}
+    for col in categorical_cols:
+        known = set(vocab.categories.get(col, [])) | {'missing'}
+        for df in frames:
+            if col in df.columns:
+                known |= {str(v) for v in pd.unique(df[col].dropna())}
+        values[col] = sorted(known)
+    return values
+
+
+def save_export(model, path, features, categorical_cols, frames=()):
+    """CatBoost's Python export, with hashes for the vocabulary values (and those in `frames`)."""
+    cat_cols = [c for c in categorical_cols if c in features]
+    pool = _export_pool(model, features, cat_cols, category_values(cat_cols, frames))
+    model.save_model(path, format='python', pool=pool)
+
+
+def compile_model(model, features, categorical_cols, frames=()):
+    """Compile a fitted CatBoost model (e.g. one not in the registry)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, EXPORT_FILE)
+        save_export(model, path, features, categorical_cols, frames)
+        return CompiledModel.load(path, features, categorical_cols)
+
+
+def export_model(name, version='latest', root=REGISTRY_ROOT):
+    """Write CatBoost's Python export (model.py) next to a registered model. Returns the compiled model."""
+    model, meta = load_model(name, version, root)
+    path = os.path.join(root, name, meta['version'], EXPORT_FILE)
+    save_export(model, path, meta['features'], meta['categorical_cols'])
+    return CompiledModel.load(path, meta['features'], meta['categorical_cols'])
+
+
+def load_compiled(name, version='latest', root=REGISTRY_ROOT):
+    """Compiled form of a registered model, exported on first use."""
+    meta = load_meta(name, version, root)
+    path = os.path.join(root, name, meta['version'], EXPORT_FILE)
+    if not os.path.exists(path):
+        return export_model(name, meta['version'], root)
+    return CompiledModel.load(path, meta['features'], meta['categorical_cols'])
+
+
+def month_dependent_features(features):
+    """Features of a model that depend on the launch month beyond the trend index and calendar."""
+    return [f for f in features if f in CANNIBALIZATION_FEATURES or f in ANALOG_FEATURES]
+
+
+def month_scenario(month, features, trends=None, base_df=None, history=None):
+    """
+    Scenario moving every row to launch `month`: trend values (incl. lags/momentum) and
+    calendar flags of that month. Cannibalization and analog features, if the model
+    uses them, are recomputed per row of `base_df` (the engine's base rows, with their
+    product columns) with the whole release launching in `month`, as
+    tejas_launch_scoring does. `history` is the (prepared) sibling history.
+    """
+    trends = trends or TrendIndex.load()
+    date = pd.Period(month, freq='M').to_timestamp()
+    trend_cols = [f for f in features if f in trends.columns]
+    values = dict(zip(trend_cols, trends.lookup([date], trend_cols)[0]))
+    flags = add_calendar_flags(pd.DataFrame({'Date': [date]})).iloc[0]
+    values.update({f: float(flags[f]) for f in features if f.startswith('is_') and f in flags.index})
+
+    recompute = month_dependent_features(features)
+    if recompute:
+        if base_df is None:
+            raise ValueError(f"Month scenarios for a model with {recompute[0]} (and other launch-month "
+                             f"features) need base_df to recompute them")
+        moved = scoring_frame(base_df.drop(columns=recompute).assign(Date=date), {'features': recompute},
+                              history=history)
+        values.update({f: moved[f].to_numpy(dtype=np.float32) for f in recompute})
+    return {'set': values}
+
+
+class WhatIfEngine:
+    """Scores scenarios as perturbations of a base feature matrix."""
+
+    def __init__(self, compiled, base_df, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.compiled = compiled
+        self.chunk_size = chunk_size
+        self.base_df = base_df[compiled.features].reset_index(drop=True)
+        self._float_pos = {f: i for i, f in enumerate(compiled.float_cols)}
+        self._variants = {}
+
+    def __len__(self):
+        return len(self.base_df)
+
+    def _variant(self, region=None):
+        """Encoded base rows (all moved to `region` if given): hashes, binary features, leaves, raw sums."""
+        if region not in self._variants:
+            c = self.compiled
+            df = self.base_df if region is None else self.base_df.assign(Region=region)
+            F, H = c.encode(df)
+            bf = np.empty((c.n_binary, len(df)), dtype=np.uint8)
+            leaves = np.empty((c.n_trees, len(df)), dtype=c.leaf_dtype)
+            for start in range(0, len(df), self.chunk_size):
+                rows = slice(start, start + self.chunk_size)
+                bf[:, rows] = c.binarize(F[:, rows], H[:, rows])
+                leaves[:, rows] = c.leaf_indexes(bf[:, rows])
+            self._variants[region] = {'H': H, 'bf': bf, 'leaves': leaves, 'raw': c.raw_sum(leaves),
+                                      'patterns': {}, 'static': {}}
+        return self._variants[region]
+
+    def _patterns(self, state, p):
+        """
+        Per output of projection p, the (2**conditions, rows) CTR bin of every base row
+        under each combination of the projection's condition bits.
+        """
+        if p not in state['patterns']:
+            projection = self.compiled.projections[p]
+            base = self.compiled.projection_hash(projection, state['H'])
+            n_cond = len(projection[1])
+            tables = {j: np.empty((2 ** n_cond, len(base)), dtype=np.uint8) for j, _, _ in projection[2]}
+            for pattern in range(2 ** n_cond):
+                hashes = base
+                for e in range(n_cond):
+                    hashes = _combine(hashes, np.uint64((pattern >> e) & 1))
+                for j, table_id, bins in projection[2]:
+                    tables[j][pattern] = bins[self.compiled.lookup(table_id, hashes)]
+            state['patterns'][p] = tables
+        return state['patterns'][p]
+
+    def _static(self, state, plan):
+        """Raw sums of the base rows over the trees a plan does not touch."""
+        if plan['key'] not in state['static']:
+            trees = plan['trees']
+            state['static'][plan['key']] = state['raw'] - self.compiled.raw_sum(state['leaves'][trees], trees)
+        return state['static'][plan['key']]
+
+    def _values(self, scenario):
+        """Float feature position -> new float32 value (scalar or per-row) for every perturbed column."""
+        sets, adds, scales = (scenario.get(k) or {} for k in ('set', 'add', 'scale'))
+        values = {}
+        for col in {**sets, **adds, **scales}:
+            if col in self.compiled.cat_cols:
+                raise ValueError(f"{col!r} is categorical; only 'region' moves are supported")
+            if col not in self._float_pos:
+                raise KeyError(f"{col!r} is not a model feature")
+            pos = self._float_pos[col]
+            value = np.float32(sets[col]) if col in sets else self.base_df[col].to_numpy(dtype=np.float32)
+            if col in scales:
+                value = value * np.float32(scales[col])
+            if col in adds:
+                value = value + np.float32(adds[col])
+            values[pos] = np.asarray(value, dtype=np.float32)
+        return values
+
+    def _affected_sum(self, state, plan, values, rows):
+        """Raw sums of base rows `rows` over the plan's trees under the perturbed float values."""
+        c = self.compiled
+        bf = state['bf'][:, rows].copy()
+        scalars = {}  # binary features that take the same value on every row
+        for j in plan['bins']:
+            f, borders = c.float_bins[j]
+            if values[f].ndim == 0:
+                bf[j] = scalars[j] = _border_count(values[f], borders)
+            else:
+                bf[j] = _border_count(values[f][rows], borders)
+
+        for p in plan['projections']:
+            pattern = 0
+            for e, condition in enumerate(c.projections[p][1]):
+                bit = c.condition_bit(condition, scalars.get(condition[0], bf[condition[0]]))
+                pattern = pattern | (np.asarray(bit).astype(np.int64) << e)
+            for j, table in self._patterns(state, p).items():
+                if np.ndim(pattern) == 0:
+                    bf[j] = table[pattern, rows]
+                else:
+                    bf[j] = np.take_along_axis(table[:, rows], pattern[None], axis=0)[0]
+
+        trees = plan['trees']
+        leaves = state['leaves'][trees, rows] & plan['clear'][:, None]
+        for d, k in plan['steps']:
+            t = trees[k]
+            split_values = bf[c.split_feature[t, d]] ^ c.split_xor[t, d, None]
+            leaves[k] |= (split_values >= c.split_border[t, d, None]).astype(c.leaf_dtype) << d
+        return c.raw_sum(leaves, trees)
+
+    def score(self, scenario=None):
+        """
+        Predictions for every base row under a scenario dict with any of
+        'set' / 'add' / 'scale' ({feature: scalar or per-row array}, applied in that
+        order) and 'region'. Floored at zero like tejas_score.score_frame.
+        """
+        scenario = scenario or {}
+        state = self._variant(scenario.get('region'))
+        values = self._values(scenario)
+        raw = state['raw']
+        if values:
+            plan = self.compiled.plan(values)
+            raw = self._static(state, plan).copy()
+            for start in range(0, len(raw), self.chunk_size):
+                rows = slice(start, start + self.chunk_size)
+                raw[rows] += self._affected_sum(state, plan, values, rows)
+        return np.maximum(0, self.compiled.to_prediction(raw))
+
+    def score_batch(self, scenarios):
+        """(n_scenarios, n_rows) predictions."""
+        out = np.empty((len(scenarios), len(self)))
+        for i, scenario in enumerate(scenarios):
+            out[i] = self.score(scenario)
+        return out
+
+    def scenario_frame(self, scenario):
+        """The scenario as a feature frame (for checking against model.predict)."""
+        df = self.base_df.copy()
+        if scenario.get('region'):
+            df['Region'] = scenario['region']
+        for pos, value in self._values(scenario).items():
+            df[self.compiled.float_cols[pos]] = np.broadcast_to(value, len(df))
+        return df
+
+
+def _export(args):
+    compiled = export_model(args.model, args.version)
+    meta = load_meta(args.model, args.version)
+    print(f"Exported '{args.model}' version {meta['version']}: {compiled.n_trees} trees, "
+          f"{compiled.n_binary} binary features ({len(compiled.float_bins)} float, {len(compiled.one_hot)} one-hot, "
+          f"{compiled.n_binary - len(compiled.float_bins) - len(compiled.one_hot)} CTR)")
+
+
+def _whatif(args):
+    with span('load_model'):
+        model, meta = load_model(args.model, args.version)
+        compiled = load_compiled(args.model, meta['version'])
+    with span('features') as s:
+        base = scoring_frame(pd.read_csv(args.input, low_memory=False), meta, args.regions)
+        s.rows = len(base)
+    with span('encode_base', rows=len(base)):
+        engine = WhatIfEngine(compiled, base)
+        engine.score()
+
+    # Scenario grid: launch month (None = as in the file) x trend scale x region move
+    trends = TrendIndex.load()
+    # Cannibalization / analog features are recomputed per month from the base rows
+    history = None
+    if args.months and any(f in CANNIBALIZATION_FEATURES for f in meta['features']):
+        history = prepare_sibling_history(load_sibling_history())
+    month_scenarios = {m: month_scenario(m, meta['features'], trends, base, history) for m in args.months or []}
+    scaled_cols = [f for f in meta['features'] if f in trends.base_columns]
+    grid, scenarios = [], []
+    for month in args.months or [None]:
+        for trend_scale in args.trend_scales:
+            for region in args.move_to or [None]:
+                scenario = dict(month_scenarios[month]) if month else {}
+                if trend_scale != 1:
+                    scenario['scale'] = {c: trend_scale for c in scaled_cols}
+                if region:
+                    scenario['region'] = region
+                grid.append((month or 'base', trend_scale, region or 'base'))
+                scenarios.append(scenario)
+
+    start_t = time.perf_counter()
+    with span('score', rows=len(scenarios) * len(engine)):
+        preds = engine.score_batch(scenarios)
+    elapsed = time.perf_counter() - start_t
+    print(f"Scored {len(scenarios)} scenarios x {len(engine)} rows in {elapsed:.3f} seconds "
+          f"({preds.size / elapsed:,.0f} rows/s)")
+
+    if args.verify:
+        with span('verify'):
+            diffs = [np.abs(np.maximum(0, model.predict(model_matrix(engine.scenario_frame(s), meta['features'],
+                                                                     meta['categorical_cols']))) - p).max()
+                     for s, p in zip(scenarios, preds)]
+        print(f"Max abs difference vs model.predict over {len(scenarios)} scenarios: {max(diffs):.2e}")
+
+    id_cols = [c for c in ('Style', 'COLORDESCRIPTION', 'Region') if c in base.columns]
+    keys = base[id_cols].reset_index(drop=True)
+    out = pd.concat([keys] * len(scenarios), ignore_index=True)
+    out['Launch_Month'] = np.repeat([g[0] for g in grid], len(engine))
+    out['Trend_Scale'] = np.repeat([g[1] for g in grid], len(engine))
+    out['Scored_Region'] = np.repeat([g[2] for g in grid], len(engine))
+    out['Predicted_4m_Order_Quantity'] = np.round(preds.ravel())
+    with span('write', rows=len(out)):
+        out.to_csv(args.output, index=False)
+    print(f"Saved {len(out)} scenario predictions to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiled CatBoost inference and what-if scenario scoring.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export = sub.add_parser('export', help='Write the Python export (model.py) next to a registered model')
+    export.add_argument('--model', default='champion')
+    export.add_argument('--version', default='latest')
+
+    whatif = sub.add_parser('whatif', help='Score a grid of scenarios over a product file')
+    whatif.add_argument('input', nargs='?', default='final_products.csv')
+    whatif.add_argument('--model', default='champion')
+    whatif.add_argument('--version', default='latest')
+    whatif.add_argument('--regions', nargs='+', default=DEFAULT_REGIONS, help='Regions of the base rows')
+    whatif.add_argument('--months', nargs='+', default=None, help='Launch months to try (YYYY-MM)')
+    whatif.add_argument('--trend-scales', nargs='+', type=float, default=[1.0],
+                        help='Multipliers applied to every trend index column')
+    whatif.add_argument('--move-to', nargs='+', default=None, help='Regions to move every frame to')
+    whatif.add_argument('--verify', action='store_true', help='Check every scenario against model.predict')
+    whatif.add_argument('--output', default='whatif_scenarios.csv')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        _export(args)
+    else:
+        start_run('whatif')
+        _whatif(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# Ingestion layer for the raw VSP workbooks (used by explore.ipynb).
+#
+# - Every (workbook, sheet) is parsed with pd.read_excel at most once per workbook version:
+#   the result is cached as parquet under .cache/ingest/, keyed by the file's sha256.
+# - Sheets that are not cached yet are parsed concurrently in a process pool
+#   (openpyxl parsing is pure Python and CPU bound).
+# - _parse_style / extract_color_features are vectorized over whole columns with
+#   string-array operations instead of row-by-row .apply(..., pd.Series).
+
+RAW_DIR = Path("VSP Vision Datasets")
+CACHE_DIR = os.path.join('.cache', 'ingest')
+
+# (workbook, sheet, header row) - header=None keeps the raw grid (demand sheet has a 2-row header)
+DEMAND_SHEET = ("AO-BI275 DEMAND KC KP LA LS KO KS 12.17.25.xlsx", "Brand View", None)
+PRODUCT_SHEETS = [
+    ("Calvin Klein_Sept24 ATP.xlsx", "SUN", 0),
+    ("Calvin Klein_Sept24 ATP.xlsx", "OPH", 0),
+    ("LACOSTE_Sept24 ATP.xlsx", "LACOSTE OPTICAL", 0),
+    ("LACOSTE_Sept24 ATP.xlsx", "LACOSTE SUN", 0),
+    ("Nike_Sept24 ATP.xlsm", "Nike Sept 24 Optical", 0),
+    ("Nike_Sept24 ATP.xlsm", "Nike Sept 24 Sun", 0),
+]
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """sha256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(path, sheet, header, digest):
+    safe_sheet = re.sub(r'[^A-Za-z0-9]+', '_', sheet)
+    return os.path.join(CACHE_DIR, f"{Path(path).stem}__{safe_sheet}__h{header}__{digest[:16]}.parquet")
+
+
+def _to_columnar(df):
+    """
+    Make a sheet parquet-safe: column names become strings and mixed-type object columns
+    (e.g. a header label above numbers) are stored as strings, missing cells stay NaN.
+    """
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.columns[df.dtypes.eq(object)]:
+        values = df[col]
+        df[col] = values.where(values.isna(), values.astype(str))
+    return df
+
+
+def _read_sheet(path, sheet, header, cache_file):
+    """Worker: parse one sheet with openpyxl and write its parquet cache."""
+    df = _to_columnar(pd.read_excel(path, sheet_name=sheet, header=header))
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp = cache_file + '.tmp'
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, cache_file)
+    return cache_file
+
+
+def _from_cache(cache_file, header):
+    df = pd.read_parquet(cache_file)
+    if header is None:
+        # Raw grids are addressed by integer position, as pd.read_excel(header=None) returns them
+        df.columns = range(df.shape[1])
+    return df
+
+
+def read_sheets(requests, base_dir=RAW_DIR, max_workers=None, use_cache=True):
+    """
+    Read many (workbook, sheet, header) requests; returns {(workbook, sheet): DataFrame}.
+    Cached sheets load from parquet, the rest are parsed in parallel worker processes.
+    """
+    base_dir = Path(base_dir)
+    hashes = {}
+    jobs = {}
+    for fname, sheet, header in requests:
+        path = base_dir / fname
+        if fname not in hashes:
+            hashes[fname] = file_hash(path)
+        jobs[(fname, sheet)] = (str(path), sheet, header, _cache_path(path, sheet, header, hashes[fname]))
+
+    to_parse = {key: job for key, job in jobs.items() if not (use_cache and os.path.exists(job[3]))}
+    if to_parse:
+        start_t = time.time()
+        max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(to_parse)))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_read_sheet, *job) for job in to_parse.values()]
+            for f in futures:
+                f.result()
+        print(f"Parsed {len(to_parse)} sheet(s) from Excel in {time.time() - start_t:.1f} seconds "
+              f"({max_workers} workers); {len(jobs) - len(to_parse)} loaded from cache")
+
+    return {key: _from_cache(job[3], job[2]) for key, job in jobs.items()}
+
+
+# --- Vectorized parsing ----------------------------------------------------------
+
+# 'NAME/52/18/BLACK' -> leading run of numeric parts after the name; the last one is the size
+_SIZE_RUN = re.compile(r'(?s)^[^/]*((?:/\s*\d+\s*)+)(?=/|$)(.*)$')
+
+
+def parse_style(styles):
+    """
+    Vectorized _parse_style: split 'STYLE/SIZE/COLOR' strings into Size and Color.
+    Size is the last of the consecutive numeric parts right after the style name; Color
+    is everything after it. Without a numeric part, Color starts at the 2nd part for
+    two-part values and at the 3rd part otherwise.
+    """
+    missing = styles.isna()
+    txt = styles.astype(str).str.strip()
+    n_parts = txt.str.count('/') + 1
+
+    run = txt.str.extract(_SIZE_RUN)
+    has_size = run[0].notna()
+    size = run[0].str.extract(r'(\d+)\s*$')[0]
+    color_after_size = run[1].str[1:]
+
+    color_no_size = np.where(n_parts == 2, txt.str.split('/', n=1).str[1], txt.str.split('/', n=2).str[2])
+    color = pd.Series(np.where(has_size, color_after_size, color_no_size), index=styles.index).str.strip()
+
+    invalid = missing | (n_parts < 2)
+    return pd.DataFrame({
+        'Size': size.where(has_size & ~invalid, ''),
+        'Color': color.where(~invalid, '').fillna(''),
+    }, index=styles.index)
+
+
+# Ordered color rules: the first matching rule wins (same order as the original if-chain)
+COLOR_RULES = [
+    ('tortoise', ['TORTO', 'HAVANA', 'HAVA', 'HAV', 'TOR', 'TOKYO', 'HONEY TO', 'DARK TO', 'SOFT TO', 'BLONDE HA', 'MATTE T']),
+    ('crystal', ['CRYST', 'CLEAR', 'TRANSPARENT', 'TRANSPAREN', 'TRANSPARE', 'MT CRYS', 'SHINY CRY', 'MATTE CRYS', 'CRY']),
+    ('black', ['BLACK', 'BLAC', 'MATTE BL', 'MATTE B', 'MATT BLAC', 'MATTE BLA', 'OBSIDIA', 'ONYX', 'GRIDIRO', 'MATTE O']),
+    ('grey', ['GREY', 'GRAY', 'ANTHR', 'ANTHRAC', 'GUNMETAL', 'GUNSMOK', 'SMOKE', 'WOLF', 'OYSTER', 'FOOTBAL', 'MINERAL', 'ARMORY', 'LUMI', 'DARK GR', 'MATTE A', 'MATTE G', 'MATTE S', 'SATIN G', 'DARK', 'MATTE D', 'CHARCOA', 'STRIPED G']),
+    ('blue', ['BLUE', 'NAVY', 'NAV', 'AVIO', 'MIDNIGH', 'AZURE', 'PETROL', 'INDIGO', 'ASTRONOMY', 'DENIM', 'AQUA', 'SATIN B', 'SATIN N', 'MEDITER', 'TURQUOISE', 'MATTE N', 'MATTE M', 'MATTE I', 'MATTE BLU', 'MYSTIC']),
+    ('brown', ['BROWN', 'TAUPE', 'MINK', 'CACAO', 'MATTE BUR', 'MATTE BROW', 'LIGHT BRO', 'STRIPED B']),
+    ('green', ['GREEN', 'STADIUM', 'MINT', 'SAGE', 'OLIVE', 'STAD', 'MATTE GREE', 'LIGHT G', 'FOREST', 'VINTAGE']),
+    ('gold', ['GOLD', 'AMBER', 'ANTIQUE', 'OIL G', 'SATIN A', 'MATTE GO', 'MATTE GOL', 'LIGHT GOL']),
+    ('red', ['RED', 'BURGUNDY', 'BURGUND', 'CHERRY', 'OXBLOOD', 'BRICK', 'UNIVERSITY']),
+    ('pink', ['PINK', 'ROSE', 'BLUSH', 'MAGENTA', 'FOAM', 'SOFT PI']),
+    ('beige', ['BEIGE', 'SAND', 'KHAK', 'KHAKI', 'BIO BEI', 'NUD', 'MILKY', 'MATTE KHAK']),
+    ('yellow', ['YELLOW', 'BUTTERSC', 'BLONDE', 'CYBER']),
+    ('purple', ['PURPLE', 'VIOLET', 'LILAC', 'PLUM', 'MATTE V', 'MATTE PURPL']),
+    ('orange', ['ORANGE', 'PEACH', 'TOTAL', 'BURNT']),
+    ('silver', ['SILVER', 'PLATINU', 'LIGHT S']),
+    ('white', ['WHITE', 'CHALK', 'MATTE W', 'SATIN W']),
+]
+
+
+def _contains_any(values, needles):
+    pattern = '|'.join(re.escape(n) for n in needles)
+    return values.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+
+
+def extract_color_features(raw):
+    """
+    Vectorized extract_color_features: raw color strings -> DataFrame of
+    Color_Base, Color_Finish and Is_Multicolor (missing/blank colors -> None, None, 0).
+    """
+    missing = (raw.isna() | (raw.astype(str).str.strip() == '')).to_numpy()
+    full_name = raw.astype(str).str.upper().str.replace('-', '/', regex=False).str.strip()
+
+    finish = np.select(
+        [_contains_any(full_name, ['MATTE', 'MATT', 'WOLF']),
+         _contains_any(full_name, ['SATIN']),
+         _contains_any(full_name, ['BRUSH'])],
+        ['matte', 'satin', 'brushed'], default='shiny',
+    ).astype(object)
+
+    parts = full_name.str.split('/')
+    primary = parts.str[0].str.strip()
+    second = parts.str[1].str.strip()
+    is_multicolor = np.array(second.notna() & (second != ''), dtype=int)
+
+    conditions, choices = [], []
+    for base, needles in COLOR_RULES:
+        cond = _contains_any(primary, needles)
+        if base == 'black':
+            # 'MATTE BLUE' matches the black prefixes but is blue
+            cond = cond & ~_contains_any(primary, ['BLUE'])
+        conditions.append(cond)
+        choices.append(base)
+    color_base = np.select(conditions, choices, default='other').astype(object)
+    color_base[(primary == '').to_numpy()] = "Don't know"
+
+    color_base[missing] = None
+    finish[missing] = None
+    is_multicolor[missing] = 0
+    return pd.DataFrame({'Color_Base': color_base, 'Color_Finish': finish, 'Is_Multicolor': is_multicolor},
+                        index=raw.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the raw VSP workbooks into the parquet ingest cache.')
+    parser.add_argument('--base-dir', default=str(RAW_DIR))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--refresh', action='store_true', help='Re-parse every sheet even if cached')
+    args = parser.parse_args()
+
+    requests = [DEMAND_SHEET] + [r for r in PRODUCT_SHEETS if (Path(args.base_dir) / r[0]).exists()]
+    skipped = sorted({r[0] for r in PRODUCT_SHEETS} - {r[0] for r in requests})
+    for fname in skipped:
+        print(f"Skipping missing workbook: {fname}")
+
+    start_t = time.time()
+    sheets = read_sheets(requests, args.base_dir, args.workers, use_cache=not args.refresh)
+    for (fname, sheet), df in sheets.items():
+        print(f"{fname} [{sheet}]: {df.shape}")
+    print(f"Finished in {time.time() - start_t:.2f} seconds; cache in {CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
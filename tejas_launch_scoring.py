@@ -0,0 +1,253 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from tejas_feature_store import load_table
+from tejas_model_registry import load_model
+from tejas_score import map_product_columns, DEFAULT_REGIONS
+from tejas_trend_index import TrendIndex
+from tejas_trace import span, start_run
+from tejas_cannibalization import (CANNIBALIZATION_FEATURES, add_cannibalization_features,
+                                   load_sibling_history, prepare_sibling_history, release_frame_cols)
+from tejas_lookalike import ANALOG_FEATURES, LookalikeIndex, add_analog_features
+
+# "What if we launch in month X?" scoring across every product x Region x candidate month.
+#
+# Instead of merging trend tables onto an exploded frame, combinations are generated
+# chunk by chunk from flat indices, trend features are looked up by month position in
+# the per-month trend index, and each chunk goes straight into model.predict.
+# Memory stays flat in the number of combinations.
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def monthly_trend_table(trend_cols, trends=None):
+    """
+    One row per month of every trend column, taken from the shared trend index.
+    Returns (months as a PeriodIndex, float array of shape (n_months, n_trend_cols)).
+    """
+    trends = trends or TrendIndex.load()
+    return trends.months, trends.table[list(trend_cols)].to_numpy(dtype=float)
+
+
+def _calendar_flags(month_numbers):
+    """Vectorized is_* flags for an array of calendar month numbers (same rules as tejas_demand_targets)."""
+    return {
+        'is_summer': ((month_numbers >= 6) & (month_numbers <= 8)).astype(int),
+        'is_holiday_season': ((month_numbers == 11) | (month_numbers == 12)).astype(int),
+        'is_insurance_reset': (month_numbers == 1).astype(int),
+    }
+
+
+def release_cannibalization(products, regions, launch_months, columns, history=None):
+    """
+    Cannibalization features with the whole release launching in each candidate month:
+    one (n_months, n_products, n_regions) array per column.
+    """
+    # Prepared once; only the release rows change from month to month
+    history = prepare_sibling_history(load_sibling_history() if history is None else history)
+    region_df = pd.DataFrame({'Region': list(regions)})
+    frame_cols = release_frame_cols(products)
+    out = {c: np.empty((len(launch_months), len(products), len(regions))) for c in columns}
+    for i, month in enumerate(launch_months):
+        # Product-major cross join, so row p * n_regions + r is (product p, region r)
+        release = products.assign(Date=month.to_timestamp()).merge(region_df, how='cross')
+        release = add_cannibalization_features(release, history, frame_cols=frame_cols)
+        for col in columns:
+            out[col][i] = release[col].to_numpy().reshape(len(products), len(regions))
+    return out
+
+
+def release_analogs(products, regions, launch_months, columns, index=None):
+    """
+    Analog (lookalike) features with the release launching in each candidate month (a
+    row only sees curves that ended by its month): one (n_months, n_products, n_regions)
+    array per column.
+    """
+    index = LookalikeIndex.load() if index is None else index
+    region_df = pd.DataFrame({'Region': list(regions)})
+    frame_cols = release_frame_cols(products)
+    out = {c: np.empty((len(launch_months), len(products), len(regions))) for c in columns}
+    for i, month in enumerate(launch_months):
+        # Product-major cross join, so row p * n_regions + r is (product p, region r)
+        release = products.assign(Date=month.to_timestamp()).merge(region_df, how='cross')
+        release = add_analog_features(release, index, frame_cols=frame_cols)
+        for col in columns:
+            out[col][i] = release[col].to_numpy().reshape(len(products), len(regions))
+    return out
+
+
+def iter_launch_chunks(products, regions, launch_months, features, categorical_cols,
+                       trend_months, trend_values, trend_cols, chunk_size=DEFAULT_CHUNK_SIZE,
+                       release_values=None):
+    """
+    Yield (keys, X) per chunk of product x region x launch-month combinations.
+    `keys` holds the product row, region and month of each combination; `X` is the
+    model feature frame for the chunk. `release_values` are the month-dependent
+    arrays from release_cannibalization / release_analogs.
+    """
+    release_values = release_values or {}
+    n_prod, n_reg, n_mon = len(products), len(regions), len(launch_months)
+    total = n_prod * n_reg * n_mon
+
+    # Per-product columns as plain arrays; categoricals pre-cleaned once
+    product_cols = [f for f in features
+                    if f in products.columns and f not in trend_cols and f not in release_values and f != 'Region']
+    product_arrays = {}
+    for col in product_cols:
+        values = products[col]
+        if col in categorical_cols:
+            values = values.astype(str).fillna('missing')
+        product_arrays[col] = values.to_numpy()
+
+    # Position of each candidate month in the trend table (O(1) lookups afterwards)
+    month_pos = trend_months.get_indexer(launch_months)
+    if (month_pos < 0).any():
+        missing = [str(m) for m, p in zip(launch_months, month_pos) if p < 0]
+        raise KeyError(f"No trend data for candidate month(s): {missing}")
+    month_numbers = np.asarray(launch_months.month)
+    region_array = np.asarray(regions, dtype=object)
+    trend_idx = {col: i for i, col in enumerate(trend_cols)}
+
+    for start in range(0, total, chunk_size):
+        flat = np.arange(start, min(start + chunk_size, total))
+        # Decompose the flat index into (product, region, month)
+        p = flat // (n_reg * n_mon)
+        r = (flat // n_mon) % n_reg
+        m = flat % n_mon
+
+        chunk_trends = trend_values[month_pos[m]]
+        chunk_flags = _calendar_flags(month_numbers[m])
+
+        columns = {}
+        for f in features:
+            if f == 'Region':
+                columns[f] = region_array[r]
+            elif f in trend_idx:
+                columns[f] = chunk_trends[:, trend_idx[f]]
+            elif f in chunk_flags:
+                columns[f] = chunk_flags[f]
+            elif f in release_values:
+                columns[f] = release_values[f][m, p, r]
+            else:
+                columns[f] = product_arrays[f][p]
+
+        keys = {'product_row': p, 'Region': region_array[r], 'Launch_Month': launch_months[m].astype(str)}
+        yield keys, pd.DataFrame(columns, columns=features)
+
+
+def score_launch_months(model, meta, products, launch_months, regions=DEFAULT_REGIONS,
+                        chunk_size=DEFAULT_CHUNK_SIZE, output=None, id_cols=('Style',)):
+    """
+    Score every product x region x launch month. Results are appended chunk by chunk to
+    `output` (CSV) when given, otherwise returned as one DataFrame.
+    """
+    features = meta['features']
+    categorical_cols = meta['categorical_cols']
+    launch_months = pd.PeriodIndex(launch_months, freq='M')
+
+    # Trend features (incl. lags/momentum) come from the per-month table,
+    # calendar flags from the month itself, cannibalization and analog features from the release per month
+    trends = TrendIndex.load()
+    trend_cols = [f for f in features if f in trends.columns]
+    sibling_cols = [f for f in features if f in CANNIBALIZATION_FEATURES]
+    analog_cols = [f for f in features if f in ANALOG_FEATURES]
+    missing = [f for f in features
+               if f not in products.columns and f != 'Region' and f not in trend_cols
+               and f not in sibling_cols and f not in analog_cols and not f.startswith('is_')]
+    if missing:
+        raise KeyError(f"Products are missing model features: {missing}")
+    trend_months, trend_values = monthly_trend_table(trend_cols, trends)
+    release_values = {}
+    if sibling_cols:
+        with span('cannibalization', rows=len(products) * len(regions) * len(launch_months)):
+            release_values.update(release_cannibalization(products, regions, launch_months, sibling_cols))
+    if analog_cols:
+        with span('analogs', rows=len(products) * len(regions) * len(launch_months)):
+            release_values.update(release_analogs(products, regions, launch_months, analog_cols))
+
+    id_cols = [c for c in id_cols if c in products.columns]
+    id_arrays = {c: products[c].to_numpy() for c in id_cols}
+
+    if output and os.path.exists(output):
+        os.remove(output)
+
+    results = []
+    n_rows = 0
+    chunks = iter_launch_chunks(products, regions, launch_months, features, categorical_cols,
+                                trend_months, trend_values, trend_cols, chunk_size, release_values)
+    while True:
+        # Chunk construction and prediction are timed separately (one span call per chunk)
+        with span('build_chunk'):
+            keys, X = next(chunks, (None, None))
+        if X is None:
+            break
+        with span('predict', rows=len(X)):
+            preds = np.maximum(0, model.predict(X))
+        out = pd.DataFrame({c: id_arrays[c][keys['product_row']] for c in id_cols})
+        out['Region'] = keys['Region']
+        out['Launch_Month'] = keys['Launch_Month']
+        out['Predicted_4m_Order_Quantity'] = np.round(preds)
+        n_rows += len(out)
+
+        if output:
+            with span('write', rows=len(out)):
+                out.to_csv(output, mode='a', header=(n_rows == len(out)), index=False)
+        else:
+            results.append(out)
+
+    print(f"Scored {n_rows} product x region x month combinations.")
+    return None if output else pd.concat(results, ignore_index=True)
+
+
+def best_launch_months(scored_df, id_cols=('Style',)):
+    """The highest-demand launch month per product and region."""
+    keys = list(id_cols) + ['Region']
+    best_idx = scored_df.groupby(keys)['Predicted_4m_Order_Quantity'].idxmax()
+    return scored_df.loc[best_idx].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every product x Region x candidate launch month.')
+    parser.add_argument('input', nargs='?', default='final_products.csv')
+    parser.add_argument('--model', default='champion')
+    parser.add_argument('--version', default='latest')
+    parser.add_argument('--months', nargs='+', default=None,
+                        help="Candidate launch months as YYYY-MM (default: every month with trend data)")
+    parser.add_argument('--regions', nargs='+', default=DEFAULT_REGIONS)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--output', default='launch_month_scenarios.csv')
+    args = parser.parse_args()
+
+    start_run('launch_scoring')
+    with span('load_model'):
+        model, meta = load_model(args.model, args.version)
+    print(f"Loaded model '{meta['name']}' version {meta['version']}")
+
+    with span('load'):
+        products = map_product_columns(pd.read_csv(args.input, low_memory=False))
+    # One row per product/colorway is enough: region and month are generated
+    products = products.drop_duplicates(subset=['MATERIALNUMBER', 'COLORDESCRIPTION']).reset_index(drop=True)
+    id_cols = ('Style', 'COLORDESCRIPTION')
+
+    if args.months:
+        launch_months = pd.PeriodIndex(args.months, freq='M')
+    else:
+        # Every month the demand history covers
+        launch_months = pd.PeriodIndex(load_table('enriched', columns=['Date'])['Date'].unique(), freq='M').sort_values()
+
+    start_t = time.time()
+    score_launch_months(model, meta, products, launch_months, args.regions,
+                        chunk_size=args.chunk_size, output=args.output, id_cols=id_cols)
+    print(f"Finished in {time.time() - start_t:.2f} seconds; saved to {args.output}")
+
+    best = best_launch_months(pd.read_csv(args.output), id_cols)
+    best_filename = args.output.replace('.csv', '_best.csv')
+    best.to_csv(best_filename, index=False)
+    print(f"Saved best launch month per product/region to {best_filename}")
+
+
+if __name__ == "__main__":
+    main()
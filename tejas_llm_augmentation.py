@@ -1,58 +1,26 @@
 import pandas as pd
 import numpy as np
 import os
+import re
 import json
+import time
+import argparse
 from dotenv import load_dotenv
-import anthropic
 from sklearn.metrics import mean_absolute_error
 
+from tejas_llm_service import LLMService, DEFAULT_MODEL
+from tejas_trace import span, start_run
+
 # Load environment variables
 load_dotenv()
 
-def main():
-    print("Loading datasets...")
-    # Load the predictions file
-    try:
-        preds_df = pd.read_csv('final_order_predictions.csv')
-        # Load final_demand to extract the raw trend data for standard context
-        features_df = pd.read_csv('final_demand.csv', low_memory=False)
-    except Exception as e:
-        print(f"Error loading CSVs: {e}")
-        return
-        
-    # We join them to get the Google Trend features
-    # preds_df has: Style, Size, Color_Base, Color_Finish, Region, Date, 4m_demand, Predicted_4m_Order_Quantity
-    df = preds_df.merge(features_df, on=['Style', 'Size', 'Color_Base', 'Color_Finish', 'Region', 'Date', '4m_demand'], how='left')
-    
-    # Pick the top 5 most important predictions (e.g., highest actual demand)
-    top_5 = df.nlargest(5, '4m_demand').copy()
-    
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        print("Error: ANTHROPIC_API_KEY not found in .env file.")
-        return
-        
-    print("Initializing Anthropic Client...")
-    
-    # Strictly following user template
-    client = anthropic.Anthropic(
-        api_key=api_key,
-    )
-    
-    model_name = "claude-opus-4-6"
-    print(f"Using Model: {model_name}")
-    
-    llm_predictions = []
-    llm_reasonings = []
-    
-    import time
-    
-    for idx, row in top_5.iterrows():
-        # Retrieve the specific macro-trends for this item
-        fsa_trend = row.get('Trend_FSA_glasses', 0)
-        metal_trend = row.get('Trend_metal_frame_glasses', 0)
-        
-        prompt = f"""You are an expert eyewear supply chain forecaster. 
+
+def build_prompt(row):
+    # Retrieve the specific macro-trends for this item
+    fsa_trend = row.get('Trend_FSA_glasses', 0)
+    metal_trend = row.get('Trend_metal_frame_glasses', 0)
+
+    return f"""You are an expert eyewear supply chain forecaster.
 We are predicting the 4-month initial demand order volume for a specific eyewear frame release.
 Our Gradient Boosting model (CatBoost) generated a purely mathematical prediction. Your task is to apply qualitative reasoning to adjust this quantitative baseline.
 
@@ -69,6 +37,7 @@ Our Gradient Boosting model (CatBoost) generated a purely mathematical predictio
 
 [BASELINE FORECAST]
 - CatBoost Mathematical Prediction: {row['Predicted_4m_Order_Quantity']} units.
+- CatBoost 80% Prediction Interval: {row.get('Predicted_P10', 'n/a')} to {row.get('Predicted_P90', 'n/a')} units.
 
 [INSTRUCTIONS]
 Current Time-Series LLM research indicates that quantitative models under-predict viral trends and over-predict decaying trends.
@@ -80,74 +49,119 @@ You must strictly output ONLY a valid JSON object in the following format, with
     "Reasoning": "<A concise explanation of your qualitative adjustment.>"
 }}
 """
-        print(f"\n--- Processing Style: {row['Style']} ---")
-        print(f"Sending API request for CatBoost prediction: {row['Predicted_4m_Order_Quantity']}...")
-        
-        try:
-            start_t = time.time()
-            # Strictly following user template
-            message = client.messages.create(
-                model=model_name,
-                max_tokens=2048,
-                timeout=15, # Added strict timeout so script does not hang on API unresponsive
-                temperature=0.2, # Reduced to 0.2 because we need strictly JSON
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            elapsed = time.time() - start_t
-            print(f"API call succeeded in {elapsed:.2f} seconds.")
-            
-            # Parse response
-            result_text = message.content[0].text.strip()
-            print(f"Raw API Response: {result_text}")
-            
-            import re
-            json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-            if json_match:
-                result_text = json_match.group(0)
-            
-            result_json = json.loads(result_text)
-            
-            new_pred = int(result_json.get("Adjusted_Prediction", row['Predicted_4m_Order_Quantity']))
-            reason = result_json.get("Reasoning", "No valid reasoning provided.")
-            
-            llm_predictions.append(new_pred)
-            llm_reasonings.append(reason)
-            
-            print(f"Successfully extracted -> Pred: {new_pred} | Reason: {reason}")
-            
-        except Exception as e:
-            print(f"\n*** FATAL API ERROR for Style {row['Style']} ***")
-            print(f"Error Details: {str(e)}")
-            llm_predictions.append(row['Predicted_4m_Order_Quantity'])
-            llm_reasonings.append(f"API Error: {str(e)}")
-            
-    top_5['LLM_Predicted_Quantity'] = llm_predictions
-    top_5['LLM_Reasoning'] = llm_reasonings
-    
-    catboost_mae = mean_absolute_error(top_5['4m_demand'], top_5['Predicted_4m_Order_Quantity'])
-    llm_mae = mean_absolute_error(top_5['4m_demand'], top_5['LLM_Predicted_Quantity'])
-    
+
+
+def parse_adjustment(response, baseline):
+    """(prediction, reasoning) from one LLM response; falls back to the baseline on any error."""
+    if isinstance(response, Exception):
+        return baseline, f"API Error: {str(response)}"
+    try:
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        result_json = json.loads(json_match.group(0) if json_match else response)
+        new_pred = int(result_json.get("Adjusted_Prediction", baseline))
+        reason = result_json.get("Reasoning", "No valid reasoning provided.")
+        return new_pred, reason
+    except Exception as e:
+        return baseline, f"Parse Error: {str(e)}"
+
+
+def route_rows(df, budget, min_score=0.0):
+    """
+    Pick the rows worth an LLM call without looking at the actual target.
+    Score = P10-P90 interval width x predicted volume: wide intervals on big orders are where
+    an adjustment can remove the most expected error. Returns the top `budget` rows whose
+    score is above `min_score`, highest first.
+    """
+    missing = [c for c in ('Predicted_P10', 'Predicted_P90') if c not in df.columns]
+    if missing:
+        raise KeyError(f"Predictions have no interval columns {missing}; rerun tejas_modeling_champion.py")
+    df = df.copy()
+    df['Interval_Width'] = df['Predicted_P90'] - df['Predicted_P10']
+    df['Routing_Score'] = df['Interval_Width'] * df['Predicted_4m_Order_Quantity']
+    routed = df[df['Routing_Score'] > min_score].nlargest(budget, 'Routing_Score')
+    return routed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM adjustment of the highest-impact CatBoost forecasts.')
+    parser.add_argument('--budget', type=int, default=5, help='Maximum number of LLM calls (rows adjusted)')
+    parser.add_argument('--min-score', type=float, default=0.0, help='Only route rows above this interval width x volume')
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rpm', type=int, default=50, help='Requests per minute')
+    parser.add_argument('--batch', action='store_true', help='Use the Message Batches API (large jobs)')
+    parser.add_argument('--base-url', default=None, help='Alternative API endpoint, e.g. a local stub server')
+    args = parser.parse_args()
+
+    start_run('llm_augmentation')
+    print("Loading datasets...")
+    # Load the predictions file
+    try:
+        with span('load'):
+            preds_df = pd.read_csv('final_order_predictions.csv')
+            # Load final_demand to extract the raw trend data for standard context
+            features_df = pd.read_csv('final_demand.csv', low_memory=False)
+    except Exception as e:
+        print(f"Error loading CSVs: {e}")
+        return
+
+    # We join them to get the Google Trend features
+    # preds_df has: Style, Size, Color_Base, Color_Finish, Region, Date, 4m_demand, Predicted_4m_Order_Quantity
+    with span('merge', rows=len(preds_df)):
+        df = preds_df.merge(features_df, on=['Style', 'Size', 'Color_Base', 'Color_Finish', 'Region', 'Date', '4m_demand'], how='left')
+
+    # Route the most uncertain high-volume forecasts (interval width x volume) within the call budget
+    top_n = route_rows(df, args.budget, args.min_score)
+    print(f"Routed {len(top_n)} of {len(df)} rows to the LLM "
+          f"(score threshold {top_n['Routing_Score'].min() if len(top_n) else float('nan'):.0f})")
+
+    if not os.getenv("ANTHROPIC_API_KEY") and not args.base_url:
+        print("Error: ANTHROPIC_API_KEY not found in .env file.")
+        return
+
+    service = LLMService(model=args.model, base_url=args.base_url,
+                         max_concurrency=args.concurrency, requests_per_minute=args.rpm)
+    print(f"Using Model: {args.model}" + (f" via {args.base_url}" if args.base_url else ""))
+
+    prompts = [build_prompt(row) for _, row in top_n.iterrows()]
+    start_t = time.time()
+    with span('llm_calls', rows=len(prompts), batch=args.batch):
+        if args.batch:
+            responses = service.complete_batch(prompts)
+        else:
+            responses = service.complete_many(prompts)
+    print(f"{len(prompts)} adjustments in {time.time() - start_t:.2f} seconds "
+          f"({service.stats['cache_hits']} cached, {service.stats['api_calls']} API calls, "
+          f"{service.stats['retries']} retries, {service.stats['errors']} errors)")
+
+    adjustments = [parse_adjustment(r, b) for r, b in zip(responses, top_n['Predicted_4m_Order_Quantity'])]
+    top_n['LLM_Predicted_Quantity'] = [a[0] for a in adjustments]
+    top_n['LLM_Reasoning'] = [a[1] for a in adjustments]
+
+    catboost_mae = mean_absolute_error(top_n['4m_demand'], top_n['Predicted_4m_Order_Quantity'])
+    llm_mae = mean_absolute_error(top_n['4m_demand'], top_n['LLM_Predicted_Quantity'])
+
     print("\n==================================")
-    print(" LLM Augmentation Results (Top 5)")
+    print(f" LLM Augmentation Results (Top {args.budget})")
     print("==================================")
-    print(f"CatBoost Baseline MAE (Top 5): {catboost_mae:.2f}")
-    print(f"LLM Augmented MAE (Top 5):     {llm_mae:.2f}")
-    
+    print(f"CatBoost Baseline MAE (Top {args.budget}): {catboost_mae:.2f}")
+    print(f"LLM Augmented MAE (Top {args.budget}):     {llm_mae:.2f}")
+
     if llm_mae < catboost_mae:
-        print(f"-> EXCELLENT: Claude Opus 4.6 improved the MAE by {catboost_mae - llm_mae:.2f} frames!")
+        print(f"-> EXCELLENT: The LLM improved the MAE by {catboost_mae - llm_mae:.2f} frames!")
     else:
         print(f"-> NO IMPROVEMENT: The LLM did not improve the MAE. CatBoost was better by {llm_mae - catboost_mae:.2f} frames.")
-        
+
     print("\nSample LLM Adjustments:")
-    for _, row in top_5.head(3).iterrows():
+    for _, row in top_n.head(3).iterrows():
         print(f"- Frame: {row['Style']} ({row['Color_Base']} {row['Color_Finish']})")
-        print(f"  Actual: {row['4m_demand']} | CatBoost: {row['Predicted_4m_Order_Quantity']} | Claude Opus: {row['LLM_Predicted_Quantity']}")
+        print(f"  Actual: {row['4m_demand']} | CatBoost: {row['Predicted_4m_Order_Quantity']} | LLM: {row['LLM_Predicted_Quantity']}")
         print(f"  Reasoning: {row['LLM_Reasoning']}\n")
-        
-    top_5.to_csv('llm_opus_augmented_predictions_top5.csv', index=False)
-    print("Saved 'llm_opus_augmented_predictions_top5.csv'.")
+
+    output_filename = f'llm_opus_augmented_predictions_top{args.budget}.csv'
+    with span('write', rows=len(top_n)):
+        top_n.to_csv(output_filename, index=False)
+    print(f"Saved '{output_filename}'.")
 
 if __name__ == "__main__":
     main()
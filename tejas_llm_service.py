@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Cached, concurrent, rate-limited LLM calls for the forecast adjustment stage.
+#
+# - asyncio + a semaphore bound the number of in-flight requests
+# - a token bucket caps requests per minute
+# - retryable errors (429 / 5xx / 529 overloaded / connection) back off exponentially with full jitter
+# - every response is cached on disk, keyed by sha256(model + generation settings + prompt),
+#   so re-runs only pay for prompts that changed
+# - large jobs can go through the provider's Message Batches API instead
+# - `base_url` points the client at any compatible server, e.g. the local stub below
+#   (which also serves the batch endpoints, so --batch runs offline too):
+#       python tejas_llm_service.py stub --port 8765
+#       python tejas_llm_augmentation.py --base-url http://127.0.0.1:8765 --batch
+
+DEFAULT_MODEL = "claude-opus-4-6"
+CACHE_DIR = os.path.join('.cache', 'llm')
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    """One JSON file per response under `cache_dir`, named by the request hash."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(model, prompt, **settings):
+        payload = json.dumps({'model': model, 'prompt': prompt, **settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)['text']
+
+    def put(self, key, text):
+        # Write-then-rename so a crash never leaves a half-written cache entry
+        tmp = self._path(key) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'text': text, 'created': time.time()}, f)
+        os.replace(tmp, self._path(key))
+
+
+def _is_retryable(exc):
+    import anthropic
+    if isinstance(exc, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return True
+    return isinstance(exc, anthropic.APIStatusError) and exc.status_code in RETRYABLE_STATUS
+
+
+class LLMService:
+    """Prompt in, response text out, with concurrency/rate limits, retries and a disk cache."""
+
+    def __init__(self, model=DEFAULT_MODEL, api_key=None, base_url=None, max_concurrency=8,
+                 requests_per_minute=50, max_retries=5, backoff_base=1.0, backoff_cap=60.0,
+                 max_tokens=2048, temperature=0.2, timeout=60, cache_dir=CACHE_DIR):
+        self.model = model
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_dir)
+        self.stats = {'cache_hits': 0, 'api_calls': 0, 'retries': 0, 'errors': 0}
+
+    def _key(self, prompt):
+        return self.cache.key(self.model, prompt, max_tokens=self.max_tokens, temperature=self.temperature)
+
+    def _params(self, prompt):
+        params = dict(model=self.model, max_tokens=self.max_tokens, messages=[{"role": "user", "content": prompt}])
+        if self.temperature is not None:
+            params['temperature'] = self.temperature
+        return params
+
+    def _client_kwargs(self):
+        # SDK-level retries are off: retries/backoff are handled here, under the rate limiter
+        kwargs = dict(api_key=self.api_key or 'stub', max_retries=0, timeout=self.timeout)
+        if self.base_url:
+            kwargs['base_url'] = self.base_url
+        return kwargs
+
+    # --- Concurrent mode ---------------------------------------------------------
+
+    async def _complete(self, client, prompt, semaphore, bucket):
+        key = self._key(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await bucket.acquire()
+                try:
+                    self.stats['api_calls'] += 1
+                    params = self._params(prompt)
+                    # anthropic>=1.0 dropped the `temperature` keyword from messages.create; it goes in
+                    # the request body, the same field the batch path sends inside `params`
+                    temperature = params.pop('temperature', None)
+                    message = await client.messages.create(
+                        **params, extra_body=None if temperature is None else {'temperature': temperature})
+                    text = message.content[0].text.strip()
+                    self.cache.put(key, text)
+                    return text
+                except Exception as e:
+                    if attempt == self.max_retries or not _is_retryable(e):
+                        self.stats['errors'] += 1
+                        raise
+                    # Exponential backoff with full jitter
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+
+    async def complete_many_async(self, prompts):
+        """Responses in prompt order; a failed prompt yields its exception instead of text."""
+        import anthropic
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = TokenBucket(self.requests_per_minute / 60.0, capacity=self.max_concurrency)
+        # Identical prompts are only requested once
+        unique = list(dict.fromkeys(prompts))
+        async with anthropic.AsyncAnthropic(**self._client_kwargs()) as client:
+            tasks = [self._complete(client, p, semaphore, bucket) for p in unique]
+            responses = dict(zip(unique, await asyncio.gather(*tasks, return_exceptions=True)))
+        return [responses[p] for p in prompts]
+
+    def complete_many(self, prompts):
+        return asyncio.run(self.complete_many_async(list(prompts)))
+
+    # --- Batch mode --------------------------------------------------------------
+
+    def complete_batch(self, prompts, poll_interval=30, max_wait=24 * 3600):
+        """
+        Submit every uncached prompt as one Message Batch (cheaper, asynchronous on the
+        provider side), poll until it ends, and cache the results.
+        """
+        import anthropic
+        prompts = list(prompts)
+        keys = [self._key(p) for p in prompts]
+        results = [self.cache.get(k) for k in keys]
+        self.stats['cache_hits'] += sum(r is not None for r in results)
+
+        # Identical prompts are only sent once; custom_id is the (64-char) cache key
+        pending = {k: p for k, p, r in zip(keys, prompts, results) if r is None}
+        if pending:
+            client = anthropic.Anthropic(**self._client_kwargs())
+            batch = client.messages.batches.create(requests=[
+                {"custom_id": k, "params": self._params(p)} for k, p in pending.items()
+            ])
+            print(f"Submitted batch {batch.id} with {len(pending)} requests")
+            self.stats['api_calls'] += len(pending)
+
+            start = time.time()
+            while batch.processing_status != 'ended':
+                if time.time() - start > max_wait:
+                    raise TimeoutError(f"Batch {batch.id} did not finish within {max_wait} seconds")
+                time.sleep(poll_interval)
+                batch = client.messages.batches.retrieve(batch.id)
+
+            for entry in client.messages.batches.results(batch.id):
+                if entry.result.type == 'succeeded':
+                    self.cache.put(entry.custom_id, entry.result.message.content[0].text.strip())
+                else:
+                    self.stats['errors'] += 1
+
+        out = []
+        for k, r in zip(keys, results):
+            text = r if r is not None else self.cache.get(k)
+            out.append(text if text is not None else RuntimeError("Batch request did not succeed"))
+        return out
+
+
+# --- Local stub server ----------------------------------------------------------
+# Speaks just enough of the Messages API (and Message Batches API) for offline runs: it
+# echoes the baseline forecast found in the prompt back as the adjusted prediction.
+# Batches end as soon as they are created; their results are kept in memory.
+
+def _stub_message(body):
+    prompt = body.get('messages', [{}])[0].get('content', '')
+    baseline = 0
+    for line in prompt.splitlines():
+        if 'Prediction:' in line:
+            digits = ''.join(ch for ch in line.split(':', 1)[1] if ch.isdigit() or ch == '.')
+            baseline = float(digits.rstrip('.') or 0)
+    text = json.dumps({"Adjusted_Prediction": int(baseline), "Reasoning": "Stub response: baseline kept."})
+    return {
+        "id": "msg_stub", "type": "message", "role": "assistant", "model": body.get('model', 'stub'),
+        "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+    }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    batches = {}  # batch id -> (batch object, JSONL result lines)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if self.path.rstrip('/').endswith('/messages/batches'):
+            self._send(200, self._create_batch(body))
+            return
+        if random.random() < self.fail_rate:
+            # Exercise the retry path
+            self._send(529, {"type": "error", "error": {"type": "overloaded_error", "message": "stub overload"}})
+            return
+        self._send(200, _stub_message(body))
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].rstrip('/').split('/')
+        batch_id = parts[-2] if parts[-1] == 'results' else parts[-1]
+        if 'batches' not in parts or batch_id not in self.batches:
+            self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+        batch, results = self.batches[batch_id]
+        if parts[-1] != 'results':
+            self._send(200, batch)
+            return
+        data = ''.join(json.dumps(line) + '\n' for line in results).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/binary')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _create_batch(self, body):
+        requests = body.get('requests', [])
+        batch_id = f'msgbatch_stub_{len(self.batches)}'
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        batch = {
+            "id": batch_id, "type": "message_batch", "processing_status": "ended",
+            "request_counts": {"processing": 0, "succeeded": len(requests), "errored": 0, "canceled": 0, "expired": 0},
+            "created_at": now, "ended_at": now, "expires_at": now, "archived_at": None, "cancel_initiated_at": None,
+            "results_url": f"http://{self.headers.get('Host')}/v1/messages/batches/{batch_id}/results",
+        }
+        results = [{"custom_id": r['custom_id'], "result": {"type": "succeeded", "message": _stub_message(r['params'])}}
+                   for r in requests]
+        self.batches[batch_id] = (batch, results)
+        return batch
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve_stub(host='127.0.0.1', port=8765, fail_rate=0.0):
+    _StubHandler.fail_rate = fail_rate
+    server = ThreadingHTTPServer((host, port), _StubHandler)
+    print(f"Stub LLM server on http://{host}:{port} (fail rate {fail_rate:.0%})")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM service utilities.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    stub = sub.add_parser('stub', help='Run a local Messages API (and Message Batches API) stub server')
+    stub.add_argument('--host', default='127.0.0.1')
+    stub.add_argument('--port', type=int, default=8765)
+    stub.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with 529')
+    clear = sub.add_parser('clear-cache', help='Delete every cached response')
+    clear.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'stub':
+        serve_stub(args.host, args.port, args.fail_rate)
+    else:
+        removed = 0
+        for name in os.listdir(args.cache_dir) if os.path.isdir(args.cache_dir) else []:
+            os.remove(os.path.join(args.cache_dir, name))
+            removed += 1
+        print(f"Removed {removed} cached responses from {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+import os
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+from tejas_feature_store import STORE_ROOT, load_table, list_partitions
+from tejas_feature_eda import parse_price
+from tejas_incremental import STYLES_PATH, build_modeling_table
+
+# Nearest-neighbour lookalike index for cold-start frames.
+#
+# Lookalike_ID (Brand_Color_Material) only links a new frame to history on an exact
+# string match. Instead, every historical GridValue is encoded as a vector:
+# - one-hot Shape / FrameType / Material / Color_Base / Color_Finish / Brand_Tier,
+#   scaled so that each mismatching attribute adds 1 to the squared distance
+# - z-scored (clipped) lens size and log wholesale price. The demand history has no
+#   prices, so a historical frame gets its brand's median price in the product catalogs.
+# A batch of frames is queried with one matrix product per chunk (brute force: the
+# history is a few thousand frames). Each frame also stores its launch curve per
+# Region: demand in its first LAUNCH_MONTHS months from its first sale.
+#
+# A row's neighbours are frames of a different StyleCode (a release never has its own
+# style in the history) whose whole launch curve ends by the row's month: the row's target
+# window starts the month after, so no neighbour demand falls inside it. Frames already
+# selling in the first month of the data are left-censored (their launch is not
+# observed) and never used. A frame is queried once per month it has rows in; the
+# ANALOG_FEATURES summarise the neighbours' curves in the row's Region.
+#
+# The index is saved under feature_store/_lookalike/ and rebuilt when an 'enriched'
+# partition, styles.csv or a price catalog changes.
+#
+#   python tejas_lookalike.py build
+#   python tejas_lookalike.py query final_products.csv --k 10
+
+INDEX_DIR = os.path.join(STORE_ROOT, '_lookalike')
+PRICE_CATALOGS = ('products.csv', 'final_products.csv')
+PRICE_COL = 'USWHOLESALEPRICE'
+
+ATTRIBUTE_COLS = ['Shape', 'FrameType', 'Material', 'Color_Base', 'Color_Finish', 'Brand_Tier']
+LAUNCH_MONTHS = 4
+DEFAULT_K = 10
+QUERY_CHUNK = 4096
+INDEX_FORMAT = 2     # bumped when the saved arrays change meaning (2: left-censored frames not complete)
+NUMERIC_CLIP = 3.0   # z-score bound for size / price, so an outlier size cannot outweigh every attribute
+
+ANALOG_FEATURES = (
+    ['Analog_Distance', 'Analog_Launch_Mean', 'Analog_Launch_P25', 'Analog_Launch_P75']
+    + [f'Analog_Curve_Share_m{m}' for m in range(1, LAUNCH_MONTHS)]
+)
+
+
+def _clean(values):
+    """Categorical attribute values compared case-insensitively ('Cat-Eye' == 'Cat-eye')."""
+    return pd.Series(values).astype(str).str.strip().str.lower().to_numpy()
+
+
+def _size(values):
+    return pd.to_numeric(pd.Series(values).astype(str).str.strip(), errors='coerce').to_numpy(dtype=float)
+
+
+def _month_ordinal(dates):
+    return pd.PeriodIndex(pd.to_datetime(pd.Series(dates)), freq='M').asi8
+
+
+def brand_prices(catalogs=PRICE_CATALOGS):
+    """Median US wholesale price per brand over the product catalogs that exist."""
+    frames = [pd.read_csv(p, usecols=['_BRAND', PRICE_COL], low_memory=False) for p in catalogs if os.path.exists(p)]
+    if not frames:
+        return {}
+    df = pd.concat(frames, ignore_index=True)
+    return parse_price(df[PRICE_COL]).groupby(df['_BRAND'].astype(str)).median().dropna().to_dict()
+
+
+def source_mtimes(root=STORE_ROOT, styles_path=STYLES_PATH, catalogs=PRICE_CATALOGS):
+    """Modification times of everything the index is built from."""
+    files = [path for _, _, path in list_partitions('enriched', root)] + [styles_path] + list(catalogs)
+    return {f: os.path.getmtime(f) for f in files if os.path.exists(f)}
+
+
+def _nan_percentile(values, q):
+    """Row-wise linear-interpolated percentile ignoring NaN (np.nanpercentile loops over rows)."""
+    ordered = np.sort(values, axis=1)  # NaN sorts last
+    n = (~np.isnan(ordered)).sum(axis=1)
+    pos = np.maximum(n - 1, 0) * q / 100.0
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    rows = np.arange(len(ordered))
+    out = ordered[rows, lo] + (ordered[rows, hi] - ordered[rows, lo]) * (pos - lo)
+    return np.where(n > 0, out, np.nan)
+
+
+def _index_panel(root=STORE_ROOT):
+    """Every observed month of the 'enriched' table with the style attributes."""
+    return build_modeling_table(load_table('enriched', root), dropna=False)
+
+
+_LOADED = {}  # (index_dir, root) -> (source mtimes, LookalikeIndex), reused within a process
+
+
+class LookalikeIndex:
+    """Attribute vectors and Region launch curves of every historical frame, with batched k-NN queries."""
+
+    def __init__(self, spec, vectors, curves, launch, complete, style_codes, grid_values):
+        self.spec = spec
+        self.vectors = vectors.astype(np.float32)
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.curves = curves              # (frames, regions, LAUNCH_MONTHS), NaN where a Region has no rows
+        self.launch = launch              # month ordinal of each frame's first sale
+        self.complete = complete          # launch observed and all LAUNCH_MONTHS of the curve observed
+        self.style_codes = np.asarray(style_codes, dtype=object)
+        self.grid_values = np.asarray(grid_values, dtype=np.int64)
+        self._region_pos = pd.Index(spec['regions'])
+
+    # ---- building ----------------------------------------------------------------
+
+    @classmethod
+    def build(cls, panel, prices=None):
+        """Index from a demand panel (one row per GridValue x Region x month, with the attribute columns)."""
+        prices = brand_prices() if prices is None else prices
+        panel = panel[panel['Demand'].notna()]
+        frames = panel.sort_values('Date').groupby('GridValue', sort=True, observed=True).first()
+
+        spec = {
+            'categories': {c: sorted(set(_clean(frames[c].dropna()))) for c in ATTRIBUTE_COLS},
+            'brand_prices': prices,
+            'regions': sorted(panel['Region'].astype(str).unique()),
+        }
+        sizes = _size(frames['Size'])
+        log_price = np.log(cls._frame_prices(frames, prices))
+        spec['numeric'] = {
+            'size': [float(np.nanmedian(sizes)), float(np.nanstd(sizes) or 1.0)],
+            'price': [float(np.nanmedian(log_price)), float(np.nanstd(log_price) or 1.0)],
+        }
+        vectors = cls._encode(spec, frames)
+
+        # Demand cube (frames x regions x months) and each frame's launch-aligned window
+        month = _month_ordinal(panel['Date'])
+        first_month, n_months = int(month.min()), int(month.max() - month.min()) + 1
+        f_idx = frames.index.get_indexer(panel['GridValue'])
+        r_idx = pd.Index(spec['regions']).get_indexer(panel['Region'].astype(str))
+        cube = np.full((len(frames), len(spec['regions']), n_months), np.nan)
+        cube[f_idx, r_idx, month - first_month] = panel['Demand'].to_numpy(dtype=float)
+
+        # Launch: first month with a sale (first observed month for frames that never sold).
+        # A launch in the first month of the panel is left-censored: the frame may have sold before.
+        sold = np.where(np.nan_to_num(cube) > 0, np.arange(n_months), n_months).min(axis=(1, 2))
+        seen = np.where(~np.isnan(cube), np.arange(n_months), n_months).min(axis=(1, 2))
+        launch = np.where(sold < n_months, sold, seen)
+        window = launch[:, None] + np.arange(LAUNCH_MONTHS)
+        complete = (window[:, -1] < n_months) & (launch > 0)
+        curves = np.take_along_axis(cube, np.minimum(window, n_months - 1)[:, None, :], axis=2)
+        curves[~complete] = np.nan
+
+        return cls(spec, vectors, curves, launch + first_month, complete,
+                   frames['StyleCode'].astype(str).to_numpy(), frames.index.to_numpy())
+
+    @staticmethod
+    def _frame_prices(df, prices):
+        """Catalog price where the rows carry one, else the brand's median price."""
+        fallback = float(np.median(list(prices.values()))) if prices else 1.0
+        brand = df['BrandName'].astype(str).map(prices).to_numpy(dtype=float) if 'BrandName' in df.columns \
+            else np.full(len(df), np.nan)
+        if PRICE_COL in df.columns:
+            own = parse_price(df[PRICE_COL]).to_numpy(dtype=float)
+            brand = np.where(np.isnan(own), brand, own)
+        return np.where(np.isnan(brand) | (brand <= 0), fallback, brand)
+
+    @classmethod
+    def _encode(cls, spec, df):
+        """(rows, dims) float32 vectors; unseen categories encode as all-zero (equally far from every value)."""
+        blocks = []
+        for col in ATTRIBUTE_COLS:
+            cats = spec['categories'][col]
+            codes = pd.Index(cats).get_indexer(_clean(df[col])) if col in df.columns else np.full(len(df), -1)
+            block = np.zeros((len(df), len(cats)), dtype=np.float32)
+            hit = codes >= 0
+            block[np.flatnonzero(hit), codes[hit]] = np.sqrt(0.5)
+            blocks.append(block)
+        for name, values in (('size', _size(df['Size']) if 'Size' in df.columns else np.full(len(df), np.nan)),
+                             ('price', np.log(cls._frame_prices(df, spec['brand_prices'])))):
+            center, scale = spec['numeric'][name]
+            z = np.clip(np.nan_to_num((values - center) / scale), -NUMERIC_CLIP, NUMERIC_CLIP)
+            blocks.append(z[:, None].astype(np.float32))
+        return np.hstack(blocks)
+
+    def encode(self, df):
+        return self._encode(self.spec, df)
+
+    # ---- persistence -------------------------------------------------------------
+
+    def save(self, index_dir=INDEX_DIR, mtimes=None):
+        os.makedirs(index_dir, exist_ok=True)
+        np.savez(os.path.join(index_dir, 'index.npz'), vectors=self.vectors, curves=self.curves,
+                 launch=self.launch, complete=self.complete, grid_values=self.grid_values)
+        with open(os.path.join(index_dir, 'index.json'), 'w') as f:
+            json.dump({'spec': self.spec, 'style_codes': list(self.style_codes), 'mtimes': mtimes or {},
+                       'format': INDEX_FORMAT}, f)
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR, root=STORE_ROOT, use_cache=True):
+        """
+        Load the saved index if none of its sources (nor INDEX_FORMAT) changed, otherwise rebuild and save it.
+        Within a process the loaded index is kept and reused while the sources are unchanged.
+        """
+        mtimes = source_mtimes(root)
+        key = (index_dir, root)
+        if use_cache and key in _LOADED and _LOADED[key][0] == mtimes:
+            return _LOADED[key][1]
+
+        meta_path = os.path.join(index_dir, 'index.json')
+        if use_cache and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['mtimes'] == mtimes and meta.get('format') == INDEX_FORMAT:
+                arrays = np.load(os.path.join(index_dir, 'index.npz'))
+                index = cls(meta['spec'], arrays['vectors'], arrays['curves'], arrays['launch'], arrays['complete'],
+                            meta['style_codes'], arrays['grid_values'])
+                _LOADED[key] = (mtimes, index)
+                return index
+
+        index = cls.build(_index_panel(root))
+        if use_cache:
+            index.save(index_dir, mtimes)
+            _LOADED[key] = (mtimes, index)
+        return index
+
+    # ---- queries -----------------------------------------------------------------
+
+    @classmethod
+    def up_to(cls, last_month, root=STORE_ROOT):
+        """Index from the months up to `last_month` only (not cached), e.g. the training months of a holdout."""
+        panel = _index_panel(root)
+        return cls.build(panel[panel['Date'].dt.to_period('M') <= pd.Period(last_month, freq='M')])
+
+    def query(self, vectors, k=DEFAULT_K, months=None, style_codes=None):
+        """
+        (indexes, distances) of the k nearest eligible frames per query vector, both
+        (queries, k); index -1 / distance inf where fewer than k frames are eligible.
+        With `months` (month ordinals), a frame is eligible only if its launch curve
+        ends no later than the query's month.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, k = len(vectors), min(k, len(self.vectors))
+        idx = np.full((n, k), -1, dtype=np.int64)
+        dist = np.full((n, k), np.inf)
+        for start in range(0, n, QUERY_CHUNK):
+            stop = min(start + QUERY_CHUNK, n)
+            q = vectors[start:stop]
+            d2 = np.einsum('ij,ij->i', q, q)[:, None] + self.norms[None, :] - 2 * (q @ self.vectors.T)
+            eligible = np.broadcast_to(self.complete, d2.shape).copy()
+            if months is not None:
+                eligible &= self.launch[None, :] + LAUNCH_MONTHS - 1 <= np.asarray(months[start:stop])[:, None]
+            if style_codes is not None:
+                eligible &= self.style_codes[None, :] != np.asarray(style_codes[start:stop], dtype=object)[:, None]
+            d2 = np.where(eligible, np.maximum(d2, 0), np.inf)
+
+            top = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            top_d = np.take_along_axis(d2, top, axis=1)
+            order = np.argsort(top_d, axis=1)
+            top, top_d = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_d, order, axis=1)
+            idx[start:stop] = np.where(np.isfinite(top_d), top, -1)
+            dist[start:stop] = np.sqrt(top_d)
+        return idx, dist
+
+    def curve_features(self, idx, dist, regions):
+        """ANALOG_FEATURES for rows with neighbours `idx` / `dist` (rows, k) in `regions` (rows,)."""
+        r = self._region_pos.get_indexer(pd.Series(regions).astype(str))
+        curves = self.curves[np.maximum(idx, 0), np.maximum(r, 0)[:, None], :]
+        curves[(idx < 0) | (r < 0)[:, None]] = np.nan
+        totals = curves.sum(axis=2)
+
+        # All-NaN rows (no neighbour sold in the Region) are expected and give NaN features
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            out = {
+                'Analog_Distance': np.nanmean(np.where(np.isfinite(dist), dist, np.nan), axis=1),
+                'Analog_Launch_Mean': np.nanmean(totals, axis=1),
+                'Analog_Launch_P25': _nan_percentile(totals, 25),
+                'Analog_Launch_P75': _nan_percentile(totals, 75),
+            }
+            shares = curves / np.where(totals > 0, totals, np.nan)[:, :, None]
+            for m in range(1, LAUNCH_MONTHS):
+                out[f'Analog_Curve_Share_m{m}'] = np.nanmean(shares[:, :, m - 1], axis=1)
+        return out
+
+
+def add_analog_features(df, index=None, k=DEFAULT_K, frame_cols=('GridValue',), date_col='Date'):
+    """
+    Copy of `df` with the ANALOG_FEATURES columns added (row order kept). Frames are
+    identified by `frame_cols` (GridValue for the demand panel, release_frame_cols for a
+    new release) and queried once per month: a row only sees frames whose launch curve
+    ended by its month.
+    """
+    index = LookalikeIndex.load() if index is None else index
+    frame_cols = [c for c in frame_cols if c in df.columns]
+    frame = df.groupby(frame_cols, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    month = _month_ordinal(df[date_col])
+    _, first, group = np.unique(frame * (int(month.max() - month.min()) + 1) + (month - month.min()),
+                                return_index=True, return_inverse=True)
+    group = group.ravel()
+    frames = df.iloc[first]
+
+    style_col = 'StyleCode' if 'StyleCode' in frames.columns else 'Style'
+    idx, dist = index.query(index.encode(frames), k, month[first], frames[style_col].astype(str).to_numpy())
+
+    # One feature row per frame x Region, broadcast back to the frame's rows
+    region = df['Region'].astype(str).to_numpy()
+    region_code = pd.Index(index.spec['regions']).get_indexer(region) + 1
+    _, pair_first, pair_pos = np.unique(group * (len(index.spec['regions']) + 1) + region_code,
+                                        return_index=True, return_inverse=True)
+    pair_group = group[pair_first]
+    features = index.curve_features(idx[pair_group], dist[pair_group], region[pair_first])
+
+    df = df.copy()
+    for col, values in features.items():
+        df[col] = values[pair_pos.ravel()]
+    return df
+
+
+def check_release_month(index, df, k=DEFAULT_K, frame_cols=('GridValue',)):
+    """
+    Check the neighbour month rule on release rows `df` (feature-ready, dated in their
+    launch month); raises AssertionError on failure:
+    - every neighbour's launch curve ends by the row's month, and every row gets analogs
+    - a frame whose curve ends exactly in the query month is eligible, one month earlier it is not
+    """
+    out = add_analog_features(df, index, k, frame_cols)
+    assert out['Analog_Launch_Mean'].notna().all(), \
+        f"{int(out['Analog_Launch_Mean'].isna().sum())} of {len(out)} release rows have no analog curves"
+
+    frames = df.drop_duplicates(subset=[c for c in frame_cols if c in df.columns])
+    months = _month_ordinal(frames['Date'])
+    idx, _ = index.query(index.encode(frames), k, months)
+    curve_end = np.where(idx >= 0, index.launch[np.maximum(idx, 0)] + LAUNCH_MONTHS - 1, -np.inf)
+    assert (curve_end <= months[:, None]).all(), "a neighbour's launch curve ends after the row's month"
+
+    # Boundary: each complete frame queried with its own vector, under another style
+    pos = np.flatnonzero(index.complete)
+    end = index.launch[pos] + LAUNCH_MONTHS - 1
+    other_style = np.full(len(pos), '', dtype=object)
+    for months, expected in ((end, True), (end - 1, False)):
+        idx, _ = index.query(index.vectors[pos], len(index.vectors), months, other_style)
+        found = (idx == pos[:, None]).any(axis=1)
+        assert (found == expected).all(), f"frames with a curve ending {'in' if expected else 'after'} " \
+                                          f"the query month: {int((found != expected).sum())} misclassified"
+    print(f"Lookalike check passed: {len(out)} release rows with analogs, {len(pos)} curve-end boundaries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the lookalike (analog frame) index.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('build', help='Rebuild the index from the feature store')
+    query = sub.add_parser('query', help='Analog features for a product file')
+    query.add_argument('input', help='Product CSV (final_products.csv format)')
+    query.add_argument('--k', type=int, default=DEFAULT_K)
+    query.add_argument('--regions', nargs='+', default=['AMER', 'EMEA'])
+    query.add_argument('--output', default='lookalike_analogs.csv')
+    check = sub.add_parser('check', help='Check the neighbour month rule on a release file (rows in their launch month)')
+    check.add_argument('input', nargs='?', default='final_products.csv')
+    check.add_argument('--regions', nargs='+', default=['AMER', 'EMEA'])
+    args = parser.parse_args()
+
+    start_t = time.time()
+    index = LookalikeIndex.load(use_cache=args.command != 'build')
+    print(f"Lookalike index: {len(index.vectors)} frames ({int(index.complete.sum())} with a complete "
+          f"{LAUNCH_MONTHS}-month launch curve), {index.vectors.shape[1]} dims, {time.time() - start_t:.2f} seconds")
+    if args.command == 'build':
+        return
+
+    # Imported here: tejas_score itself attaches analog features through this module
+    from tejas_score import products_to_features
+    from tejas_cannibalization import release_frame_cols
+    df = products_to_features(pd.read_csv(args.input, low_memory=False), args.regions)
+    if args.command == 'check':
+        check_release_month(index, df, frame_cols=release_frame_cols(df))
+        return
+    query_t = time.time()
+    df = add_analog_features(df, index, args.k, frame_cols=release_frame_cols(df))
+    elapsed = time.time() - query_t
+    print(f"Analog features for {len(df)} rows in {elapsed * 1000:.1f} ms "
+          f"({elapsed * 1000 / max(len(df), 1):.3f} ms per row)")
+    df[['Style', 'COLORDESCRIPTION', 'Region'] + ANALOG_FEATURES].to_csv(args.output, index=False)
+    print(f"Saved analog features to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+import pandas as pd
+from catboost import CatBoostRegressor
+
+# File-based registry for trained CatBoost models.
+#
+# Layout:
+#   model_registry/<name>/<version>/model.cbm   (CatBoost native binary format)
+#   model_registry/<name>/<version>/meta.json   (features, cat columns, data fingerprint, params, metrics)
+#   model_registry/<name>/LATEST                (version string of the most recent registration)
+
+REGISTRY_ROOT = 'model_registry'
+
+
+def data_fingerprint(df):
+    """Stable content hash of a training frame (column names, dtypes and values)."""
+    h = hashlib.sha256()
+    h.update(json.dumps([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _json_safe(params):
+    """CatBoost params can hold numpy scalars; make them JSON serialisable."""
+    return json.loads(json.dumps(params, default=lambda v: v.item() if hasattr(v, 'item') else str(v)))
+
+
+def register_model(model, name, features, categorical_cols, train_df, metrics=None, root=REGISTRY_ROOT,
+                   parent=None, extra=None):
+    """
+    Save a fitted model plus everything needed to score with it. Returns the new version.
+    `parent` is the version an incrementally refreshed model continued training from;
+    `extra` is merged into meta.json (e.g. the horizons of a multi-horizon model).
+    """
+    fingerprint = data_fingerprint(train_df)
+    created = datetime.now(timezone.utc)
+    version = created.strftime('%Y%m%dT%H%M%S') + '-' + fingerprint[:8]
+
+    model_dir = os.path.join(root, name, version)
+    os.makedirs(model_dir, exist_ok=True)
+    model.save_model(os.path.join(model_dir, 'model.cbm'))
+
+    meta = {
+        'name': name,
+        'version': version,
+        'created': created.isoformat(),
+        'features': list(features),
+        'categorical_cols': list(categorical_cols),
+        'data_fingerprint': fingerprint,
+        'n_rows': int(len(train_df)),
+        'params': _json_safe(model.get_params()),
+        'metrics': _json_safe(metrics or {}),
+        'parent_version': parent,
+        **_json_safe(extra or {}),
+    }
+    with open(os.path.join(model_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    with open(os.path.join(root, name, 'LATEST'), 'w') as f:
+        f.write(version)
+
+    print(f"Registered model '{name}' version {version}")
+    return version
+
+
+def list_versions(name, root=REGISTRY_ROOT):
+    """All registered versions of a model, oldest first."""
+    model_root = os.path.join(root, name)
+    if not os.path.isdir(model_root):
+        return []
+    return sorted(v for v in os.listdir(model_root) if os.path.isfile(os.path.join(model_root, v, 'meta.json')))
+
+
+def load_meta(name, version=None, root=REGISTRY_ROOT):
+    """Metadata of a registered version (the LATEST one by default)."""
+    if version in (None, 'latest'):
+        latest_path = os.path.join(root, name, 'LATEST')
+        if not os.path.exists(latest_path):
+            raise FileNotFoundError(f"No registered versions of model '{name}' under {root}")
+        with open(latest_path) as f:
+            version = f.read().strip()
+    with open(os.path.join(root, name, version, 'meta.json')) as f:
+        return json.load(f)
+
+
+def load_model(name, version=None, root=REGISTRY_ROOT):
+    """Load a registered model. Returns (model, meta)."""
+    meta = load_meta(name, version, root)
+    model = CatBoostRegressor()
+    model.load_model(os.path.join(root, name, meta['version'], 'model.cbm'))
+    return model, meta
+
+
+def find_model(name, train_df, params=None, root=REGISTRY_ROOT):
+    """
+    Return (model, meta) of the newest version trained on identical data (and params,
+    if given), or None. Lets training scripts skip a retrain when nothing changed.
+    """
+    fingerprint = data_fingerprint(train_df)
+    wanted = _json_safe(params) if params is not None else None
+    for version in reversed(list_versions(name, root)):
+        meta = load_meta(name, version, root)
+        if meta['data_fingerprint'] != fingerprint:
+            continue
+        if wanted is not None and any(meta['params'].get(k) != v for k, v in wanted.items()):
+            continue
+        return load_model(name, version, root)
+    return None
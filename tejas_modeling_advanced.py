@@ -1,12 +1,26 @@
 import pandas as pd
 import numpy as np
-from catboost import CatBoostRegressor, Pool
+from catboost import CatBoostRegressor
 from sklearn.metrics import mean_absolute_error, root_mean_squared_error
 import warnings
 warnings.filterwarnings('ignore')
 
-def create_advanced_features(df):
-    """Augment the dataset with Lags, Momentum Deltas, and Sibling Density."""
+from tejas_panel import load_panel, categorical_features
+from tejas_backtest import holdout_split, holdout_last_train_month
+from tejas_model_registry import register_model, find_model
+from tejas_tuning import load_best_config
+from tejas_trend_index import TrendIndex
+from tejas_cannibalization import add_cannibalization_features, load_sibling_history, CANNIBALIZATION_FEATURES
+from tejas_lookalike import add_analog_features, LookalikeIndex, ANALOG_FEATURES
+from tejas_trace import span, start_run
+from tejas_pools import model_matrix, build_pool, cached_train_pool
+
+def create_advanced_features(df, sibling_panel=None, analog_index=None):
+    """
+    Augment the dataset with Lags, Momentum Deltas, and Sibling Density. Siblings are
+    counted over `sibling_panel` (default: every observed month, load_sibling_history());
+    analog curves come from `analog_index` (default: the saved lookalike index).
+    """
     print("Creating advanced features...")
     df = df.copy()
     
@@ -16,104 +30,132 @@ def create_advanced_features(df):
     
     # 1. Sibling Frame Density (Cannibalization)
     # How many frames of the exact same Lookalike_ID launched in this exact month?
-    print(" -> Engineering Sibling_Frame_Density...")
-    density = df.groupby(['Date', 'Lookalike_ID']).size().reset_index(name='Sibling_Frame_Density')
-    df = df.merge(density, on=['Date', 'Lookalike_ID'], how='left')
+    # Plus sibling counts at coarser granularities, trailing launch density and
+    # share-of-sibling-demand lags, all from groupby-transforms (see tejas_cannibalization.py),
+    # over every observed month rather than only the rows that have a forward target
+    print(" -> Engineering Sibling_Frame_Density & cannibalization features...")
+    with span('features.cannibalization', rows=len(df)):
+        sibling_panel = load_sibling_history() if sibling_panel is None else sibling_panel
+        df = add_cannibalization_features(df, panel=sibling_panel)
     
     # 2. Time-Series Google Trend Lags & Momentum
     # Identify trend columns
     trend_cols = [c for c in df.columns if c.startswith('Trend_') or c in ['Glasses', 'Sunglasses']]
     
     print(" -> Engineering Rolling Averages & Lags...")
-    # Because there are multiple identical dates (many frames sold in one month),
-    # we first create a unique date-trend dataframe to calculate lags cleanly.
-    unique_dates = df[['Date'] + trend_cols].drop_duplicates().sort_values('Date').reset_index(drop=True)
-    
-    for col in trend_cols:
-        # Lag by 3 months and 6 months
-        unique_dates[f'{col}_lag3'] = unique_dates[col].shift(3)
-        unique_dates[f'{col}_lag6'] = unique_dates[col].shift(6)
-        
-        # Momentum Deltas: (Current / Past) - 1. Safe divide to avoid Inf/NaN.
-        # Tells us if the trend is accelerating or decelerating leading up to launch.
-        unique_dates[f'{col}_momentum_3m'] = np.where(unique_dates[f'{col}_lag3'] == 0, 0, 
-                                            (unique_dates[col] - unique_dates[f'{col}_lag3']) / (unique_dates[f'{col}_lag3'] + 1e-9))
-        
-        unique_dates[f'{col}_momentum_6m'] = np.where(unique_dates[f'{col}_lag6'] == 0, 0, 
-                                            (unique_dates[col] - unique_dates[f'{col}_lag6']) / (unique_dates[f'{col}_lag6'] + 1e-9))
-        
-        # Fill absolute NAs created by shifting with 0
-        unique_dates.fillna(0, inplace=True)
-        
-    # Merge engineered trend features back into the main forecasting dataframe
-    new_trend_feats = [c for c in unique_dates.columns if c != 'Date' and c not in trend_cols]
-    df = df.merge(unique_dates[['Date'] + new_trend_feats], on='Date', how='left')
+    # Lags (T-3, T-6) and Momentum Deltas are computed once per month in the shared
+    # trend index (see tejas_trend_index.py) and looked up by Date, instead of being
+    # rebuilt from a de-duplicated date table and merged back onto every row.
+    with span('features.trend_lags', rows=len(df)):
+        trends = TrendIndex.load()
+        new_trend_feats = [f'{col}_{suffix}' for col in trend_cols
+                           for suffix in ('lag3', 'lag6', 'momentum_3m', 'momentum_6m')]
+        df = trends.attach(df, new_trend_feats)
+
+    # 3. Analog demand curves: launch curves of the nearest historical frames by attributes
+    # (see tejas_lookalike.py), the same features a cold-start release gets at scoring time
+    print(" -> Engineering analog (lookalike) demand-curve features...")
+    with span('features.analogs', rows=len(df)):
+        df = add_analog_features(df, analog_index)
     
     return df
 
+TARGET_COL = '4m_demand'
+CATEGORICAL_COLS = ['Style', 'Region', 'Color_Base', 'Color_Finish', 'Brand_Tier', 'Shape', 'FrameType', 'Material', 'Lookalike_ID']
+
+def prepare_features(df):
+    """Select the advanced feature set (run after create_advanced_features) and clean categoricals."""
+    # Remove any potential duplicate column names created by merging
+    df = df.loc[:, ~df.columns.duplicated()].copy()
+    
+    # ALL numeric features: original trends + new lags + new momentous + is_ booleans + cannibalization
+    numeric_cols = [col for col in df.columns if col.startswith('Trend_') or col.startswith('is_') or col in ['Glasses', 'Sunglasses']]
+    momentum_cols = [col for col in df.columns if '_lag' in col or '_momentum' in col
+                     or col in CANNIBALIZATION_FEATURES or col in ANALOG_FEATURES]
+    
+    # Ensure features list is entirely unique (sorted so column order is reproducible across runs)
+    features = sorted(set(CATEGORICAL_COLS + numeric_cols + momentum_cols))
+    
+    # Categoricals from the compact panel are used as-is (no per-model string copies)
+    df = categorical_features(df, CATEGORICAL_COLS)
+    return df, features
+
+def build_model(**overrides):
+    """Advanced CatBoost configuration, tuned params from tejas_tuning.py if present; keyword overrides (e.g. thread_count) win."""
+    params = dict(
+        iterations=600,
+        learning_rate=0.08,
+        depth=6,
+        loss_function='RMSE',
+        eval_metric='MAE',
+        random_seed=42,
+        logging_level='Silent'
+    )
+    params.update(load_best_config('advanced'))
+    params.update(overrides)
+    return CatBoostRegressor(**params)
+
 def main():
+    start_run('advanced')
     print("Loading final_demand.csv...")
-    df = pd.read_csv('final_demand.csv', low_memory=False)
-    
+    with span('load') as s:
+        df = load_panel('final_demand')
+        s.rows = len(df)
+    
+    # Analog curves from the training months only, so the holdout never sees its own months' demand
+    last_train_month = holdout_last_train_month(pd.to_datetime(df['Date']).dt.to_period('M').value_counts())
+    with span('lookalike_index'):
+        analog_index = LookalikeIndex.up_to(last_train_month)
+
     # Augment Dataset
-    df = create_advanced_features(df)
+    with span('create_advanced_features', rows=len(df)):
+        df = create_advanced_features(df, analog_index=analog_index)
     
     # Re-sort for Walk-Forward
     df = df.sort_values(by='Date').reset_index(drop=True)
     
-    target_col = '4m_demand'
-    categorical_cols = ['Style', 'Region', 'Color_Base', 'Color_Finish', 'Brand_Tier', 'Shape', 'FrameType', 'Material', 'Lookalike_ID']
-    
-    # Remove any potential duplicate column names created by merging
-    df = df.loc[:, ~df.columns.duplicated()]
-    
-    # ALL numeric features: original trends + new lags + new momentous + is_ booleans + density
-    numeric_cols = [col for col in df.columns if col.startswith('Trend_') or col.startswith('is_') or col in ['Glasses', 'Sunglasses']]
-    momentum_cols = [col for col in df.columns if '_lag' in col or '_momentum' in col or col == 'Sibling_Frame_Density']
-    
-    # Ensure features list is entirely unique
-    features = list(set(categorical_cols + numeric_cols + momentum_cols))
-    
-    # Clean categoricals
-    for col in categorical_cols:
-        df[col] = df[col].astype(str).fillna('missing')
+    target_col = TARGET_COL
+    categorical_cols = CATEGORICAL_COLS
+    with span('prepare_features', rows=len(df)):
+        df, features = prepare_features(df)
         
-    # Walk-Forward Split (80/20)
+    # Walk-Forward Split (80/20, cut on a month boundary)
     print("\nSetting up Walk-Forward Split (chronological)...")
-    split_idx = int(len(df) * 0.8)
-    train_df = df.iloc[:split_idx]
-    test_df = df.iloc[split_idx:]
+    train_df, test_df = holdout_split(df)
     
-    X_train = train_df[features]
+    # Pre-encoded matrices (categorical codes + float32), no per-run string copies
+    X_train = model_matrix(train_df, features, categorical_cols)
     y_train = train_df[target_col]
-    X_test = test_df[features]
+    X_test = model_matrix(test_df, features, categorical_cols)
     y_test = test_df[target_col]
     
     print(f"Training shapes -> X: {X_train.shape}, Y: {y_train.shape}")
     print(f"Testing shapes  -> X: {X_test.shape}, Y: {y_test.shape}")
 
-    train_pool = Pool(X_train, y_train, cat_features=categorical_cols)
-    test_pool = Pool(X_test, y_test, cat_features=categorical_cols)
+    with span('pool', rows=len(X_train)):
+        # Quantized against borders cached in .cache/pools/ while the training data is unchanged
+        train_pool = cached_train_pool(X_train, y_train, categorical_cols, build_model().get_params())
     
     print("\n============================================")
     print("Training Advanced Champion Model: CatBoost")
     print("============================================")
     
-    model = CatBoostRegressor(
-        iterations=600,
-        learning_rate=0.08,
-        depth=6,
-        loss_function='RMSE',
-        eval_metric='MAE',
-        random_seed=42,
-        logging_level='Silent',
-        od_type='Iter',
-        od_wait=50 # Early stopping to prevent overfitting
-    )
-    
-    model.fit(train_pool, eval_set=test_pool, use_best_model=True)
+    # Reuse the registered model if one was already trained on the same training rows and params
+    fit_data = train_df[features + [target_col]]
+    cached = find_model('advanced', fit_data, build_model().get_params())
+    if cached is not None:
+        model, meta = cached
+        print(f"Reusing registered advanced version {meta['version']} (training data unchanged)")
+    else:
+        model = build_model()
+        
+        # The test pool is not used as eval_set: it would leak into early stopping.
+        # The iteration count comes from the tuned config (tejas_tuning.py) instead.
+        with span('fit', rows=len(X_train)):
+            model.fit(train_pool)
     
-    y_pred = model.predict(X_test)
+    with span('predict', rows=len(X_test)):
+        y_pred = model.predict(X_test)
     y_pred = np.maximum(0, y_pred) # Floor at 0
     
     mae = mean_absolute_error(y_test, y_pred)
@@ -122,8 +164,14 @@ def main():
     print(f"\nAdvanced CatBoost Test MAE:  {mae:.4f}  (Previous Baseline: 113.09)")
     print(f"Advanced CatBoost Test RMSE: {rmse:.4f}")
     
+    if cached is None:
+        with span('write'):
+            register_model(model, 'advanced', features, categorical_cols, fit_data,
+                           metrics={'MAE': mae, 'RMSE': rmse})
+    
     print("\n--- Top 15 Advanced Feature Importances ---")
-    importances = model.get_feature_importance(train_pool)
+    # Raw pool: feature importances cannot be computed on a quantized pool
+    importances = model.get_feature_importance(build_pool(X_train, y_train, categorical_cols))
     feature_names = model.feature_names_
     importance_df = pd.DataFrame({'Feature': feature_names, 'Importance': importances}).sort_values(by='Importance', ascending=False)
     
@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import TimeSeriesSplit
@@ -6,6 +7,9 @@ from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, TargetEncoder
 from sklearn.linear_model import Ridge, PoissonRegressor
 from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+from tejas_feature_store import DEFAULT_CHUNK_ROWS, load_final_demand
+from tejas_backtest import holdout_split
+from tejas_trace import span, start_run
 
 def print_top_features(model, feature_names, top_n=10):
     """Utility to print top positive and negative coefficients from a linear model."""
@@ -23,30 +27,73 @@ def print_top_features(model, feature_names, top_n=10):
     for idx in sorted_idx[::-1][:top_n]:
         print(f"{feature_names[idx]}: {coefs[idx]:.4f}")
 
+TARGET_COL = '4m_demand'
+
+# Define feature types
+TARGET_ENCODE_COLS = ['Lookalike_ID', 'Style']
+ONE_HOT_COLS = ['Brand_Tier', 'Shape', 'FrameType', 'Color_Base', 'Color_Finish', 'Material']
+
+def get_numeric_cols(df):
+    """All numeric trend features (including boolean seasons which we treat as numeric 0/1)."""
+    return [col for col in df.columns if col.startswith('Trend_') or col.startswith('is_')]
+
+def build_preprocessor(numeric_cols):
+    """Scale numerics, target-encode high-cardinality IDs and one-hot the rest."""
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), numeric_cols),
+            ('te', TargetEncoder(target_type='continuous'), TARGET_ENCODE_COLS),
+            ('ohe', OneHotEncoder(handle_unknown='ignore', sparse_output=False), ONE_HOT_COLS)
+        ]
+    )
+
+def build_ridge(numeric_cols):
+    return Pipeline(steps=[
+        ('preprocessor', build_preprocessor(numeric_cols)),
+        ('model', Ridge(alpha=1.0))
+    ])
+
+def build_poisson(numeric_cols):
+    return Pipeline(steps=[
+        ('preprocessor', build_preprocessor(numeric_cols)),
+        # Using a very slight regularization term
+        ('model', PoissonRegressor(alpha=1e-4, max_iter=1000)) 
+    ])
+
 def main():
+    parser = argparse.ArgumentParser(description='Linear baselines (Ridge / Poisson) on final_demand.')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Out-of-core SGD baseline over chunked feature-store reads (tejas_streaming_baseline.py)')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows per chunk in --streaming mode')
+    args = parser.parse_args()
+
+    if args.streaming:
+        # Imported here: the streaming module builds on this one's feature lists
+        from tejas_streaming_baseline import run_streaming
+        start_run('baseline_streaming')
+        run_streaming(chunk_rows=args.chunk_rows)
+        return
+
+    start_run('baseline')
     print("Loading final_demand.csv...")
-    df = pd.read_csv('final_demand.csv')
+    with span('load') as s:
+        df = load_final_demand()
+        s.rows = len(df)
     
     # Ensure Date is datetime and sort chronologically for Walk-Forward Validation
     df['Date'] = pd.to_datetime(df['Date'])
     df = df.sort_values(by='Date').reset_index(drop=True)
     
-    target_col = '4m_demand'
-    
-    # Define feature types
-    target_encode_cols = ['Lookalike_ID', 'Style']
-    one_hot_cols = ['Brand_Tier', 'Shape', 'FrameType', 'Color_Base', 'Color_Finish', 'Material']
-    
-    # Extract all numeric trend features (including boolean seasons which we treat as numeric 0/1)
-    numeric_cols = [col for col in df.columns if col.startswith('Trend_') or col.startswith('is_')]
+    target_col = TARGET_COL
+    target_encode_cols = TARGET_ENCODE_COLS
+    one_hot_cols = ONE_HOT_COLS
+    numeric_cols = get_numeric_cols(df)
     
     # Dropping columns that are identifiers or raw targets
     # 'Unnamed: 0', 'Collection', 'BrandLine', 'StyleCode', 'GridValue', 'Region', 'Color', 'BrandName', 'Glasses', 'Sunglasses'
     
     print("\nSetting up Walk-Forward Split (chronological)...")
-    split_idx = int(len(df) * 0.8) # 80/20 chronological split
-    train_df = df.iloc[:split_idx]
-    test_df = df.iloc[split_idx:]
+    train_df, test_df = holdout_split(df) # 80/20 chronological split on a month boundary
     
     X_train = train_df[target_encode_cols + one_hot_cols + numeric_cols]
     y_train = train_df[target_col].clip(lower=0) # ensure no negatives, required for Poisson
@@ -57,26 +104,16 @@ def main():
     print(f"Training shapes -> X: {X_train.shape}, Y: {y_train.shape}")
     print(f"Testing shapes  -> X: {X_test.shape}, Y: {y_test.shape}")
     
-    # --- Preprocessing Pipeline ---
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', StandardScaler(), numeric_cols),
-            ('te', TargetEncoder(target_type='continuous'), target_encode_cols),
-            ('ohe', OneHotEncoder(handle_unknown='ignore', sparse_output=False), one_hot_cols)
-        ]
-    )
-    
     # --- Model 1: Ridge Regression ---
     print("\n===============================")
     print("Training Model 1: Ridge Regression")
     print("===============================")
-    ridge_pipeline = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('model', Ridge(alpha=1.0))
-    ])
+    ridge_pipeline = build_ridge(numeric_cols)
     
-    ridge_pipeline.fit(X_train, y_train)
-    y_pred_ridge = ridge_pipeline.predict(X_test)
+    with span('fit_ridge', rows=len(X_train)):
+        ridge_pipeline.fit(X_train, y_train)
+    with span('predict_ridge', rows=len(X_test)):
+        y_pred_ridge = ridge_pipeline.predict(X_test)
     
     mae_ridge = mean_absolute_error(y_test, y_pred_ridge)
     rmse_ridge = root_mean_squared_error(y_test, y_pred_ridge)
@@ -95,14 +132,12 @@ def main():
     print("\n===============================")
     print("Training Model 2: Poisson Regression")
     print("===============================")
-    poisson_pipeline = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        # Using a very slight regularization term
-        ('model', PoissonRegressor(alpha=1e-4, max_iter=1000)) 
-    ])
+    poisson_pipeline = build_poisson(numeric_cols)
     
-    poisson_pipeline.fit(X_train, y_train)
-    y_pred_poisson = poisson_pipeline.predict(X_test)
+    with span('fit_poisson', rows=len(X_train)):
+        poisson_pipeline.fit(X_train, y_train)
+    with span('predict_poisson', rows=len(X_test)):
+        y_pred_poisson = poisson_pipeline.predict(X_test)
     
     mae_poisson = mean_absolute_error(y_test, y_pred_poisson)
     rmse_poisson = root_mean_squared_error(y_test, y_pred_poisson)
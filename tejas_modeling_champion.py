@@ -1,67 +1,118 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from catboost import CatBoostRegressor, Pool
+from catboost import CatBoostRegressor
 from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+from tejas_panel import load_panel, categorical_features
+from tejas_backtest import holdout_split
+from tejas_model_registry import register_model, find_model
+from tejas_tuning import load_best_config
+from tejas_trace import span, start_run
+from tejas_pools import model_matrix, build_pool, cached_train_pool
+
+# Target
+TARGET_COL = '4m_demand'
+
+# Feature Selection for CatBoost (Handles categorical natively!)
+CATEGORICAL_COLS = ['Style', 'Region', 'Color_Base', 'Color_Finish', 'Brand_Tier', 'Shape', 'FrameType', 'Material', 'Lookalike_ID']
+
+def prepare_features(df):
+    """Clean the categorical columns on a copy and return (df, feature list)."""
+    df = df.copy()
+    numeric_cols = [col for col in df.columns if col.startswith('Trend_') or col.startswith('is_')]
+    features = CATEGORICAL_COLS + numeric_cols
+    
+    # Categoricals from the compact panel are used as-is (no per-model string copies)
+    df = categorical_features(df, CATEGORICAL_COLS)
+    return df, features
+
+def build_model(**overrides):
+    """Champion CatBoost configuration, tuned params from tejas_tuning.py if present; keyword overrides (e.g. thread_count) win."""
+    params = dict(
+        iterations=500,
+        learning_rate=0.08,
+        depth=6,
+        loss_function='RMSE',
+        eval_metric='MAE',
+        random_seed=42,
+        logging_level='Silent'
+    )
+    params.update(load_best_config('champion'))
+    params.update(overrides)
+    return CatBoostRegressor(**params)
+
+# Prediction interval: one MultiQuantile model gives P10 / P50 / P90 in a single fit
+QUANTILES = (0.1, 0.5, 0.9)
+
+def build_interval_model(**overrides):
+    """Champion tree settings with a MultiQuantile loss for prediction intervals."""
+    params = build_model().get_params()
+    params.update(
+        loss_function='MultiQuantile:alpha=' + ','.join(str(q) for q in QUANTILES),
+        eval_metric='MultiQuantile:alpha=' + ','.join(str(q) for q in QUANTILES),
+    )
+    params.update(overrides)
+    return CatBoostRegressor(**params)
+
+def predict_intervals(model, X):
+    """(n_rows, n_quantiles) array, floored at 0 and sorted so quantiles never cross."""
+    return np.sort(np.maximum(0, model.predict(X)), axis=1)
 
 def main():
+    start_run('champion')
     print("Loading final_demand.csv...")
     # Load and clean
-    df = pd.read_csv('final_demand.csv')
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values(by='Date').reset_index(drop=True)
-    
-    # Target
-    target_col = '4m_demand'
-    
-    # Feature Selection for CatBoost (Handles categorical natively!)
-    categorical_cols = ['Style', 'Region', 'Color_Base', 'Color_Finish', 'Brand_Tier', 'Shape', 'FrameType', 'Material', 'Lookalike_ID']
-    numeric_cols = [col for col in df.columns if col.startswith('Trend_') or col.startswith('is_')]
-    
-    features = categorical_cols + numeric_cols
-    
-    # Handle any NaNs in categorical columns (CatBoost prefers a string placeholder over NaN)
-    for col in categorical_cols:
-        df[col] = df[col].astype(str).fillna('missing')
-    
-    # Walk-Forward Split (80/20 chronological)
+    with span('load') as s:
+        df = load_panel('final_demand')
+        df['Date'] = pd.to_datetime(df['Date'])
+        df = df.sort_values(by='Date').reset_index(drop=True)
+        s.rows = len(df)
+    
+    target_col = TARGET_COL
+    categorical_cols = CATEGORICAL_COLS
+    with span('prepare_features', rows=len(df)):
+        df, features = prepare_features(df)
+    
+    # Walk-Forward Split (80/20 chronological, cut on a month boundary)
     print("\nSetting up Walk-Forward Split (chronological)...")
-    split_idx = int(len(df) * 0.8)
-    train_df = df.iloc[:split_idx]
-    test_df = df.iloc[split_idx:]
+    train_df, test_df = holdout_split(df)
     
-    X_train = train_df[features]
+    # Pre-encoded matrices (categorical codes + float32), no per-run string copies
+    X_train = model_matrix(train_df, features, categorical_cols)
     y_train = train_df[target_col]
     
-    X_test = test_df[features]
+    X_test = model_matrix(test_df, features, categorical_cols)
     y_test = test_df[target_col]
     
     print(f"Training shapes -> X: {X_train.shape}, Y: {y_train.shape}")
     print(f"Testing shapes  -> X: {X_test.shape}, Y: {y_test.shape}")
 
-    # Create CatBoost Pools
-    train_pool = Pool(X_train, y_train, cat_features=categorical_cols)
-    test_pool = Pool(X_test, y_test, cat_features=categorical_cols)
+    # Create CatBoost Pool
+    with span('pool', rows=len(X_train)):
+        # Quantized against borders cached in .cache/pools/ while the training data is unchanged
+        train_pool = cached_train_pool(X_train, y_train, categorical_cols, build_model().get_params())
     
     print("\n===============================")
     print("Training Champion Model: CatBoost")
     print("===============================")
     
-    # Initialize and train CatBoost Regressor
-    model = CatBoostRegressor(
-        iterations=500,
-        learning_rate=0.08,
-        depth=6,
-        loss_function='RMSE',
-        eval_metric='MAE',
-        random_seed=42,
-        logging_level='Silent'
-    )
-    
-    model.fit(train_pool, eval_set=test_pool, use_best_model=True)
+    # Reuse the registered model if one was already trained on the same training rows and params
+    fit_data = train_df[features + [target_col]]
+    cached = find_model('champion', fit_data, build_model().get_params())
+    if cached is not None:
+        model, meta = cached
+        print(f"Reusing registered champion version {meta['version']} (training data unchanged)")
+    else:
+        # Initialize and train CatBoost Regressor
+        model = build_model()
+        
+        # The test pool is not used as eval_set: it would leak into early stopping.
+        # The iteration count comes from the tuned config (tejas_tuning.py) instead.
+        with span('fit', rows=len(X_train)):
+            model.fit(train_pool)
     
     # Evaluation
-    y_pred = model.predict(X_test)
+    with span('predict', rows=len(X_test)):
+        y_pred = model.predict(X_test)
     y_pred = np.maximum(0, y_pred) # Floor predictions at 0 (can't sell negative frames)
     
     mae = mean_absolute_error(y_test, y_pred)
@@ -70,9 +121,33 @@ def main():
     print(f"CatBoost Test MAE:  {mae:.4f}")
     print(f"CatBoost Test RMSE: {rmse:.4f}")
     
+    if cached is None:
+        # Persist the model so new product drops can be scored without retraining (tejas_score.py)
+        register_model(model, 'champion', features, categorical_cols, fit_data,
+                       metrics={'MAE': mae, 'RMSE': rmse})
+    
+    # Prediction intervals (P10 / P50 / P90) used to route uncertain rows to the LLM adjuster
+    print("\n--- Prediction Intervals (MultiQuantile) ---")
+    cached_interval = find_model('champion_interval', fit_data, build_interval_model().get_params())
+    if cached_interval is not None:
+        interval_model, _ = cached_interval
+    else:
+        interval_model = build_interval_model()
+        with span('fit_interval', rows=len(X_train)):
+            interval_model.fit(train_pool)
+    with span('predict_interval', rows=len(X_test)):
+        test_q = predict_intervals(interval_model, X_test)
+    coverage = ((y_test >= test_q[:, 0]) & (y_test <= test_q[:, -1])).mean()
+    print(f"P{int(QUANTILES[0]*100)}-P{int(QUANTILES[-1]*100)} test coverage: {coverage:.1%} "
+          f"(nominal {QUANTILES[-1] - QUANTILES[0]:.0%}), mean width {np.mean(test_q[:, -1] - test_q[:, 0]):.1f}")
+    if cached_interval is None:
+        register_model(interval_model, 'champion_interval', features, categorical_cols, fit_data,
+                       metrics={'coverage': float(coverage)})
+
     # Feature Importances
     print("\n--- Global Feature Importances ---")
-    importances = model.get_feature_importance(train_pool)
+    # Raw pool: feature importances cannot be computed on a quantized pool
+    importances = model.get_feature_importance(build_pool(X_train, y_train, categorical_cols))
     feature_names = model.feature_names_
 
     importance_df = pd.DataFrame({'Feature': feature_names, 'Importance': importances})
@@ -84,13 +159,17 @@ def main():
     # Generate Final Output for Rubric A (Frame Style/Size/Color/Demand Mapping)
     # We will score the entire dataset (or just the test set) to show what should be ordered
     print("\nGenerating final order predictions for Report/Presentation...")
-    full_pool = Pool(df[features], cat_features=categorical_cols)
-    df['Predicted_4m_Order_Quantity'] = np.maximum(0, np.round(model.predict(full_pool)))
-    
-    # Select columns specifically requested by Rubric Question A
-    output_df = df[['Style', 'Size', 'Color_Base', 'Color_Finish', 'Region', 'Date', '4m_demand', 'Predicted_4m_Order_Quantity']]
+    with span('score_full', rows=len(df)):
+        full_pool = build_pool(model_matrix(df, features, categorical_cols), categorical_cols=categorical_cols)
+        df['Predicted_4m_Order_Quantity'] = np.maximum(0, np.round(model.predict(full_pool)))
+        interval_cols = [f'Predicted_P{int(q * 100)}' for q in QUANTILES]
+        df[interval_cols] = np.round(predict_intervals(interval_model, full_pool))
+    
+    # Select columns specifically requested by Rubric Question A (plus the prediction interval)
+    output_df = df[['Style', 'Size', 'Color_Base', 'Color_Finish', 'Region', 'Date', '4m_demand', 'Predicted_4m_Order_Quantity'] + interval_cols]
     output_filename = 'final_order_predictions.csv'
-    output_df.to_csv(output_filename, index=False)
+    with span('write', rows=len(output_df)):
+        output_df.to_csv(output_filename, index=False)
     
     print(f"Saved prediction template to {output_filename}")
     print("Execution Complete.")
@@ -0,0 +1,138 @@
+import time
+import argparse
+import numpy as np
+from catboost import CatBoostRegressor
+from sklearn.metrics import mean_absolute_error
+
+from tejas_feature_store import load_table
+from tejas_demand_targets import HORIZONS, target_col, horizon_increments, horizon_totals
+from tejas_incremental import build_modeling_table
+from tejas_backtest import holdout_split
+from tejas_model_registry import register_model, find_model, load_model
+from tejas_trace import span, start_run
+from tejas_pools import model_matrix, cached_train_pool
+import tejas_modeling_champion as champion
+
+# Multi-horizon forecasts (1 / 3 / 4 / 6-month forward demand) from one model.
+#
+# - Every horizon target is built in one pass over the Region/GridValue panel
+#   (add_forward_demand via build_modeling_table on the 'enriched' table), so no
+#   per-horizon final_demand rebuild is needed.
+# - The model is a single CatBoost MultiRMSE fit on the champion features. Its outputs
+#   are the demand of each window between consecutive horizons (months 1, 2-3, 4, 5-6),
+#   not the totals: predictions are floored at 0 and summed up, so the 6-month total
+#   can never fall below the 4-month one.
+# - MultiHorizonModel.predict(X) returns a (horizons x rows) matrix of totals.
+#
+#   python tejas_multi_horizon.py --horizons 1 3 4 6 --compare
+
+MODEL_NAME = 'multi_horizon'
+
+
+def build_model(**overrides):
+    """Champion tree settings with a MultiRMSE loss over the horizon windows."""
+    params = champion.build_model().get_params()
+    params.update(loss_function='MultiRMSE', eval_metric='MultiRMSE')
+    params.update(overrides)
+    return CatBoostRegressor(**params)
+
+
+class MultiHorizonModel:
+    """One multi-output CatBoost model; predict() returns forward-demand totals per horizon."""
+
+    def __init__(self, horizons=HORIZONS, model=None, **overrides):
+        self.horizons = tuple(sorted(horizons))
+        self.model = model if model is not None else build_model(**overrides)
+
+    def fit(self, pool):
+        """Fit on a Pool labelled with horizon_increments()."""
+        self.model.fit(pool)
+        return self
+
+    def predict(self, X):
+        """(horizons, rows) array of cumulative forward demand, non-decreasing along the horizons."""
+        raw = np.asarray(self.model.predict(X)).reshape(len(X), len(self.horizons))
+        return horizon_totals(raw).T
+
+    @classmethod
+    def load(cls, version='latest'):
+        """Registered model plus its meta (horizons are stored in meta.json)."""
+        model, meta = load_model(MODEL_NAME, version)
+        return cls(meta['horizons'], model), meta
+
+
+def load_horizon_panel(horizons=HORIZONS):
+    """The modeling table with every horizon target, rows with the longest window complete."""
+    enriched = load_table('enriched')
+    return build_modeling_table(enriched, horizons=list(horizons))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train one CatBoost model for several forward-demand horizons.')
+    parser.add_argument('--horizons', nargs='+', type=int, default=list(HORIZONS))
+    parser.add_argument('--compare', action='store_true',
+                        help='Also fit one single-output champion model per horizon and compare')
+    args = parser.parse_args()
+    horizons = tuple(sorted(args.horizons))
+    targets = [target_col(h) for h in horizons]
+
+    start_run('multi_horizon')
+    with span('load') as s:
+        df = load_horizon_panel(horizons)
+        df = df.sort_values('Date').reset_index(drop=True)
+        s.rows = len(df)
+    print(f"Built {', '.join(targets)} for {len(df)} rows (those with all {horizons[-1]} forward months)")
+
+    with span('prepare_features', rows=len(df)):
+        df, features = champion.prepare_features(df)
+    categorical_cols = champion.CATEGORICAL_COLS
+    train_df, test_df = holdout_split(df)
+    X_train = model_matrix(train_df, features, categorical_cols)
+    X_test = model_matrix(test_df, features, categorical_cols)
+    y_train = horizon_increments(train_df, horizons)
+
+    params = build_model().get_params()
+    with span('pool', rows=len(X_train)):
+        train_pool = cached_train_pool(X_train, y_train, categorical_cols, params)
+
+    fit_data = train_df[features + targets]
+    cached = find_model(MODEL_NAME, fit_data, params)
+    fit_t = time.time()
+    if cached is not None:
+        model = MultiHorizonModel(horizons, cached[0])
+        print(f"Reusing registered {MODEL_NAME} version {cached[1]['version']} (training data unchanged)")
+    else:
+        model = MultiHorizonModel(horizons)
+        with span('fit', rows=len(X_train)):
+            model.fit(train_pool)
+        print(f"Fitted {len(horizons)} horizons jointly in {time.time() - fit_t:.2f} seconds")
+
+    with span('predict', rows=len(X_test)):
+        pred = model.predict(X_test)
+    metrics = {}
+    for h, row in zip(horizons, pred):
+        metrics[f'MAE_{h}m'] = mean_absolute_error(test_df[target_col(h)], row)
+        print(f"{target_col(h):<10} test MAE: {metrics[f'MAE_{h}m']:.4f}")
+    print(f"Monotonic: {bool(np.all(np.diff(pred, axis=0) >= 0))} across {pred.shape[1]} test rows")
+
+    if cached is None:
+        register_model(model.model, MODEL_NAME, features, categorical_cols, fit_data, metrics=metrics,
+                       extra={'horizons': list(horizons)})
+
+    if args.compare:
+        print("\n--- Single-output champion model per horizon ---")
+        single_t, single_pred = time.time(), []
+        for h in horizons:
+            with span('fit_single', rows=len(X_train), horizon=h):
+                pool = cached_train_pool(X_train, train_df[target_col(h)], categorical_cols,
+                                         champion.build_model().get_params())
+                single = champion.build_model().fit(pool)
+            single_pred.append(np.maximum(0, single.predict(X_test)))
+            print(f"{target_col(h):<10} test MAE: {mean_absolute_error(test_df[target_col(h)], single_pred[-1]):.4f}")
+        crossings = int(np.sum(np.diff(np.array(single_pred), axis=0) < 0))
+        print(f"{len(horizons)} separate fits took {time.time() - single_t:.2f} seconds; "
+              f"{crossings} row/horizon pairs where a longer horizon predicts less")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+from tejas_model_registry import load_model
+from tejas_feature_eda import parse_price
+from tejas_modeling_champion import QUANTILES, predict_intervals
+from tejas_score import DEFAULT_REGIONS, scoring_frame, score_frame
+from tejas_pools import model_matrix
+from tejas_trace import span, start_run
+
+# Newsvendor order quantities for a new release, from the P10 / P50 / P90 of the
+# registered MultiQuantile model (champion_interval) and the product price columns.
+#
+# 1. Each SKU x Region demand is read as a split normal through its quantiles (lower /
+#    upper sigma matched to P10-P50 and P50-P90, floored at 0) and laid out on a fixed
+#    grid of equal-probability levels: one (rows, GRID_POINTS) array for the whole release.
+# 2. Underage cost is the lost margin (retail - wholesale), overage cost the wholesale
+#    price not recovered on unsold units. Unconstrained, the best order is the
+#    critical-ratio quantile cu / (cu + co) of each row's demand.
+# 3. Budget and per-brand spend caps are Lagrange multipliers that charge every ordered
+#    unit `multiplier x wholesale`, lowering the critical ratio. They are found by
+#    bisection (brands in parallel), each step one vectorized pass over all rows.
+#    With an MOQ a row orders 0 or at least the MOQ, whichever costs less.
+#
+# --explain adds the SHAP drivers of each row's forecast (tejas_explain.py) next to the output.
+#
+#   python tejas_order_optimizer.py final_products.csv --budget 250000 --moq 6 --brand-cap Nike=60000
+
+WHOLESALE_COL = 'USWHOLESALEPRICE'
+RETAIL_COL = 'USRETAILPRICE'
+BRAND_COL = 'BrandName'
+SALVAGE_RATE = 0.3        # share of the wholesale price recovered on an unsold unit
+GRID_POINTS = 201         # equal-probability demand levels per row
+BISECTION_STEPS = 30
+
+OUTPUT_COLS = ['Style', 'COLORDESCRIPTION', 'Color_Base', 'Size', BRAND_COL, 'Region', WHOLESALE_COL, RETAIL_COL,
+               'Predicted_4m_Order_Quantity']
+
+
+class DemandGrid:
+    """Per-row demand distribution from model quantiles (split normal, floored at 0)."""
+
+    def __init__(self, quantiles, levels=QUANTILES, n_points=GRID_POINTS):
+        q = np.asarray(quantiles, dtype=float)
+        levels = list(levels)
+        self.median = q[:, levels.index(0.5)]
+        self.sigma_lo = (self.median - q[:, 0]) / -ndtri(levels[0])
+        self.sigma_hi = (q[:, -1] - self.median) / ndtri(levels[-1])
+        # Midpoints of n_points equal-probability bins; rows stay sorted ascending
+        levels = (np.arange(n_points) + 0.5) / n_points
+        self.values = self.ppf(np.broadcast_to(levels, (len(q), n_points)))
+        self.mean = self.values.mean(axis=1)
+
+    def ppf(self, p):
+        """Demand quantile at probability p, one per row ((rows,)) or several per row ((rows, k))."""
+        p = np.asarray(p, dtype=float)
+        z = ndtri(np.clip(p, 1e-9, 1 - 1e-9))
+        lo, hi, mid = self.sigma_lo, self.sigma_hi, self.median
+        if z.ndim == 2:
+            lo, hi, mid = lo[:, None], hi[:, None], mid[:, None]
+        return np.maximum(0, mid + np.where(z < 0, lo, hi) * z)
+
+    def expected_sales(self, q, rows=slice(None)):
+        """E[min(demand, q)] per row (optionally for a subset of rows)."""
+        return np.minimum(self.values[rows], np.asarray(q, dtype=float)[:, None]).mean(axis=1)
+
+
+def expected_outcomes(demand, q, cu, co):
+    """Expected sales, leftover, lost sales, mismatch cost and fill rate of order quantities q."""
+    sales = demand.expected_sales(q)
+    leftover = q - sales
+    lost = demand.mean - sales
+    return {
+        'Expected_Sales': sales,
+        'Expected_Leftover': leftover,
+        'Expected_Lost_Sales': lost,
+        'Expected_Cost': co * leftover + cu * lost,
+        'Fill_Rate': np.where(demand.mean > 0, sales / np.where(demand.mean > 0, demand.mean, 1), 1.0),
+    }
+
+
+class NewsvendorSolver:
+    """Order quantities for every row at once, under optional budget, brand and MOQ constraints."""
+
+    def __init__(self, demand, wholesale, retail, salvage_rate=SALVAGE_RATE, moq=0):
+        self.demand = demand
+        self.wholesale = np.asarray(wholesale, dtype=float)
+        self.cu = np.maximum(0, np.asarray(retail, dtype=float) - self.wholesale)
+        self.co = self.wholesale * (1 - salvage_rate)
+        self.moq = moq
+        # Expected sales at the MOQ do not depend on the multipliers: computed once
+        self.moq_sales = demand.expected_sales(np.full(len(self.wholesale), float(moq))) if moq > 0 else None
+        # Multiplier at which no row orders anything (critical ratio <= 0)
+        self.max_multiplier = float(np.max(self.cu / np.maximum(self.wholesale, 1e-9), initial=0)) + 1.0
+
+    def critical_ratio(self, multiplier=0.0):
+        return (self.cu - multiplier * self.wholesale) / np.maximum(self.cu + self.co, 1e-9)
+
+    def order(self, multiplier=0.0):
+        """Integer order per row when each unit is charged an extra `multiplier` x wholesale."""
+        multiplier = np.broadcast_to(np.asarray(multiplier, dtype=float), self.wholesale.shape)
+        ratio = self.critical_ratio(multiplier)
+        q = np.where(ratio > 0, np.round(self.demand.ppf(ratio)), 0.0)
+
+        below = np.flatnonzero((q > 0) & (q < self.moq))
+        if len(below):
+            # Order nothing, or the MOQ: compare the expected cost of the two (incl. the charge)
+            sales, mean = self.moq_sales[below], self.demand.mean[below]
+            cu, co, w = self.cu[below], self.co[below], self.wholesale[below]
+            cost_moq = co * (self.moq - sales) + cu * (mean - sales) + multiplier[below] * w * self.moq
+            q[below] = np.where(cost_moq < cu * mean, float(self.moq), 0.0)
+        return q
+
+    def _brand_multipliers(self, base, brand, caps):
+        """Smallest per-brand multiplier (on top of `base`) keeping each capped brand's spend under its cap."""
+        n_brands = len(caps)
+        lo, hi = np.zeros(n_brands), np.full(n_brands, self.max_multiplier)
+
+        def spend(extra):
+            q = self.order(base + extra[brand])
+            return np.bincount(brand, weights=self.wholesale * q, minlength=n_brands)
+
+        hi[spend(lo) <= caps] = 0.0
+        for _ in range(BISECTION_STEPS):
+            if not np.any(hi > lo):
+                break
+            mid = (lo + hi) / 2
+            over = spend(mid) > caps
+            lo = np.where(over & (hi > lo), mid, lo)
+            hi = np.where(~over & (hi > lo), mid, hi)
+        # hi is always feasible
+        return hi
+
+    def solve(self, budget=None, brands=None, brand_caps=None):
+        """
+        Integer order per row plus the multipliers used. `brands` labels each row and
+        `brand_caps` maps a brand to its maximum spend; spend is sum(wholesale x order).
+        """
+        n = len(self.wholesale)
+        brand, caps = np.zeros(n, dtype=int), np.full(1, np.inf)
+        if brand_caps:
+            names = list(brand_caps)
+            # Uncapped brands share one extra slot with an infinite cap
+            codes = pd.Index(names).get_indexer(brands)
+            brand = np.where(codes < 0, len(names), codes)
+            caps = np.array([float(brand_caps[b]) for b in names] + [np.inf])
+
+        def respond(multiplier):
+            extra = self._brand_multipliers(multiplier, brand, caps) if brand_caps else np.zeros(len(caps))
+            q = self.order(multiplier + extra[brand])
+            return q, extra
+
+        q, extra = respond(0.0)
+        multiplier = 0.0
+        if budget is not None and float(self.wholesale @ q) > budget:
+            lo, hi = 0.0, self.max_multiplier
+            q, extra = respond(hi)
+            for _ in range(BISECTION_STEPS):
+                mid = (lo + hi) / 2
+                q_mid, extra_mid = respond(mid)
+                if float(self.wholesale @ q_mid) > budget:
+                    lo = mid
+                else:
+                    hi, q, extra = mid, q_mid, extra_mid
+            multiplier = hi
+
+        brand_multipliers = dict(zip(brand_caps or {}, extra[:len(caps) - 1])) if brand_caps else {}
+        return q, {'budget_multiplier': multiplier, 'brand_multipliers': brand_multipliers}
+
+
+def parse_brand_caps(items):
+    """['Nike=60000', ...] -> {'Nike': 60000.0}."""
+    caps = {}
+    for item in items or []:
+        brand, _, amount = item.rpartition('=')
+        if not brand:
+            raise ValueError(f"Brand cap must look like BRAND=AMOUNT, got '{item}'")
+        caps[brand] = float(amount)
+    return caps
+
+
+def recommend_orders(df, quantiles, budget=None, moq=0, brand_caps=None, salvage_rate=SALVAGE_RATE):
+    """
+    Copy of `df` (needs the price and brand columns) with the recommended order per row,
+    its cost and expected outcomes. Returns (frame, solver info).
+    """
+    df = df.copy()
+    wholesale, retail = parse_price(df[WHOLESALE_COL]), parse_price(df[RETAIL_COL])
+    missing = int((wholesale.isna() | retail.isna()).sum())
+    if missing:
+        raise ValueError(f"{missing} rows have no {WHOLESALE_COL}/{RETAIL_COL} price")
+    df[WHOLESALE_COL], df[RETAIL_COL] = wholesale.to_numpy(), retail.to_numpy()
+
+    demand = DemandGrid(quantiles)
+    solver = NewsvendorSolver(demand, wholesale, retail, salvage_rate, moq)
+    q, info = solver.solve(budget, df[BRAND_COL].astype(str).to_numpy(), brand_caps)
+
+    for level, values in zip(QUANTILES, np.asarray(quantiles).T):
+        df[f'Predicted_P{int(level * 100)}'] = np.round(values)
+    df['Critical_Ratio'] = solver.critical_ratio()
+    df['Recommended_Order_Quantity'] = q.astype(int)
+    df['Order_Value'] = solver.wholesale * q
+    for col, values in expected_outcomes(demand, q, solver.cu, solver.co).items():
+        df[col] = values
+    info['solver'] = solver
+    return df, info
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Newsvendor-optimal order quantities for a product release.')
+    parser.add_argument('input', help='Product CSV (final_products.csv format, or already feature-ready)')
+    parser.add_argument('--model', default='champion_interval', help='Registered MultiQuantile model')
+    parser.add_argument('--point-model', default='champion',
+                        help="Point-forecast model to compare against ('' to skip)")
+    parser.add_argument('--version', default='latest', help='Version of --model')
+    parser.add_argument('--point-version', default='latest', help='Version of --point-model')
+    parser.add_argument('--regions', nargs='+', default=DEFAULT_REGIONS)
+    parser.add_argument('--budget', type=float, default=None, help='Maximum total spend at wholesale prices')
+    parser.add_argument('--moq', type=int, default=0, help='Minimum order quantity per SKU x Region (0 or >= MOQ)')
+    parser.add_argument('--brand-cap', nargs='+', default=[], metavar='BRAND=AMOUNT',
+                        help='Maximum wholesale spend per brand (BrandName, e.g. Nike=60000)')
+    parser.add_argument('--salvage-rate', type=float, default=SALVAGE_RATE,
+                        help='Share of the wholesale price recovered on unsold units')
+    parser.add_argument('--output', default='final_products_order_recommendations.csv')
+    parser.add_argument('--explain', action='store_true',
+                        help='Also write per-row SHAP explanations of the point (else P50) forecast next to --output')
+    args = parser.parse_args()
+
+    start_run('order_optimizer')
+    start_t = time.time()
+    with span('load_model'):
+        model, meta = load_model(args.model, args.version)
+        point = load_model(args.point_model, args.point_version) if args.point_model else None
+    print(f"Loaded interval model '{meta['name']}' version {meta['version']}")
+
+    with span('load') as s:
+        df = pd.read_csv(args.input, low_memory=False)
+        s.rows = len(df)
+    with span('features') as s:
+        df = scoring_frame(df, meta, args.regions)
+        s.rows = len(df)
+
+    with span('predict', rows=len(df)):
+        quantiles = predict_intervals(model, model_matrix(df, meta['features'], meta['categorical_cols']))
+        if point is not None:
+            df['Predicted_4m_Order_Quantity'] = np.round(score_frame(point[0], point[1], df))
+
+    solve_t = time.time()
+    with span('optimize', rows=len(df)):
+        df, info = recommend_orders(df, quantiles, args.budget, args.moq, parse_brand_caps(args.brand_cap),
+                                    args.salvage_rate)
+    solver = info['solver']
+    print(f"Optimized {len(df)} SKU x Region orders in {time.time() - solve_t:.3f} seconds "
+          f"({time.time() - start_t:.2f} seconds including model load and scoring).")
+
+    spend = df['Order_Value'].sum()
+    print(f"Total order: {df['Recommended_Order_Quantity'].sum():,} units, ${spend:,.0f} at wholesale"
+          + (f" (budget ${args.budget:,.0f}, multiplier {info['budget_multiplier']:.3f})" if args.budget else ''))
+    for brand, value in info['brand_multipliers'].items():
+        brand_spend = df.loc[df[BRAND_COL].astype(str) == brand, 'Order_Value'].sum()
+        print(f"  {brand}: ${brand_spend:,.0f} (multiplier {value:.3f})")
+    print(f"Expected mismatch cost ${df['Expected_Cost'].sum():,.0f}, fill rate "
+          f"{df['Expected_Sales'].sum() / max(solver.demand.mean.sum(), 1e-9):.1%}")
+    if 'Predicted_4m_Order_Quantity' in df.columns:
+        baseline = expected_outcomes(solver.demand, df['Predicted_4m_Order_Quantity'].to_numpy(dtype=float),
+                                     solver.cu, solver.co)
+        print(f"Ordering the point forecast instead: ${df['Predicted_4m_Order_Quantity'].to_numpy() @ solver.wholesale:,.0f}"
+              f" spend, expected mismatch cost ${baseline['Expected_Cost'].sum():,.0f}, fill rate "
+              f"{baseline['Expected_Sales'].sum() / max(solver.demand.mean.sum(), 1e-9):.1%}")
+
+    result_cols = [c for c in df.columns if c.startswith('Predicted_P')] + [
+        'Critical_Ratio', 'Recommended_Order_Quantity', 'Order_Value', 'Expected_Sales', 'Expected_Leftover',
+        'Expected_Lost_Sales', 'Expected_Cost', 'Fill_Rate']
+    out = df[[c for c in OUTPUT_COLS if c in df.columns] + result_cols]
+    with span('write', rows=len(out)):
+        out.to_csv(args.output, index=False)
+    print(f"Saved order recommendations to {args.output}")
+
+    if args.explain:
+        from tejas_explain import explain_predictions
+        with span('explain', rows=len(df)):
+            explain_predictions(*(point if point is not None else (model, meta)), df, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import os
+import json
+import fcntl
+import argparse
+import numpy as np
+import pandas as pd
+
+from tejas_feature_store import STORE_ROOT, CATEGORICAL_COLS, LEGACY_CSVS, load_table
+from tejas_demand_targets import SERIES_KEYS
+from tejas_trend_index import _parse_pct
+
+# Compact in-memory demand panel.
+#
+# - string columns are dictionary-encoded against one shared, persisted vocabulary, so a
+#   value has the same integer code in every table, partition and process
+#   (new values are appended, existing codes never move). The vocabulary is persisted
+#   only where tables are written (write_table -> update_vocabulary); loading is read-only
+# - integers are downcast to the smallest type that holds them (flags -> int8,
+#   trend indices -> int8/int16), floats to float32
+# - '20.00%' strings (the *_pct_change columns of older tables) become float32 fractions
+# - DensePanel gives a (series x month) float32 array keyed by Region/GridValue for
+#   lag / rolling computations without groupby-shift on the long frame
+
+VOCAB_FILE = '_vocabulary.json'
+VOCAB_PATH = os.path.join(STORE_ROOT, VOCAB_FILE)
+_PCT_PATTERN = r'^\s*-?\d+(?:\.\d+)?\s*%\s*$'
+
+
+class Vocabulary:
+    """Shared category lists per column; codes are positions in these lists."""
+
+    def __init__(self, categories=None):
+        self.categories = {col: list(values) for col, values in (categories or {}).items()}
+
+    @classmethod
+    def load(cls, path=VOCAB_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path=VOCAB_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Write-then-rename: readers never see a half-written file
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.categories, f)
+        os.replace(path + '.tmp', path)
+
+    def extend(self, df, columns=CATEGORICAL_COLS):
+        """Append values not seen before (in sorted order); returns True if anything was added."""
+        changed = False
+        for col in columns:
+            if col not in df.columns:
+                continue
+            known = self.categories.setdefault(col, [])
+            known_set = set(known)
+            values = df[col].dropna()
+            values = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else values.unique()
+            new = sorted({str(v) for v in values} - known_set)
+            if new:
+                known.extend(new)
+                changed = True
+        return changed
+
+    def dtype(self, col):
+        return pd.CategoricalDtype(self.categories[col])
+
+    def encode(self, df, columns=CATEGORICAL_COLS):
+        """Cast the given columns to categoricals over the shared vocabulary (in place on a copy)."""
+        df = df.copy()
+        for col in columns:
+            if col in df.columns:
+                df[col] = df[col].astype(str).where(df[col].notna()).astype(self.dtype(col))
+        return df
+
+
+def parse_pct_columns(df):
+    """String columns holding percentages ('20.00%') -> float32 fractions (0.2)."""
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_numeric_dtype(series) \
+                or pd.api.types.is_datetime64_any_dtype(series):
+            continue
+        values = series.dropna().astype(str)
+        if len(values) and values.str.match(_PCT_PATTERN).all():
+            df[col] = _parse_pct(series).astype(np.float32)
+    return df
+
+
+def downcast_numerics(df):
+    """Smallest integer type for int columns, float32 for floats."""
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            df[col] = series.astype(np.int8)
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            df[col] = series.astype(np.float32)
+    return df
+
+
+def update_vocabulary(df, path=VOCAB_PATH):
+    """Append the unseen values of `df` to the persisted vocabulary (called where tables are written)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Parallel writers take turns, so none overwrites values another one just appended
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        vocab = Vocabulary.load(path)
+        if vocab.extend(df):
+            vocab.save(path)
+    return vocab
+
+
+def compact_frame(df, vocab=None, vocab_path=VOCAB_PATH):
+    """Apply the shared vocabulary, percentage parsing and numeric downcasts to a demand frame."""
+    df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed:')])
+    if vocab is None:
+        vocab = Vocabulary.load(vocab_path)
+        # Values the persisted vocabulary lacks (e.g. a legacy CSV) are appended in memory only
+        vocab.extend(df)
+    df = vocab.encode(df)
+    df = parse_pct_columns(df)
+    return downcast_numerics(df)
+
+
+def categorical_features(df, columns):
+    """
+    Model-ready categoricals without a string copy: columns already dictionary-encoded stay
+    categorical (NaN -> 'missing' category), anything else is cast to str as before.
+    """
+    df = df.copy()
+    for col in columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            if series.isna().any():
+                if 'missing' not in series.cat.categories:
+                    series = series.cat.add_categories('missing')
+                series = series.fillna('missing')
+            df[col] = series
+        else:
+            df[col] = series.astype(str).fillna('missing')
+    return df
+
+
+def load_panel(table='final_demand', root=STORE_ROOT, vocab_path=None, verbose=True, **kwargs):
+    """Load a demand table (store or legacy CSV) as a compact panel; the store's vocabulary is only read."""
+    df = load_table(table, root, **kwargs)
+    compact = compact_frame(df, vocab_path=vocab_path or os.path.join(root, VOCAB_FILE))
+    if verbose:
+        before = df.memory_usage(deep=True).sum() / 1e6
+        after = compact.memory_usage(deep=True).sum() / 1e6
+        print(f"Loaded '{table}' as a compact panel: {len(compact)} rows, {after:.2f} MB (from {before:.2f} MB)")
+    return compact
+
+
+class DensePanel:
+    """
+    One value per (series, month): a float32 array of shape (n_series, n_months) over a
+    contiguous monthly range, so a lag of k months is a shift of k columns.
+    Rows sharing a (series, month) are aggregated with `agg` ('sum' or 'mean').
+    """
+
+    def __init__(self, df, value_col, keys=SERIES_KEYS, date_col='Date', agg='sum'):
+        self.keys = list(keys)
+        series_id = df.groupby(self.keys, observed=True, sort=True).ngroup().to_numpy()
+        dates = df[date_col]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
+        periods = pd.PeriodIndex(dates, freq='M')
+        first = periods.min()
+        self.months = pd.period_range(first, periods.max(), freq='M')
+        month_id = (periods.asi8 - first.ordinal).astype(np.int64)
+
+        n_series = int(series_id.max()) + 1 if len(df) else 0
+        values = df[value_col].to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+
+        sums = np.zeros((n_series, len(self.months)))
+        counts = np.zeros((n_series, len(self.months)), dtype=np.int32)
+        np.add.at(sums, (series_id[present], month_id[present]), values[present])
+        np.add.at(counts, (series_id[present], month_id[present]), 1)
+        if agg == 'mean':
+            sums = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+        elif agg != 'sum':
+            raise ValueError(f"Unknown aggregation '{agg}'")
+        sums[counts == 0] = np.nan
+
+        self.values = sums.astype(np.float32)
+        self.row_series = series_id
+        self.row_month = month_id
+        # Key values of each series (row i of the array)
+        first_rows = pd.Series(np.arange(len(df))).groupby(series_id).first().to_numpy()
+        self.series = df.iloc[first_rows][self.keys].reset_index(drop=True)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def lag(self, k, values=None):
+        """Value k months earlier (NaN where that month is outside the panel)."""
+        values = self.values if values is None else values
+        out = np.full_like(values, np.nan)
+        if k < values.shape[1]:
+            out[:, k:] = values[:, :values.shape[1] - k]
+        return out
+
+    def rolling_mean(self, window, values=None, min_periods=None):
+        """Trailing mean over `window` months incl. the current one, ignoring missing months."""
+        values = self.values if values is None else values
+        min_periods = window if min_periods is None else min_periods
+        filled = np.nan_to_num(values, nan=0.0).astype(np.float64)
+        present = (~np.isnan(values)).astype(np.int32)
+        csum = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(filled, axis=1)], axis=1)
+        ccount = np.concatenate([np.zeros((values.shape[0], 1), dtype=np.int32), np.cumsum(present, axis=1)], axis=1)
+
+        hi = np.arange(1, values.shape[1] + 1)
+        lo = np.maximum(hi - window, 0)
+        total = csum[:, hi] - csum[:, lo]
+        count = ccount[:, hi] - ccount[:, lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = np.where(count >= max(min_periods, 1), total / count, np.nan)
+        return out.astype(np.float32)
+
+    def to_rows(self, array):
+        """Broadcast a (series x month) array back onto the rows the panel was built from."""
+        return array[self.row_series, self.row_month]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the memory footprint of the compact demand panel.')
+    parser.add_argument('--table', default='final_demand')
+    args = parser.parse_args()
+
+    csv_df = pd.read_csv(LEGACY_CSVS[args.table], low_memory=False)
+    store_df = load_table(args.table)
+    panel = load_panel(args.table, verbose=False)
+    print(f"{'CSV (object strings)':<28} {csv_df.memory_usage(deep=True).sum() / 1e6:8.2f} MB")
+    print(f"{'Feature store':<28} {store_df.memory_usage(deep=True).sum() / 1e6:8.2f} MB")
+    print(f"{'Compact panel':<28} {panel.memory_usage(deep=True).sum() / 1e6:8.2f} MB")
+
+    dense = DensePanel(panel, 'Demand')
+    print(f"Dense Demand panel: {dense.shape[0]} series x {dense.shape[1]} months, "
+          f"{dense.values.nbytes / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
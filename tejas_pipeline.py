@@ -0,0 +1,299 @@
+import os
+import re
+import sys
+import ast
+import json
+import glob
+import time
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# One DAG for the whole project (the manual order in the README):
+#
+#   explore.ipynb -> tejas_feature_eda.py -> additional_features.ipynb -> tejas_modeling_{baseline,champion,advanced}.py
+#   explore.ipynb -> clean_092024products.ipynb                          -> tejas_llm_augmentation.py
+#
+# Every stage declares its code, inputs and outputs. A stage is skipped when the hash of
+# its command, code (incl. local tejas_* modules it imports) and inputs matches the last
+# successful run and its outputs still exist. Stages whose dependencies are done run in
+# parallel (e.g. the baseline and champion models). Timings go to .cache/pipeline/last_run.json.
+#
+#   python tejas_pipeline.py                      # run whatever changed
+#   python tejas_pipeline.py --stages champion    # champion + anything upstream that changed
+#   python tejas_pipeline.py --dry-run            # show what would run
+
+PIPELINE_DIR = os.path.join('.cache', 'pipeline')
+STATE_PATH = os.path.join(PIPELINE_DIR, 'state.json')
+TIMINGS_PATH = os.path.join(PIPELINE_DIR, 'last_run.json')
+LOG_DIR = os.path.join(PIPELINE_DIR, 'logs')
+EXECUTED_NB_DIR = os.path.join(PIPELINE_DIR, 'executed')
+
+RAW_DIR = 'VSP Vision Datasets'
+TRENDS = ['opticalsun_googletrends.csv', os.path.join(RAW_DIR, 'google trends')]
+# What tejas_lookalike builds its index from and tejas_cannibalization counts siblings over
+LOOKALIKE_SOURCES = ['feature_store/enriched', 'styles.csv', 'products.csv', 'final_products.csv']
+
+
+class Stage:
+    """One pipeline step: a script or notebook with declared inputs and outputs."""
+
+    def __init__(self, name, code, inputs=(), outputs=(), args=()):
+        self.name = name
+        self.code = code
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = list(args)
+
+    @property
+    def command(self):
+        if self.code.endswith('.ipynb'):
+            # Executed copies go to .cache so the committed notebooks are not rewritten
+            return [sys.executable, '-m', 'jupyter', 'nbconvert', '--to', 'notebook', '--execute',
+                    '--output-dir', EXECUTED_NB_DIR, self.code]
+        return [sys.executable, self.code] + self.args
+
+
+STAGES = [
+    Stage('explore', 'explore.ipynb',
+          inputs=[os.path.join(RAW_DIR, '*.xls*')],
+          outputs=['demand_monthly.csv', 'products.csv']),
+    Stage('feature_eda', 'tejas_feature_eda.py',
+          inputs=['demand_monthly.csv'] + TRENDS,
+          outputs=['demand_monthly_enriched.csv', 'feature_store/enriched']),
+    Stage('additional_features', 'additional_features.ipynb',
+          inputs=['demand_monthly_enriched.csv', 'styles.csv'],
+          outputs=['final_demand.csv', 'feature_store/final_demand']),
+    Stage('clean_products', 'clean_092024products.ipynb',
+          inputs=['products.csv'] + TRENDS,
+          outputs=['final_products.csv']),
+    Stage('baseline', 'tejas_modeling_baseline.py',
+          inputs=['final_demand.csv', 'feature_store/final_demand']),
+    Stage('champion', 'tejas_modeling_champion.py',
+          inputs=['final_demand.csv', 'feature_store/final_demand', 'best_catboost_config.json'],
+          outputs=['final_order_predictions.csv']),
+    Stage('advanced', 'tejas_modeling_advanced.py',
+          inputs=['final_demand.csv', 'feature_store/final_demand', 'best_catboost_config.json']
+          + LOOKALIKE_SOURCES + TRENDS),
+    Stage('llm_augmentation', 'tejas_llm_augmentation.py',
+          inputs=['final_order_predictions.csv', 'final_demand.csv'],
+          outputs=['llm_opus_augmented_predictions_top5.csv']),
+]
+
+
+# --- Hashing ---------------------------------------------------------------------
+
+def _expand(pattern):
+    """Files behind an input: a file, every file under a directory, or a glob."""
+    if os.path.isdir(pattern):
+        return sorted(f for f in glob.glob(os.path.join(pattern, '**', '*'), recursive=True) if os.path.isfile(f))
+    return sorted(f for f in glob.glob(pattern) if os.path.isfile(f)) if any(ch in pattern for ch in '*?[') \
+        else ([pattern] if os.path.isfile(pattern) else [])
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _code_text(path):
+    """Source that defines a stage's behaviour; for notebooks only the code cells (not outputs)."""
+    with open(path, encoding='utf-8') as f:
+        if not path.endswith('.ipynb'):
+            return f.read()
+        nb = json.load(f)
+    return '\n'.join(''.join(c['source']) for c in nb['cells'] if c['cell_type'] == 'code')
+
+
+def _local_imports(source):
+    """tejas_* modules imported by a piece of source (notebook cells may contain magics, so parse leniently)."""
+    try:
+        tree = ast.parse(source)
+        names = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(a.name.split('.')[0] for a in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                names.add(node.module.split('.')[0])
+    except SyntaxError:
+        names = set(re.findall(r'^\s*(?:from|import)\s+(\w+)', source, re.MULTILINE))
+    return {n for n in names if n.startswith('tejas_') and os.path.exists(f'{n}.py')}
+
+
+def code_files(path):
+    """The stage's script/notebook plus every local module it imports, transitively."""
+    files, todo = [], [path]
+    while todo:
+        current = todo.pop()
+        if current in files:
+            continue
+        files.append(current)
+        todo.extend(f'{m}.py' for m in sorted(_local_imports(_code_text(current))))
+    return sorted(files)
+
+
+def stage_hash(stage):
+    """Hash of the command, code and current input contents."""
+    digest = hashlib.sha256(json.dumps(stage.command[1:]).encode())
+    for path in code_files(stage.code):
+        digest.update(f'code:{path}:'.encode() + hashlib.sha256(_code_text(path).encode()).digest())
+    for pattern in stage.inputs:
+        for path in _expand(pattern):
+            digest.update(f'input:{path}:{_file_digest(path)}'.encode())
+    return digest.hexdigest()
+
+
+# --- Graph -----------------------------------------------------------------------
+
+def dependencies(stages):
+    """stage name -> names of the stages producing any of its inputs."""
+    producers = {out: s.name for s in stages for out in s.outputs}
+    return {s.name: sorted({producers[i] for i in s.inputs if i in producers and producers[i] != s.name})
+            for s in stages}
+
+
+def select_stages(stages, targets):
+    """The target stages plus everything upstream of them."""
+    if not targets:
+        return stages
+    deps = dependencies(stages)
+    unknown = set(targets) - set(deps)
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {sorted(unknown)}")
+    keep, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in keep:
+            keep.add(name)
+            todo.extend(deps[name])
+    return [s for s in stages if s.name in keep]
+
+
+def _load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_state(state):
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    with open(STATE_PATH, 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def _run_stage(stage):
+    """Run one stage as a subprocess; output goes to its log file. Returns (returncode, seconds)."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    start_t = time.time()
+    with open(os.path.join(LOG_DIR, f'{stage.name}.log'), 'w') as log:
+        result = subprocess.run(stage.command, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.time() - start_t
+
+
+def run_pipeline(stages=STAGES, targets=None, force=False, jobs=2, dry_run=False):
+    """Run changed stages in dependency order, independent ones in parallel; returns per-stage records."""
+    stages = select_stages(stages, targets)
+    deps = dependencies(stages)
+    by_name = {s.name: s for s in stages}
+    state = _load_state()
+
+    status = {}      # name -> 'ran' | 'skipped' | 'failed' | 'blocked'
+    records = {}
+    running = {}
+
+    def ready(name):
+        return name not in status and name not in running.values() and all(status.get(d) in ('ran', 'skipped') for d in deps[name])
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while len(status) < len(stages):
+            # Stages whose upstream failed can never run
+            for name in deps:
+                if name not in status and any(status.get(d) in ('failed', 'blocked') for d in deps[name]):
+                    status[name] = 'blocked'
+                    records[name] = {'stage': name, 'status': 'blocked', 'seconds': 0.0}
+
+            for name in [n for n in deps if ready(n)]:
+                stage = by_name[name]
+                hash_t = time.time()
+                digest = stage_hash(stage)
+                outputs_exist = all(_expand(o) for o in stage.outputs)
+                # A stage whose upstream would rerun (dry run) counts as changed too
+                upstream_changed = any(records[d]['status'] == 'would run' for d in deps[name])
+                if not force and not upstream_changed and outputs_exist and state.get(name) == digest:
+                    status[name] = 'skipped'
+                    records[name] = {'stage': name, 'status': 'skipped', 'seconds': 0.0,
+                                     'hash_seconds': time.time() - hash_t, 'hash': digest}
+                    print(f"[skip] {name} (inputs and code unchanged)")
+                elif dry_run:
+                    status[name] = 'skipped'
+                    records[name] = {'stage': name, 'status': 'would run', 'seconds': 0.0, 'hash': digest}
+                    print(f"[would run] {name}")
+                else:
+                    print(f"[run ] {name}: {' '.join(stage.command[1:])}")
+                    running[pool.submit(_run_stage, stage)] = name
+                    records[name] = {'stage': name, 'hash': digest, 'hash_seconds': time.time() - hash_t}
+
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, seconds = future.result()
+                records[name].update(seconds=seconds, returncode=returncode)
+                if returncode == 0:
+                    status[name] = records[name]['status'] = 'ran'
+                    # Hash taken before the run: if an input changed mid-run the stage reruns next time
+                    state[name] = records[name]['hash']
+                    _save_state(state)
+                    print(f"[done] {name} in {seconds:.1f}s")
+                else:
+                    status[name] = records[name]['status'] = 'failed'
+                    state.pop(name, None)
+                    _save_state(state)
+                    print(f"[FAIL] {name} (exit {returncode}), see {os.path.join(LOG_DIR, name + '.log')}")
+
+    return [records[s.name] for s in stages]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the data-prep + modeling DAG, skipping unchanged stages.')
+    parser.add_argument('--stages', nargs='+', default=None, help='Target stages (upstream stages are included)')
+    parser.add_argument('--force', action='store_true', help='Rerun even if nothing changed')
+    parser.add_argument('--jobs', type=int, default=2, help='Stages run in parallel')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--list', action='store_true', help='Print the stages and their dependencies')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, upstream in dependencies(STAGES).items():
+            print(f"{name:<20} <- {', '.join(upstream) or '(raw data)'}")
+        return
+
+    start_t = time.time()
+    records = run_pipeline(STAGES, args.stages, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
+    total = time.time() - start_t
+
+    print("\n--- Stage timings ---")
+    for r in records:
+        print(f"{r['stage']:<20} {r['status']:<10} {r['seconds']:8.1f}s")
+    print(f"{'total':<20} {'':<10} {total:8.1f}s")
+
+    if not args.dry_run:
+        os.makedirs(PIPELINE_DIR, exist_ok=True)
+        with open(TIMINGS_PATH, 'w') as f:
+            json.dump({'finished': datetime.now(timezone.utc).isoformat(), 'total_seconds': total,
+                       'stages': records}, f, indent=2)
+        print(f"Saved timings to {TIMINGS_PATH}")
+
+    if any(r['status'] in ('failed', 'blocked') for r in records):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import numpy as np
+from catboost import Pool
+
+from tejas_panel import categorical_features
+from tejas_model_registry import data_fingerprint
+
+# CatBoost Pool construction shared by the training scripts, tuning and backtests.
+#
+# - model_matrix(): the feature frame CatBoost reads directly: categoricals stay
+#   dictionary-encoded (pandas categoricals over the shared vocabulary, no per-row
+#   strings), numerics are float32, which is what CatBoost stores internally anyway.
+# - cached_train_pool(): training pools are quantized against float-feature borders
+#   saved under .cache/pools/, keyed by the training data fingerprint and the
+#   quantization params, so later runs skip the border search. Within a process the
+#   quantized pool itself is kept, so tuning trials with the same fold data and
+#   border settings share one pool.
+#
+# Borders are cached rather than whole quantized pools: a model trained on a pool
+# reloaded with Pool('quantized://...') differs from one trained on the raw data for
+# the advanced feature set, while quantizing in memory against saved borders gives
+# the identical model.
+# Quantized pools cannot be used to continue training from an init_model (CatBoost
+# needs the raw values to replay the existing trees), so those fits use plain pools.
+
+POOL_CACHE_DIR = os.path.join('.cache', 'pools')
+
+# CatBoost params that change how a pool is quantized (the rest only affect training)
+QUANTIZATION_PARAMS = ('border_count', 'feature_border_type', 'per_float_feature_quantization', 'nan_mode')
+
+
+def model_matrix(df, features, categorical_cols):
+    """Feature frame in model column order: categoricals as codes, numerics as float32."""
+    X = categorical_features(df[list(features)], [c for c in categorical_cols if c in features])
+    for col in X.columns:
+        if col not in categorical_cols and X[col].dtype != np.float32:
+            X[col] = X[col].astype(np.float32)
+    return X
+
+
+def build_pool(X, y=None, categorical_cols=(), **kwargs):
+    """Plain (raw) Pool over a model_matrix frame."""
+    return Pool(X, None if y is None else np.asarray(y, dtype=np.float32),
+                cat_features=[c for c in categorical_cols if c in X.columns], **kwargs)
+
+
+def quantization_params(params):
+    """The quantization-relevant subset of CatBoost params (unset ones omitted)."""
+    return {k: params[k] for k in QUANTIZATION_PARAMS if params.get(k) is not None}
+
+
+def pool_key(X, y, params, fingerprint=None):
+    """Cache key: training data fingerprint (features + target) and quantization params."""
+    if fingerprint is None:
+        y = np.asarray(y)
+        # Multi-output targets (e.g. MultiRMSE) hash one column per output
+        targets = {'__target': y} if y.ndim == 1 else {f'__target{i}': col for i, col in enumerate(y.T)}
+        fingerprint = data_fingerprint(X.assign(**targets))
+    h = hashlib.sha256(fingerprint.encode())
+    h.update(json.dumps(quantization_params(params), sort_keys=True, default=str).encode())
+    return h.hexdigest()[:24]
+
+
+_POOLS = {}  # pool key -> quantized Pool, reused for the lifetime of the process
+
+
+def cached_train_pool(X, y, categorical_cols, params, cache_dir=POOL_CACHE_DIR, fingerprint=None, use_cache=True):
+    """
+    Quantized training pool for a model with CatBoost `params`, built against cached
+    borders when the data and quantization params are unchanged (otherwise the
+    borders are computed and saved). `fingerprint` can be passed in when the caller
+    already hashed the training data.
+    """
+    key = pool_key(X, y, params, fingerprint)
+    if use_cache and key in _POOLS:
+        return _POOLS[key]
+
+    pool = build_pool(X, y, categorical_cols)
+    borders_path = os.path.join(cache_dir, key + '.borders')
+    if use_cache and os.path.exists(borders_path):
+        pool.quantize(input_borders=borders_path)
+    else:
+        pool.quantize(**quantization_params(params))
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write-then-rename: parallel workers may build the same borders
+            tmp_path = f'{borders_path}.{os.getpid()}.tmp'
+            pool.save_quantization_borders(tmp_path)
+            os.replace(tmp_path, borders_path)
+    if use_cache:
+        _POOLS[key] = pool
+    return pool
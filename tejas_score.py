@@ -0,0 +1,151 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from tejas_model_registry import load_model
+from tejas_feature_eda import brand_tier, lookalike_id
+from tejas_demand_targets import add_calendar_flags, horizon_totals
+from tejas_trend_index import TrendIndex
+from tejas_trace import span, start_run
+from tejas_pools import model_matrix
+from tejas_cannibalization import (CANNIBALIZATION_FEATURES, add_cannibalization_features,
+                                   load_sibling_history, release_frame_cols)
+from tejas_lookalike import ANALOG_FEATURES, add_analog_features
+
+# Batch-scoring entry point: load a registered CatBoost model and score a new
+# product drop (e.g. final_products.csv for Sept 2024) without retraining.
+#
+#   python tejas_score.py final_products.csv --model champion --output final_products_scored.csv
+
+DEFAULT_REGIONS = ['AMER', 'EMEA']
+
+
+def map_product_columns(products_df):
+    """
+    Map the cleaned ATP product columns (clean_092024products.ipynb output) onto the
+    training feature schema, one row per product.
+    """
+    df = products_df.drop(columns=[c for c in products_df.columns if c.startswith('Unnamed:')]).copy()
+
+    # Older product files carry merged trend columns (incl. '_x'/'_y' duplicates);
+    # drop them, every trend value comes from the shared trend index below
+    trends = TrendIndex.load()
+    stale = [c for c in df.columns
+             if c.endswith(('_x', '_y', ' frames', ' glasses')) or c in trends.columns]
+    df = df.drop(columns=stale)
+
+    # Product attributes -> demand-table attributes
+    df['Style'] = df['MATERIALNUMBER']
+    df['Shape'] = df['FRAMESHAPE']
+    df['FrameType'] = df['FRAMECONSTRUCTION']
+    df['Material'] = df['MATERIALCODE1']
+    df['BrandName'] = df['_BRAND']
+    df['OpticalOrSun'] = df['_SHEET_TYPE']
+    df['Size'] = df['SIZES'].astype(str).str.split('-').str[0]
+    df['Brand_Tier'] = brand_tier(df['BrandName'])
+    df['Lookalike_ID'] = lookalike_id(df['BrandName'], df['Color_Base'], df['Material'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = trends.attach(df, trends.base_columns)
+    return add_calendar_flags(df)
+
+
+def products_to_features(products_df, regions=DEFAULT_REGIONS):
+    """Feature-ready products expanded across the given regions."""
+    df = map_product_columns(products_df)
+
+    # Every product can ship to every region: cross join
+    region_df = pd.DataFrame({'Region': list(regions)})
+    return df.merge(region_df, how='cross')
+
+
+def attach_cannibalization(df, features, history=None):
+    """
+    Add the cannibalization features a model needs to new-release rows: each frame is scored
+    as the only new frame, so siblings are the historical frames active in its launch month,
+    as in training, not the rest of the release.
+    """
+    if not any(f in CANNIBALIZATION_FEATURES and f not in df.columns for f in features):
+        return df
+    history = load_sibling_history() if history is None else history
+    return add_cannibalization_features(df, history, frame_cols=release_frame_cols(df))
+
+
+def scoring_frame(df, meta, regions=DEFAULT_REGIONS, history=None):
+    """
+    Feature-ready rows for a model from a product file (expanded across `regions`) or
+    an already feature-ready frame: missing trend lags/momentum, cannibalization and
+    analog (lookalike) features are filled in. `history` is the sibling demand history
+    (load_sibling_history(), raw or prepared), loaded on demand if not passed.
+    """
+    if 'Region' not in df.columns:
+        df = products_to_features(df, regions)
+
+    # Lags/momentum (advanced model) are looked up per month rather than stored on the rows
+    trends = TrendIndex.load()
+    missing_trends = [f for f in meta['features'] if f not in df.columns and f in trends.columns]
+    if missing_trends:
+        df = trends.attach(df, missing_trends)
+    if any(f in ANALOG_FEATURES and f not in df.columns for f in meta['features']):
+        df = add_analog_features(df, frame_cols=['GridValue'] if 'GridValue' in df.columns else release_frame_cols(df))
+    return attach_cannibalization(df, meta['features'], history)
+
+
+def score_frame(model, meta, df):
+    """
+    Score a feature-ready frame in a single batched predict call. Multi-horizon models
+    (meta 'horizons') return a (rows, horizons) array of cumulative forward demand.
+    """
+    missing = [c for c in meta['features'] if c not in df.columns]
+    if missing:
+        raise KeyError(f"Input is missing model features: {missing}")
+
+    # Same categorical cleaning as training (codes stay codes, strings stay strings)
+    X = model_matrix(df, meta['features'], meta['categorical_cols'])
+    if meta.get('horizons'):
+        return horizon_totals(model.predict(X))
+    return np.maximum(0, model.predict(X))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a product file with a registered CatBoost model.')
+    parser.add_argument('input', help='Product CSV (final_products.csv format, or already feature-ready)')
+    parser.add_argument('--model', default='champion', help='Registered model name')
+    parser.add_argument('--version', default='latest')
+    parser.add_argument('--regions', nargs='+', default=DEFAULT_REGIONS)
+    parser.add_argument('--output', default='final_products_scored.csv')
+    args = parser.parse_args()
+
+    start_run('score')
+    start_t = time.time()
+    with span('load_model'):
+        model, meta = load_model(args.model, args.version)
+    print(f"Loaded model '{meta['name']}' version {meta['version']} "
+          f"(trained on {meta['n_rows']} rows, fingerprint {meta['data_fingerprint'][:8]})")
+
+    with span('load') as s:
+        df = pd.read_csv(args.input, low_memory=False)
+        s.rows = len(df)
+    with span('features') as s:
+        df = scoring_frame(df, meta, args.regions)
+        s.rows = len(df)
+
+    score_t = time.time()
+    with span('predict', rows=len(df)):
+        predictions = np.round(score_frame(model, meta, df))
+        if meta.get('horizons'):
+            for h, values in zip(meta['horizons'], predictions.T):
+                df[f'Predicted_{h}m_Order_Quantity'] = values
+        else:
+            df['Predicted_4m_Order_Quantity'] = predictions
+    df['Model_Version'] = meta['version']
+    print(f"Scored {len(df)} rows in {time.time() - score_t:.3f} seconds "
+          f"({time.time() - start_t:.2f} seconds including model load).")
+
+    with span('write', rows=len(df)):
+        df.to_csv(args.output, index=False)
+    print(f"Saved predictions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
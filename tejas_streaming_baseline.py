@@ -0,0 +1,203 @@
+import time
+import argparse
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+from tejas_feature_store import STORE_ROOT, DEFAULT_CHUNK_ROWS, iter_table
+from tejas_backtest import holdout_last_train_month
+from tejas_modeling_baseline import TARGET_COL, TARGET_ENCODE_COLS, ONE_HOT_COLS, print_top_features
+from tejas_trace import span, start_run
+
+# Out-of-core version of the linear baseline in tejas_modeling_baseline.py.
+#
+# The feature store is streamed partition by partition (iter_table), never loaded whole:
+#   1. Rows per month (Date column only) -> the same month-boundary holdout as holdout_split.
+#   2. One pass over the training months fits the StandardScaler (partial_fit), collects
+#      the one-hot categories and the target mean / std.
+#   3. Each chunk becomes a CSR matrix: scaled trend/calendar columns, one-hot
+#      attributes and the high-cardinality Style / Lookalike_ID hashed into
+#      2**HASH_BITS columns (FeatureHasher needs no vocabulary, so nothing grows with
+#      the catalog). An SGDRegressor (squared loss, L2, averaged) is trained on the
+#      standardized target with partial_fit, for `epochs` passes over the chunks
+#      (each chunk interleaves slices of every partition, rows shuffled).
+#   4. Test MAE / RMSE are accumulated chunk by chunk.
+# Peak memory is set by --chunk-rows, not by the table size.
+#
+#   python tejas_modeling_baseline.py --streaming
+#   python tejas_streaming_baseline.py --root feature_store --chunk-rows 50000 --hash-bits 20
+
+HASH_BITS = 18
+DEFAULT_EPOCHS = 10
+# Same L2 strength as the batch Ridge(alpha=1.0): SGD's alpha applies to the mean loss,
+# so it is RIDGE_ALPHA / n_rows (set once the row count is known)
+RIDGE_ALPHA = 1.0
+# Constant step, with iterates averaged over the second half of the epochs only: decaying
+# steps underfit, and averaging from the start drags rarely seen (hashed ID) weights to 0
+SGD_PARAMS = dict(loss='squared_error', penalty='l2', learning_rate='constant', eta0=0.02)
+
+
+def month_counts(table='final_demand', root=STORE_ROOT, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Rows per calendar month of a table (a Series indexed by Period), read from the Date column only."""
+    counts = None
+    for chunk in iter_table(table, root, columns=['Date'], chunk_rows=chunk_rows):
+        c = pd.to_datetime(chunk['Date']).dt.to_period('M').value_counts()
+        counts = c if counts is None else counts.add(c, fill_value=0)
+    return counts.sort_index()
+
+
+class StreamingEncoder:
+    """Fitted chunk by chunk; turns a frame into the CSR design matrix of the baseline."""
+
+    def __init__(self, numeric_cols, hash_bits=HASH_BITS):
+        self.numeric_cols = list(numeric_cols)
+        self.scaler = StandardScaler()
+        self.hasher = FeatureHasher(n_features=2 ** hash_bits, input_type='string')
+        self.categories = {c: set() for c in ONE_HOT_COLS}
+        self.ohe = None
+        self.y_sum, self.y_sq, self.n = 0.0, 0.0, 0
+
+    def partial_fit(self, chunk, y):
+        self.scaler.partial_fit(chunk[self.numeric_cols].to_numpy(dtype=float))
+        for col in ONE_HOT_COLS:
+            self.categories[col].update(chunk[col].dropna().astype(str).unique())
+        self.y_sum += float(y.sum())
+        self.y_sq += float((y ** 2).sum())
+        self.n += len(y)
+        return self
+
+    def finish(self):
+        """Freeze the one-hot vocabulary once every training chunk has been seen."""
+        categories = [sorted(self.categories[c]) for c in ONE_HOT_COLS]
+        self.ohe = OneHotEncoder(categories=categories, handle_unknown='ignore', sparse_output=True)
+        self.ohe.fit(pd.DataFrame({c: cats[:1] for c, cats in zip(ONE_HOT_COLS, categories)}))
+        self.y_mean = self.y_sum / self.n
+        self.y_std = max(np.sqrt(self.y_sq / self.n - self.y_mean ** 2), 1e-9)
+        return self
+
+    def _hashed_tokens(self, chunk):
+        # One token per ID column and row, e.g. 'Style=CK20100'
+        columns = [(col + '=') + chunk[col].astype(str).to_numpy(dtype=object) for col in TARGET_ENCODE_COLS]
+        return [list(tokens) for tokens in zip(*columns)]
+
+    def transform(self, chunk):
+        numeric = self.scaler.transform(chunk[self.numeric_cols].to_numpy(dtype=float))
+        one_hot = self.ohe.transform(chunk[ONE_HOT_COLS].astype(str))
+        hashed = self.hasher.transform(self._hashed_tokens(chunk))
+        return sp.hstack([sp.csr_matrix(numeric), one_hot, hashed], format='csr')
+
+    def columns(self):
+        """Table columns the encoder reads (plus the target)."""
+        return self.numeric_cols + TARGET_ENCODE_COLS + ONE_HOT_COLS + [TARGET_COL]
+
+    def feature_names(self):
+        """Names of the leading columns; the 2**hash_bits hashed ID columns follow them."""
+        return self.numeric_cols + list(self.ohe.get_feature_names_out(ONE_HOT_COLS))
+
+
+class StreamingBaseline:
+    """The linear baseline trained and evaluated over a chunked feature-store table."""
+
+    def __init__(self, table='final_demand', root=STORE_ROOT, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 epochs=DEFAULT_EPOCHS, hash_bits=HASH_BITS, seed=42):
+        self.table, self.root, self.chunk_rows = table, root, chunk_rows
+        self.epochs, self.hash_bits, self.seed = epochs, hash_bits, seed
+        self.encoder, self.model = None, None
+
+    def _chunks(self, months, interleave=False):
+        for chunk in iter_table(self.table, self.root, months=months, columns=self.encoder.columns(),
+                                chunk_rows=self.chunk_rows, interleave=interleave):
+            if len(chunk):
+                yield chunk, chunk[TARGET_COL].clip(lower=0).to_numpy(dtype=float)
+
+    def split_months(self, test_frac=0.2):
+        """('YYYY-MM' train months, test months) of the month-boundary holdout."""
+        counts = month_counts(self.table, self.root, self.chunk_rows)
+        last_train = holdout_last_train_month(counts, test_frac)
+        months = [str(m) for m in counts.index]
+        return [m for m in months if m <= str(last_train)], [m for m in months if m > str(last_train)]
+
+    def fit(self, months):
+        rng = np.random.default_rng(self.seed)
+        first = next(iter_table(self.table, self.root, months=months, chunk_rows=1))
+        numeric_cols = [c for c in first.columns if c.startswith('Trend_') or c.startswith('is_')]
+
+        with span('encoder_pass') as s:
+            self.encoder = StreamingEncoder(numeric_cols, self.hash_bits)
+            for chunk, y in self._chunks(months):
+                self.encoder.partial_fit(chunk, y)
+            self.encoder.finish()
+            s.rows = n_rows = self.encoder.n
+
+        self.model = SGDRegressor(alpha=RIDGE_ALPHA / n_rows, average=n_rows * (self.epochs // 2) + 1,
+                                  random_state=self.seed, **SGD_PARAMS)
+
+        for epoch in range(self.epochs):
+            with span('sgd_epoch', rows=self.encoder.n):
+                # Every chunk mixes all months and regions (rows shuffled within it): fed one
+                # month at a time, SGD drifts towards the latest months
+                for chunk, y in self._chunks(months, interleave=True):
+                    order = rng.permutation(len(chunk))
+                    X = self.encoder.transform(chunk)[order]
+                    self.model.partial_fit(X, (y[order] - self.encoder.y_mean) / self.encoder.y_std)
+        return self
+
+    def predict(self, chunk):
+        raw = self.model.predict(self.encoder.transform(chunk))
+        return raw * self.encoder.y_std + self.encoder.y_mean
+
+    def evaluate(self, months):
+        """Test MAE and RMSE accumulated over the chunks of `months`."""
+        abs_err, sq_err, n = 0.0, 0.0, 0
+        for chunk, y in self._chunks(months):
+            err = self.predict(chunk) - y
+            abs_err += float(np.abs(err).sum())
+            sq_err += float((err ** 2).sum())
+            n += len(y)
+        return abs_err / n, np.sqrt(sq_err / n), n
+
+
+def run_streaming(table='final_demand', root=STORE_ROOT, chunk_rows=DEFAULT_CHUNK_ROWS, epochs=DEFAULT_EPOCHS,
+                  hash_bits=HASH_BITS, show_drivers=True):
+    """Train and evaluate the streaming baseline; returns (model, test MAE, test RMSE)."""
+    baseline = StreamingBaseline(table, root, chunk_rows, epochs, hash_bits)
+    with span('split'):
+        train_months, test_months = baseline.split_months()
+    print(f"Streaming '{table}' in chunks of {chunk_rows} rows: train {train_months[0]}..{train_months[-1]}, "
+          f"test {test_months[0]}..{test_months[-1]}")
+
+    start_t = time.time()
+    baseline.fit(train_months)
+    names = baseline.encoder.feature_names()
+    print(f"SGD ({epochs} epochs over {baseline.encoder.n} rows, {len(names) + baseline.encoder.hasher.n_features} "
+          f"sparse columns) trained in {time.time() - start_t:.2f} seconds")
+    with span('evaluate') as s:
+        mae, rmse, s.rows = baseline.evaluate(test_months)
+    print(f"Streaming SGD Test MAE:  {mae:.4f}")
+    print(f"Streaming SGD Test RMSE: {rmse:.4f}")
+
+    if show_drivers:
+        # Hashed ID buckets have no readable name; drivers are shown for the named columns
+        print_top_features(SimpleNamespace(coef_=baseline.model.coef_[:len(names)]), names)
+    return baseline, mae, rmse
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Out-of-core linear baseline: chunked reads, sparse features, SGD.')
+    parser.add_argument('--table', default='final_demand')
+    parser.add_argument('--root', default=STORE_ROOT, help='Feature store root')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--epochs', type=int, default=DEFAULT_EPOCHS)
+    parser.add_argument('--hash-bits', type=int, default=HASH_BITS, help='Style / Lookalike_ID hashed into 2**bits columns')
+    args = parser.parse_args()
+
+    start_run('streaming_baseline')
+    run_streaming(args.table, args.root, args.chunk_rows, args.epochs, args.hash_bits)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import resource
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Lightweight stage instrumentation for the data prep, training and scoring scripts.
+#
+#   with span('fit', rows=len(X_train)):
+#       model.fit(train_pool)
+#
+#   @traced('load.sibling_history')
+#   def load_sibling_history(table='enriched', root=STORE_ROOT): ...
+#
+# Every span records wall time, CPU time (all threads, so CatBoost fits count fully),
+# how much the process's peak RSS grew inside it, the process peak at its end, and an
+# optional row count. ru_maxrss only ever rises, so the growth is the per-span number;
+# the process peak is the high-water mark of the whole run up to that point. start_run() in a script's main() makes the run write its spans
+# to .cache/traces/<script>-<timestamp>.json at exit and print a summary table.
+# The file is also a Chrome trace-event file ("traceEvents"), so it opens in
+# chrome://tracing, Perfetto or speedscope.
+#
+# Environment switches:
+#   TEJAS_TRACE_DIR=<dir>   where trace files go (default .cache/traces)
+#   TEJAS_TRACE=0           no trace file and no summary (spans still cost ~microseconds)
+#   TEJAS_PROFILE=1         also run cProfile over the whole run and dump <trace>.prof
+#                           (pstats format: snakeviz, `python -m pstats`, gprof2dot).
+#                           For sampling without cProfile overhead, leave it off and run
+#                           `py-spy record -- python <script>.py`; the spans do not interfere.
+
+TRACE_DIR = os.environ.get('TEJAS_TRACE_DIR', os.path.join('.cache', 'traces'))
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans = []
+_run = {}
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+class Span:
+    """One timed stage; set `rows` (or call add_rows) inside the block to record a row count."""
+
+    def __init__(self, name, rows=None, **attrs):
+        self.name = name
+        self.rows = rows
+        self.attrs = attrs
+
+    def add_rows(self, n):
+        self.rows = (self.rows or 0) + int(n)
+
+
+@contextmanager
+def span(name, rows=None, **attrs):
+    """Time a block as a named stage (nested spans are recorded with their parent path)."""
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    record = Span(name, rows, **attrs)
+    stack.append(record)
+
+    wall_t, cpu_t, rss_before = time.perf_counter(), time.process_time(), peak_rss_mb()
+    try:
+        yield record
+    finally:
+        wall = time.perf_counter() - wall_t
+        cpu = time.process_time() - cpu_t
+        rss_after = peak_rss_mb()
+        path = '/'.join(s.name for s in stack)
+        stack.pop()
+        with _lock:
+            _spans.append({
+                'name': name,
+                'path': path,
+                'depth': len(stack),
+                'thread': threading.get_ident(),
+                'start_s': wall_t - _run.get('t0', wall_t),
+                'wall_s': wall,
+                'cpu_s': cpu,
+                'rows': record.rows,
+                'peak_rss_mb': rss_after,
+                'rss_growth_mb': rss_after - rss_before,
+                'attrs': record.attrs,
+            })
+
+
+def traced(name=None):
+    """Decorator form of span(); the span is named after the function unless `name` is given."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def spans():
+    """Finished spans so far (copies)."""
+    with _lock:
+        return [dict(s) for s in _spans]
+
+
+def summary_table(records=None):
+    """
+    Per span path: calls, total wall / CPU seconds, rows, total peak-RSS growth and the
+    process peak at the span's last end, in first-seen order.
+    """
+    records = spans() if records is None else records
+    rows = {}
+    for s in sorted(records, key=lambda s: s['start_s']):
+        agg = rows.setdefault(s['path'], {'depth': s['depth'], 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                          'rows': None, 'rss_growth_mb': 0.0, 'peak_rss_mb': 0.0})
+        agg['calls'] += 1
+        agg['wall_s'] += s['wall_s']
+        agg['cpu_s'] += s['cpu_s']
+        if s['rows'] is not None:
+            agg['rows'] = (agg['rows'] or 0) + s['rows']
+        agg['rss_growth_mb'] += s['rss_growth_mb']
+        agg['peak_rss_mb'] = max(agg['peak_rss_mb'], s['peak_rss_mb'])
+    return rows
+
+
+def print_summary(records=None, total_s=None):
+    table = summary_table(records)
+    if not table:
+        return
+    print(f"\n{'Stage':<40} {'Calls':>5} {'Wall s':>9} {'CPU s':>9} {'Rows':>11} {'RSS +MB':>9} {'Proc peak MB':>13}")
+    for path, agg in table.items():
+        label = '  ' * agg['depth'] + path.rsplit('/', 1)[-1]
+        rows = f"{agg['rows']:,}" if agg['rows'] is not None else ''
+        print(f"{label:<40} {agg['calls']:>5} {agg['wall_s']:>9.3f} {agg['cpu_s']:>9.3f} {rows:>11} "
+              f"{agg['rss_growth_mb']:>9.1f} {agg['peak_rss_mb']:>13.1f}")
+    if total_s is not None:
+        print(f"{'Total run':<40} {'':>5} {total_s:>9.3f}")
+
+
+def _trace_events(records, pid):
+    """Chrome trace-event 'complete' events (microseconds)."""
+    return [{'name': s['name'], 'cat': s['path'], 'ph': 'X', 'pid': pid, 'tid': s['thread'],
+             'ts': s['start_s'] * 1e6, 'dur': s['wall_s'] * 1e6,
+             'args': {'cpu_s': s['cpu_s'], 'rows': s['rows'],
+                      'rss_growth_mb': s['rss_growth_mb'], 'peak_rss_mb': s['peak_rss_mb'], **s['attrs']}}
+            for s in records]
+
+
+def start_run(name=None, trace_dir=None, profile=None):
+    """
+    Mark the start of an instrumented run. At exit the spans are written to a JSON trace
+    and a summary table is printed. Returns the trace path (None if tracing is off).
+    """
+    if _run or os.environ.get('TEJAS_TRACE', '1') == '0':
+        return _run.get('path')
+    name = name or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+    trace_dir = trace_dir or TRACE_DIR
+    started = datetime.now(timezone.utc)
+    _run.update(name=name, started=started, t0=time.perf_counter(), cpu0=time.process_time(),
+                path=os.path.join(trace_dir, f"{name}-{started.strftime('%Y%m%dT%H%M%S')}.json"))
+
+    if profile is None:
+        profile = os.environ.get('TEJAS_PROFILE', '0') not in ('0', '')
+    if profile:
+        _run['profiler'] = cProfile.Profile()
+        _run['profiler'].enable()
+    atexit.register(finish_run)
+    return _run['path']
+
+
+def finish_run():
+    """Write the trace file (and cProfile dump) and print the summary; safe to call twice."""
+    if not _run or _run.get('finished'):
+        return None
+    _run['finished'] = True
+    total_s = time.perf_counter() - _run['t0']
+    records = spans()
+
+    profiler = _run.get('profiler')
+    if profiler is not None:
+        profiler.disable()
+
+    os.makedirs(os.path.dirname(_run['path']) or '.', exist_ok=True)
+    trace = {
+        'run': _run['name'],
+        'started': _run['started'].isoformat(),
+        'argv': sys.argv,
+        'wall_s': total_s,
+        'cpu_s': time.process_time() - _run['cpu0'],
+        'peak_rss_mb': peak_rss_mb(),
+        'spans': records,
+        'traceEvents': _trace_events(records, os.getpid()),
+    }
+    with open(_run['path'], 'w') as f:
+        json.dump(trace, f, indent=1, default=str)
+
+    print_summary(records, total_s)
+    print(f"Trace written to {_run['path']}")
+    if profiler is not None:
+        prof_path = _run['path'].replace('.json', '.prof')
+        profiler.dump_stats(prof_path)
+        print(f"cProfile stats written to {prof_path}")
+    return _run['path']
@@ -0,0 +1,173 @@
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+
+# Per-month Google Trends index shared by feature engineering, training and scoring.
+#
+# All trend CSVs are loaded once, lags / rolling averages / momentum are computed
+# once per month (not once per demand row), and the result is cached on disk keyed
+# by the source files' mtimes. Rows of any frame are then mapped to trend values by
+# month position, so wide float columns only get attached when a model needs them.
+
+ORIG_TRENDS_PATH = 'opticalsun_googletrends.csv'
+TRENDS_DIR = os.path.join('VSP Vision Datasets', 'google trends')
+CACHE_DIR = '.cache'
+CACHE_TABLE = os.path.join(CACHE_DIR, 'trend_index.parquet')
+CACHE_META = os.path.join(CACHE_DIR, 'trend_index.json')
+
+# Derived-feature settings (kept identical to create_advanced_features)
+LAGS = (3, 6)
+ROLLING_WINDOWS = (3,)
+
+
+def trend_col_name(raw_name):
+    """'FSA glasses' -> 'Trend_FSA_glasses', matching tejas_feature_eda.py."""
+    return "Trend_" + raw_name.replace(' ', '_')
+
+
+def _parse_pct(values):
+    """'20.00%' strings -> 0.2 floats (already-numeric values pass through)."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    return pd.to_numeric(values.astype(str).str.rstrip('%'), errors='coerce') / 100.0
+
+
+def source_files(orig_path=ORIG_TRENDS_PATH, trends_dir=TRENDS_DIR):
+    """Every CSV that feeds the index, in a deterministic order."""
+    files = [orig_path] if os.path.exists(orig_path) else []
+    return files + sorted(glob.glob(os.path.join(trends_dir, '*.csv')))
+
+
+def load_base_trends(orig_path=ORIG_TRENDS_PATH, trends_dir=TRENDS_DIR):
+    """Raw monthly trend values from every source, outer-joined on a monthly PeriodIndex."""
+    frames = []
+
+    # 1. Original optical/sun trends (Glasses, Sunglasses, 3m averages and % changes)
+    if os.path.exists(orig_path):
+        orig = pd.read_csv(orig_path)
+        orig.index = pd.PeriodIndex(pd.to_datetime(orig.pop('Time')), freq='M')
+        for col in orig.columns:
+            orig[col] = _parse_pct(orig[col]) if col.endswith('_pct_change') else orig[col].astype(float)
+        frames.append(orig)
+
+    # 2. One search term per file ('Time' + '{Search_Term}')
+    for file in sorted(glob.glob(os.path.join(trends_dir, '*.csv'))):
+        temp_df = pd.read_csv(file)
+        if 'Time' in temp_df.columns and len(temp_df.columns) == 2:
+            val_col = temp_df.columns[1]
+            series = temp_df[val_col].astype(float)
+            series.index = pd.PeriodIndex(pd.to_datetime(temp_df['Time']), freq='M')
+            frames.append(series.rename(trend_col_name(val_col)).to_frame())
+        else:
+            print(f"Skipping {file} due to unexpected structure.")
+
+    base = pd.concat(frames, axis=1).sort_index()
+    # Contiguous monthly range so a row's position is simply (month - first month)
+    full_range = pd.period_range(base.index.min(), base.index.max(), freq='M')
+    return base.reindex(full_range)
+
+
+def add_derived_features(base):
+    """
+    Lags, rolling averages and momentum per trend series, computed once per month.
+    Lag/momentum definitions match create_advanced_features (missing -> 0, safe divide).
+    """
+    derived = {}
+    trend_cols = [c for c in base.columns if c.startswith('Trend_') or c in ('Glasses', 'Sunglasses')]
+    for col in trend_cols:
+        values = base[col]
+        for window in ROLLING_WINDOWS:
+            if f'{col}_{window}m_avg' not in base.columns:
+                derived[f'{col}_{window}m_avg'] = values.rolling(window).mean()
+        for lag in LAGS:
+            lagged = values.shift(lag)
+            # Momentum Deltas: (Current / Past) - 1. Safe divide to avoid Inf/NaN.
+            momentum = np.where(lagged == 0, 0, (values - lagged) / (lagged + 1e-9))
+            derived[f'{col}_lag{lag}'] = lagged.fillna(0)
+            derived[f'{col}_momentum_{lag}m'] = pd.Series(momentum, index=base.index).fillna(0)
+    return pd.concat([base, pd.DataFrame(derived, index=base.index)], axis=1)
+
+
+_LOADED = {}  # (orig_path, trends_dir) -> (source mtimes, TrendIndex), reused within a process
+
+
+class TrendIndex:
+    """Month-indexed trend feature table with O(1) array lookups."""
+
+    def __init__(self, table, base_columns):
+        self.table = table
+        self.columns = list(table.columns)
+        # Raw source columns, i.e. what tejas_feature_eda.py attaches to demand rows
+        self.base_columns = list(base_columns)
+        self._col_pos = {c: i for i, c in enumerate(self.columns)}
+        self._values = table.to_numpy(dtype=float)
+        self._first_ordinal = table.index[0].ordinal
+
+    @classmethod
+    def build(cls, orig_path=ORIG_TRENDS_PATH, trends_dir=TRENDS_DIR):
+        base = load_base_trends(orig_path, trends_dir)
+        return cls(add_derived_features(base), base.columns)
+
+    @classmethod
+    def load(cls, orig_path=ORIG_TRENDS_PATH, trends_dir=TRENDS_DIR, use_cache=True):
+        """
+        Load from the on-disk cache if no source file changed, otherwise rebuild it. Within
+        a process the loaded index is kept and reused while the sources are unchanged.
+        """
+        mtimes = {f: os.path.getmtime(f) for f in source_files(orig_path, trends_dir)}
+        key = (orig_path, trends_dir)
+        if use_cache and key in _LOADED and _LOADED[key][0] == mtimes:
+            return _LOADED[key][1]
+
+        if use_cache and os.path.exists(CACHE_TABLE) and os.path.exists(CACHE_META):
+            with open(CACHE_META) as f:
+                cache_meta = json.load(f)
+            if cache_meta['mtimes'] == mtimes:
+                table = pd.read_parquet(CACHE_TABLE)
+                table.index = pd.PeriodIndex(table.index, freq='M')
+                _LOADED[key] = (mtimes, cls(table, cache_meta['base_columns']))
+                return _LOADED[key][1]
+
+        index = cls.build(orig_path, trends_dir)
+        if use_cache:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            to_save = index.table.copy()
+            to_save.index = to_save.index.astype(str)
+            to_save.to_parquet(CACHE_TABLE)
+            with open(CACHE_META, 'w') as f:
+                json.dump({'mtimes': mtimes, 'base_columns': index.base_columns}, f)
+            _LOADED[key] = (mtimes, index)
+        return index
+
+    @property
+    def months(self):
+        return self.table.index
+
+    def positions(self, dates):
+        """Row position in the table for each date (-1 where the month is not covered)."""
+        ordinals = pd.PeriodIndex(pd.to_datetime(pd.Series(dates)), freq='M').asi8
+        pos = ordinals - self._first_ordinal
+        pos[(pos < 0) | (pos >= len(self.table))] = -1
+        return pos
+
+    def lookup(self, dates, columns):
+        """Float array (n_dates, n_columns) of trend values; NaN for uncovered months."""
+        col_idx = [self._col_pos[c] for c in columns]
+        pos = self.positions(dates)
+        out = self._values[np.clip(pos, 0, None)][:, col_idx]
+        out[pos < 0] = np.nan
+        return out
+
+    def frame(self, dates, columns, index=None):
+        """Trend values for `dates` as a DataFrame (aligned to `index` if given)."""
+        return pd.DataFrame(self.lookup(dates, columns), columns=list(columns), index=index)
+
+    def attach(self, df, columns, date_col='Date'):
+        """Copy of `df` with the requested trend columns filled in by month."""
+        df = df.copy()
+        values = self.lookup(df[date_col], columns)
+        for i, col in enumerate(columns):
+            df[col] = values[:, i]
+        return df
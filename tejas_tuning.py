@@ -0,0 +1,256 @@
+import os
+import json
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from catboost import CatBoostRegressor
+
+from tejas_feature_store import load_final_demand
+from tejas_backtest import holdout_split, month_folds, TARGET_HORIZON
+from tejas_model_registry import data_fingerprint
+from tejas_pools import model_matrix, build_pool, cached_train_pool
+
+# Hyperparameter search for the CatBoost champion / advanced models.
+#
+# - Trials are scored on month-aligned validation folds cut *inside* the training
+#   window, so the holdout test months never drive early stopping or selection. Train
+#   and validation months are TARGET_HORIZON months apart, so no training target
+#   overlaps a validation month. By default there are as many folds as the window
+#   supports; advanced features are built per fold, with analog curves from the fold's
+#   training months only.
+# - Successive halving: every trial trains for a small iteration budget, only the best
+#   1/eta continue (from their partial model via init_model) to the next, larger budget.
+# - Trial/fold fits run in worker processes; workers x thread_count stays within
+#   a global CPU budget.
+# - First-rung fits train on quantized pools per (fold data, border settings): each
+#   worker quantizes a fold once per border_count, and the borders are cached for
+#   later tuning runs (tejas_pools.py).
+# The winning configuration is written to best_catboost_config.json, which
+# build_model() in the champion and advanced scripts picks up.
+
+CONFIG_PATH = 'best_catboost_config.json'
+# Shortest training window of a validation fold, in months
+MIN_TRAIN_MONTHS = 2
+
+FIXED_PARAMS = dict(
+    loss_function='RMSE',
+    eval_metric='MAE',
+    random_seed=42,
+    logging_level='Silent',
+)
+
+
+def load_best_config(model_name, path=CONFIG_PATH):
+    """Tuned CatBoost params for a model ('champion' or 'advanced'), or {} if not tuned yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get(model_name, {}).get('params', {})
+
+
+def sample_params(rng):
+    """One random draw from the search space."""
+    return {
+        'depth': int(rng.integers(4, 9)),
+        'learning_rate': float(np.exp(rng.uniform(np.log(0.02), np.log(0.2)))),
+        'l2_leaf_reg': float(np.exp(rng.uniform(np.log(1.0), np.log(30.0)))),
+        'border_count': int(rng.choice([32, 64, 128, 254])),
+        'one_hot_max_size': int(rng.choice([2, 4, 10, 255])),
+    }
+
+
+def iteration_rungs(min_iterations, max_iterations, eta):
+    """Geometric iteration budgets, e.g. (100, 900, 3) -> [100, 300, 900]."""
+    rungs = [min_iterations]
+    while rungs[-1] * eta <= max_iterations:
+        rungs.append(rungs[-1] * eta)
+    if rungs[-1] < max_iterations:
+        rungs.append(max_iterations)
+    return rungs
+
+
+# --- Workers -----------------------------------------------------------------
+# Validation folds are shipped to each worker once (pool initializer).
+
+_FOLDS = {}
+
+
+def _init_worker(folds):
+    _FOLDS.update(folds)
+
+
+def _train_step(trial_id, fold_id, params, iterations, init_model, thread_count):
+    """Train (or continue training) one trial on one fold; return its validation MAE curve."""
+    X_tr, y_tr, X_val, y_val, cat_cols, fingerprint = _FOLDS[fold_id]
+    model = CatBoostRegressor(iterations=iterations, thread_count=thread_count, **FIXED_PARAMS, **params)
+    eval_pool = build_pool(X_val, y_val, cat_cols)
+    if init_model is None:
+        model.fit(cached_train_pool(X_tr, y_tr, cat_cols, model.get_params(), fingerprint=fingerprint),
+                  eval_set=eval_pool)
+    else:
+        # Continuing from a partial model needs the raw feature values (no quantized pool)
+        model.fit(build_pool(X_tr, y_tr, cat_cols), eval_set=eval_pool, init_model=init_model)
+    curve = model.get_evals_result()['validation']['MAE']
+    return trial_id, fold_id, list(curve), model
+
+
+def validation_folds(dates, n_val_folds=None):
+    """
+    Month folds inside the training window with the backtest's target-horizon embargo.
+    Default: as many folds as the window supports (each needs MIN_TRAIN_MONTHS training
+    months); a warning is printed when fewer than the requested folds survive.
+    """
+    n_months = pd.to_datetime(pd.Series(dates)).dt.to_period('M').nunique()
+    supported = max(n_months - TARGET_HORIZON - MIN_TRAIN_MONTHS, 0)
+    requested = supported if n_val_folds is None else n_val_folds
+    folds = month_folds(dates, n_folds=min(requested, supported), horizon=1, min_train_months=MIN_TRAIN_MONTHS)
+    if len(folds) < requested:
+        print(f"Warning: {len(folds)} of {requested} requested validation fold(s) fit a {n_months}-month "
+              f"training window ({TARGET_HORIZON}-month embargo, {MIN_TRAIN_MONTHS}+ training months)")
+    return folds
+
+
+def _prepare_folds(model_name, df, n_val_folds=None):
+    """Feature frames for the model, restricted to the training window, cut into validation folds."""
+    if model_name == 'champion':
+        import tejas_modeling_champion as module
+
+        def prepare(frame, last_train_month):
+            return module.prepare_features(frame)
+    elif model_name == 'advanced':
+        import tejas_modeling_advanced as module
+        from tejas_lookalike import LookalikeIndex
+
+        def prepare(frame, last_train_month):
+            # Analog curves from the fold's training months only
+            index = LookalikeIndex.up_to(last_train_month)
+            return module.prepare_features(module.create_advanced_features(frame, analog_index=index))
+    else:
+        raise ValueError(f"Unknown model '{model_name}'")
+
+    df = df.assign(Date=pd.to_datetime(df['Date']))
+    train_df, _ = holdout_split(df)
+
+    folds = {}
+    for k, (train_m, val_m) in enumerate(validation_folds(train_df['Date'], n_val_folds)):
+        fold_df, features = prepare(train_df, train_m[-1])
+        months = pd.to_datetime(fold_df['Date']).dt.to_period('M')
+        tr = fold_df[months.isin(train_m)]
+        val = fold_df[months.isin(val_m)]
+        X_tr = model_matrix(tr, features, module.CATEGORICAL_COLS)
+        X_val = model_matrix(val, features, module.CATEGORICAL_COLS)
+        fingerprint = data_fingerprint(X_tr.assign(__target=tr[module.TARGET_COL].to_numpy()))
+        folds[k] = (X_tr, tr[module.TARGET_COL], X_val, val[module.TARGET_COL], module.CATEGORICAL_COLS, fingerprint)
+    return folds
+
+
+def tune(model_name='advanced', n_trials=24, min_iterations=100, max_iterations=900, eta=3,
+         n_val_folds=None, cpu_budget=None, max_workers=None, seed=42):
+    """Run successive-halving search; return (best params, best validation MAE, trial history)."""
+    df = load_final_demand()
+    folds = _prepare_folds(model_name, df, n_val_folds)
+    if not folds:
+        raise ValueError("Training window too short for validation folds")
+
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers or cpu_budget, cpu_budget))
+    thread_count = max(1, cpu_budget // max_workers)
+
+    rng = np.random.default_rng(seed)
+    trials = {t: sample_params(rng) for t in range(n_trials)}
+    rungs = iteration_rungs(min_iterations, max_iterations, eta)
+    print(f"Tuning '{model_name}': {n_trials} trials, rungs {rungs}, {len(folds)} validation folds, "
+          f"{max_workers} workers x {thread_count} threads (CPU budget {cpu_budget})")
+
+    models = {}           # (trial, fold) -> partially trained model
+    curves = {}           # (trial, fold) -> full validation MAE curve so far
+    history = []
+    survivors = list(trials)
+    trained = 0
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(folds,)) as pool:
+        for rung, budget in enumerate(rungs):
+            # Continue every surviving trial from where the previous rung stopped
+            futures = [
+                pool.submit(_train_step, t, k, trials[t], budget - trained, models.get((t, k)), thread_count)
+                for t in survivors for k in folds
+            ]
+            for f in futures:
+                t, k, curve, model = f.result()
+                models[(t, k)] = model
+                curves[(t, k)] = curves.get((t, k), []) + curve
+            trained = budget
+
+            # Score = mean over folds of the best validation MAE reached so far
+            scores = {t: float(np.mean([min(curves[(t, k)]) for k in folds])) for t in survivors}
+            for t in survivors:
+                history.append({'trial': t, 'rung': rung, 'iterations': budget, 'val_MAE': scores[t], **trials[t]})
+
+            ranked = sorted(survivors, key=scores.get)
+            print(f"Rung {rung} ({budget} iterations): best val MAE {scores[ranked[0]]:.2f} "
+                  f"(trial {ranked[0]}), {len(survivors)} trials evaluated")
+
+            if rung < len(rungs) - 1:
+                # Prune: only the top 1/eta continue; free the pruned models
+                keep = max(1, len(survivors) // eta)
+                for t in ranked[keep:]:
+                    for k in folds:
+                        models.pop((t, k), None)
+                survivors = ranked[:keep]
+
+    best = ranked[0]
+    # Iteration count = average best iteration across folds (+1 because curves are 0-indexed)
+    best_iterations = int(np.mean([np.argmin(curves[(best, k)]) + 1 for k in folds]))
+    best_params = dict(trials[best], iterations=best_iterations)
+    return best_params, scores[best], pd.DataFrame(history)
+
+
+def save_best_config(model_name, params, val_mae, path=CONFIG_PATH):
+    """Merge the winning params for one model into the shared config file."""
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)
+    config[model_name] = {
+        'params': params,
+        'val_MAE': val_mae,
+        'created': datetime.now(timezone.utc).isoformat(),
+    }
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Successive-halving CatBoost hyperparameter search.')
+    parser.add_argument('--model', choices=['champion', 'advanced'], default='advanced')
+    parser.add_argument('--trials', type=int, default=24)
+    parser.add_argument('--min-iterations', type=int, default=100)
+    parser.add_argument('--max-iterations', type=int, default=900)
+    parser.add_argument('--eta', type=int, default=3, help='Keep the top 1/eta trials at every rung')
+    parser.add_argument('--val-folds', type=int, default=None,
+                        help='Validation folds (default: as many as the training window supports)')
+    parser.add_argument('--cpu-budget', type=int, default=None, help='Total CPU threads for all workers')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--config', default=CONFIG_PATH)
+    args = parser.parse_args()
+
+    best_params, val_mae, history = tune(
+        args.model, n_trials=args.trials, min_iterations=args.min_iterations,
+        max_iterations=args.max_iterations, eta=args.eta, n_val_folds=args.val_folds,
+        cpu_budget=args.cpu_budget, max_workers=args.workers
+    )
+
+    print(f"\nBest validation MAE: {val_mae:.4f}")
+    for key, value in best_params.items():
+        print(f"  {key}: {value}")
+
+    save_best_config(args.model, best_params, val_mae, args.config)
+    history_filename = f'tuning_history_{args.model}.csv'
+    history.to_csv(history_filename, index=False)
+    print(f"Saved best config to {args.config} and trial history to {history_filename}")
+
+
+if __name__ == "__main__":
+    main()